@@ -14,7 +14,12 @@ channel_analyzer.py - 多级别 · 多策略 K 线通道分析模块
 
 import numpy as np
 import pandas as pd
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from datetime import datetime
+from functools import cached_property
 from typing import Optional, List
 
 import sys
@@ -24,6 +29,7 @@ sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 from data.data_fetcher import YFinanceDataFetcher
 from analysis.strategies import (
     BaseChannelStrategy,
+    _to_soa,
     get_strategies,
     DEFAULT_STRATEGY_NAMES,
     CHANNEL_UP,
@@ -76,6 +82,31 @@ TIMEFRAME_CONFIGS = [
     },
 ]
 
+# 数据缓存有效期（秒），避免长时间运行的进程使用过期行情
+_FETCH_CACHE_TTL = 300
+
+# 报告边框（宽度固定，导入时构造一次）
+_WIDTH = 62
+_TOP = "╔" + "═" * _WIDTH + "╗"
+_MID = "╠" + "═" * _WIDTH + "╣"
+_BOT = "╚" + "═" * _WIDTH + "╝"
+_BLANK = "║" + " " * _WIDTH + "║"
+
+# 大/小级别划分（用于判断大小级别方向冲突）
+_LONG_NAMES = frozenset(("日线", "周线"))
+_SHORT_NAMES = frozenset(("1H", "4H"))
+
+# yfinance period 字符串单位 → pd.DateOffset 参数名
+_PERIOD_UNITS = {"d": "days", "wk": "weeks", "mo": "months", "y": "years"}
+
+
+def _period_offset(period: str) -> Optional[pd.DateOffset]:
+    """将 '2mo' / '6mo' / '2y' 等 period 转为 DateOffset，无法解析（如 'max'）时返回 None"""
+    m = re.fullmatch(r"(\d+)(d|wk|mo|y)", period)
+    if m is None:
+        return None
+    return pd.DateOffset(**{_PERIOD_UNITS[m.group(2)]: int(m.group(1))})
+
 
 class ChannelAnalyzer:
     """多级别 · 多策略通道分析器
@@ -94,7 +125,17 @@ class ChannelAnalyzer:
     ):
         self.symbol = symbol
         self.fetcher = YFinanceDataFetcher(symbol=symbol)
-        self.strategies = get_strategies(strategy_names, **strategy_kwargs)
+        self._strategy_names = strategy_names
+        self._strategy_kwargs = strategy_kwargs
+        # (interval, period) → (拉取时刻, DataFrame)
+        self._fetch_cache = {}
+        self._fetch_locks = {}
+        self._cache_lock = threading.Lock()
+
+    @cached_property
+    def strategies(self) -> list:
+        """策略实例列表，首次使用时才创建"""
+        return get_strategies(self._strategy_names, **self._strategy_kwargs)
 
     # ============================================================
     # 单级别：用所有策略分析
@@ -104,7 +145,7 @@ class ChannelAnalyzer:
         interval = config["interval"]
         period = config["period"]
 
-        df = self.fetcher.fetch_ohlcv(period=period, interval=interval)
+        df = self._fetch(period, interval, config.get("fetch_period"))
         if df is None or df.empty:
             return {"name": config["name"], "label": config["label"], "error": "数据获取失败"}
 
@@ -114,16 +155,23 @@ class ChannelAnalyzer:
             if df is None or len(df) < 20:
                 return {"name": config["name"], "label": config["label"], "error": "重采样后数据不足"}
 
-        # 逐策略分析
-        results = []
-        for strat in self.strategies:
-            res = strat.analyze(
+        # 各策略共用的 ADX 只算一次；OHLCV 一次转为连续数组供各策略共享
+        adx = BaseChannelStrategy._calc_adx(df, config["lookback"])
+        arrays = _to_soa(df)
+
+        # 各策略只读 df、互不依赖，并发分析（重计算在 NumPy/pandas 内部，释放 GIL）
+        def _run(strat):
+            return strat.analyze(
                 df,
                 lookback=config["lookback"],
                 sma_short=config.get("sma_short", 20),
                 sma_long=config.get("sma_long", 60),
+                adx=adx,
+                arrays=arrays,
             )
-            results.append(res)
+
+        with ThreadPoolExecutor(max_workers=max(1, len(self.strategies))) as ex:
+            results = list(ex.map(_run, self.strategies))
 
         # 共识判定
         consensus = self._consensus(results)
@@ -143,7 +191,7 @@ class ChannelAnalyzer:
         self,
         timeframes: Optional[list] = None,
     ) -> dict:
-        configs = timeframes or TIMEFRAME_CONFIGS
+        configs = self._share_fetches(timeframes or TIMEFRAME_CONFIGS)
         report = {
             "symbol": self.symbol,
             "generated_at": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
@@ -151,10 +199,19 @@ class ChannelAnalyzer:
             "timeframes": [],
         }
 
-        for cfg in configs:
-            print(f"  分析 {cfg['name']}（{cfg['label']}）...")
-            result = self.analyze_timeframe(cfg)
-            report["timeframes"].append(result)
+        # 各级别互不依赖，并发拉取与分析；耗时主要在 yfinance 网络 I/O，
+        # 且 fetcher 持有的 yf.Ticker 会话无法 pickle，故使用线程池
+        results = {}
+        with ThreadPoolExecutor(max_workers=max(1, len(configs))) as ex:
+            futures = {}
+            for cfg in configs:
+                print(f"  分析 {cfg['name']}（{cfg['label']}）...")
+                futures[ex.submit(self.analyze_timeframe, cfg)] = cfg["name"]
+            for fut in as_completed(futures):
+                results[futures[fut]] = fut.result()
+
+        # 按原配置顺序输出
+        report["timeframes"] = [results[cfg["name"]] for cfg in configs]
 
         report["summary"] = self._generate_summary(report["timeframes"])
         return report
@@ -163,35 +220,41 @@ class ChannelAnalyzer:
     # 格式化输出
     # ============================================================
     def print_report(self, report: dict) -> None:
-        width = 62
+        """一次性写出整份报告，避免逐行 print 的多次加锁与刷新，并发场景下输出不交错"""
+        sys.stdout.write(self._format_report(report) + "\n")
+
+    def _format_report(self, report: dict) -> str:
+        """将报告格式化为带边框的多行文本"""
+        pad, pad_title, pad_center = _WIDTH - 2, _WIDTH - 4, _WIDTH - 6
         single_strategy = len(self.strategies) == 1
+        lines = [""]
+        add = lines.append
 
-        print()
-        print("╔" + "═" * width + "╗")
+        add(_TOP)
         title = f"{self.symbol} 多级别通道分析报告"
         if not single_strategy:
             title = f"{self.symbol} 多级别 · 多策略通道分析报告"
-        print("║" + f"  {title}".center(width - 6) + "      ║")
-        print("║" + f"  {report['generated_at']}".center(width - 6) + "      ║")
+        add("║" + f"  {title}".center(pad_center) + "      ║")
+        add("║" + f"  {report['generated_at']}".center(pad_center) + "      ║")
         if not single_strategy:
             strat_list = " | ".join(report["strategies_used"])
-            print("║" + f"  策略: {strat_list}".center(width - 6) + "      ║")
-        print("╠" + "═" * width + "╣")
+            add("║" + f"  策略: {strat_list}".center(pad_center) + "      ║")
+        add(_MID)
 
         for tf in report["timeframes"]:
             if "error" in tf:
-                print("║" + " " * width + "║")
-                print("║" + f"  📊 {tf['name']}（{tf['label']}）".ljust(width - 4) + "    ║")
-                print("║" + f"     ❌ {tf['error']}".ljust(width - 4) + "    ║")
+                add(_BLANK)
+                add("║" + f"  📊 {tf['name']}（{tf['label']}）".ljust(pad_title) + "    ║")
+                add("║" + f"     ❌ {tf['error']}".ljust(pad_title) + "    ║")
                 continue
 
-            print("║" + " " * width + "║")
-            print("║" + f"  📊 {tf['name']}（{tf['label']}）".ljust(width - 4) + "    ║")
+            add(_BLANK)
+            add("║" + f"  📊 {tf['name']}（{tf['label']}）".ljust(pad_title) + "    ║")
 
             for sr in tf["strategies"]:
                 if "error" in sr:
                     line = f"     {sr.get('strategy_name', '?')}: ❌ {sr['error']}"
-                    print("║" + line.ljust(width - 2) + "  ║")
+                    add("║" + line.ljust(pad) + "  ║")
                     continue
 
                 name = sr["strategy_name"]
@@ -203,9 +266,9 @@ class ChannelAnalyzer:
 
                 if single_strategy:
                     # 单策略模式，展示更多细节
-                    print("║" + f"     通道: {ch}".ljust(width - 2) + "  ║")
-                    print("║" + f"     当前价: ${sr['current_price']:.0f}  上轨: ${upper:.0f}  下轨: ${lower:.0f}".ljust(width - 2) + "  ║")
-                    print("║" + f"     位置: {pos:.0f}%  |  {extra}".ljust(width - 2) + "  ║")
+                    add("║" + f"     通道: {ch}".ljust(pad) + "  ║")
+                    add("║" + f"     当前价: ${sr['current_price']:.0f}  上轨: ${upper:.0f}  下轨: ${lower:.0f}".ljust(pad) + "  ║")
+                    add("║" + f"     位置: {pos:.0f}%  |  {extra}".ljust(pad) + "  ║")
                     # 输出策略特有指标
                     details = sr.get("details", {})
                     detail_parts = []
@@ -216,44 +279,98 @@ class ChannelAnalyzer:
                             detail_parts.append(f"{k}: {v}")
                     if detail_parts:
                         detail_line = "     " + " | ".join(detail_parts[:4])
-                        print("║" + detail_line.ljust(width - 2) + "  ║")
+                        add("║" + detail_line.ljust(pad) + "  ║")
                 else:
                     # 多策略模式，紧凑显示
                     line = f"     {name:<8} {ch}  位置:{pos:.0f}%  {upper:.0f}/{lower:.0f}"
-                    print("║" + line.ljust(width - 2) + "  ║")
+                    add("║" + line.ljust(pad) + "  ║")
 
             # 共识
             if not single_strategy:
                 consensus = tf.get("consensus", {})
                 con_text = consensus.get("label", "")
-                print("║" + f"     ── 共识: {con_text}".ljust(width - 2) + "  ║")
+                add("║" + f"     ── 共识: {con_text}".ljust(pad) + "  ║")
 
-        print("║" + " " * width + "║")
-        print("╠" + "═" * width + "╣")
+        add(_BLANK)
+        add(_MID)
 
         # 综合结论
         summary = report.get("summary", {})
-        print("║" + " " * width + "║")
-        print("║" + f"  🎯 综合判断".ljust(width - 4) + "    ║")
+        add(_BLANK)
+        add("║" + f"  🎯 综合判断".ljust(pad_title) + "    ║")
         if summary:
-            print("║" + f"     {summary.get('conclusion', '')}".ljust(width - 2) + "  ║")
+            add("║" + f"     {summary.get('conclusion', '')}".ljust(pad) + "  ║")
             for detail in summary.get("details", []):
-                print("║" + f"     • {detail}".ljust(width - 2) + "  ║")
-        print("║" + " " * width + "║")
-        print("╚" + "═" * width + "╝")
-        print()
+                add("║" + f"     • {detail}".ljust(pad) + "  ║")
+        add(_BLANK)
+        add(_BOT)
+        add("")
+        return "\n".join(lines)
 
     # ============================================================
     # 内部方法
     # ============================================================
+    def _fetch(self, period: str, interval: str, fetch_period: Optional[str] = None) -> Optional[pd.DataFrame]:
+        """带 TTL 缓存的数据拉取
+
+        fetch_period 为同 interval 下更长的 period 时，只下载一次长序列，
+        再按时间截取出 period 对应的部分。
+        """
+        source = fetch_period or period
+        key = (interval, source)
+        with self._cache_lock:
+            lock = self._fetch_locks.setdefault(key, threading.Lock())
+
+        # 同一 key 的并发请求串行化，保证只下载一次
+        with lock:
+            hit = self._fetch_cache.get(key)
+            if hit is not None and time.monotonic() - hit[0] < _FETCH_CACHE_TTL:
+                df = hit[1]
+            else:
+                # 同时启用 fetcher 的 Parquet 缓存（有效期同上），其他进程 / 脚本以相同参数拉取时可直接复用
+                df = self.fetcher.fetch_ohlcv(
+                    period=source, interval=interval,
+                    use_cache=True, cache_max_age=_FETCH_CACHE_TTL,
+                )
+                if df is None or df.empty:
+                    return df
+                self._fetch_cache[key] = (time.monotonic(), df)
+
+        if source != period:
+            start = df["time"].iloc[-1] - _period_offset(period)
+            df = df.iloc[df["time"].searchsorted(start):].reset_index(drop=True)
+        return df
+
+    @staticmethod
+    def _share_fetches(configs: list) -> list:
+        """为同 interval 的配置标注最长的 period（fetch_period），使其共用一次下载"""
+        longest = {}
+        anchor = pd.Timestamp(0)
+        for cfg in configs:
+            offset = _period_offset(cfg["period"])
+            if offset is None:
+                continue
+            cur = longest.get(cfg["interval"])
+            if cur is None or anchor + offset > anchor + _period_offset(cur):
+                longest[cfg["interval"]] = cfg["period"]
+
+        shared = []
+        for cfg in configs:
+            src = longest.get(cfg["interval"])
+            if src is not None and src != cfg["period"] and _period_offset(cfg["period"]) is not None:
+                cfg = {**cfg, "fetch_period": src}
+            shared.append(cfg)
+        return shared
+
     def _consensus(self, strategy_results: list) -> dict:
         """对同一级别的多策略结果进行共识判断"""
         valid = [r for r in strategy_results if "error" not in r]
         if not valid:
             return {"label": "❓ 无有效数据", "up": 0, "down": 0, "total": 0}
 
-        up = sum(1 for r in valid if r["channel_type"] == CHANNEL_UP)
-        down = sum(1 for r in valid if r["channel_type"] == CHANNEL_DOWN)
+        types = [r["channel_type"] for r in valid]
+        up = types.count(CHANNEL_UP)
+        down = types.count(CHANNEL_DOWN)
         total = len(valid)
 
         if up == total:
@@ -272,13 +389,14 @@ class ChannelAnalyzer:
     def _resample(self, df: pd.DataFrame, rule: str) -> Optional[pd.DataFrame]:
         """将 K 线重采样到更大时间周期"""
         try:
-            temp = df.copy()
-            if "time" in temp.columns:
-                temp.set_index("time", inplace=True)
-            if not isinstance(temp.index, pd.DatetimeIndex):
-                temp.index = pd.to_datetime(temp.index)
-
-            resampled = temp.resample(rule).agg({
+            # 直接以时间列构造 DatetimeIndex，不复制各价格列
+            if "time" in df.columns:
+                view = df.drop(columns="time")
+                view.index = pd.DatetimeIndex(df["time"], name="time")
+            else:
+                view = df.set_axis(pd.DatetimeIndex(pd.to_datetime(df.index), name="time"))
+
+            resampled = view.resample(rule).agg({
                 "open": "first",
                 "high": "max",
                 "low": "min",
@@ -304,15 +422,24 @@ class ChannelAnalyzer:
 
         details = []
 
-        # 方法1：基于共识统计
+        # 方法1：基于共识统计；同时按大/小级别标记多空方向
         consensus_up = 0
         consensus_down = 0
+        long_bullish = long_bearish = short_bullish = short_bearish = False
         for tf in valid_tfs:
             con = tf.get("consensus", {})
-            if con.get("up", 0) > con.get("down", 0):
-                consensus_up += 1
-            elif con.get("down", 0) > con.get("up", 0):
-                consensus_down += 1
+            up, down = con.get("up", 0), con.get("down", 0)
+            bullish, bearish = up > down, down > up
+            consensus_up += bullish
+            consensus_down += bearish
+            details.append(f"{tf['name']}: {con.get('label', '?')}")
+
+            if tf["name"] in _LONG_NAMES:
+                long_bullish |= bullish
+                long_bearish |= bearish
+            elif tf["name"] in _SHORT_NAMES:
+                short_bullish |= bullish
+                short_bearish |= bearish
 
         total = len(valid_tfs)
         if consensus_up == total:
@@ -326,19 +453,7 @@ class ChannelAnalyzer:
         else:
             conclusion = "🔄 多空分歧 — 各级别方向不一致"
 
-        # 各级别共识情况
-        for tf in valid_tfs:
-            con = tf.get("consensus", {})
-            details.append(f"{tf['name']}: {con.get('label', '?')}")
-
         # 大小级别冲突
-        long_tfs = [tf for tf in valid_tfs if tf["name"] in ("日线", "周线")]
-        short_tfs = [tf for tf in valid_tfs if tf["name"] in ("1H", "4H")]
-        long_bullish = any(tf.get("consensus", {}).get("up", 0) > tf.get("consensus", {}).get("down", 0) for tf in long_tfs)
-        short_bearish = any(tf.get("consensus", {}).get("down", 0) > tf.get("consensus", {}).get("up", 0) for tf in short_tfs)
-        long_bearish = any(tf.get("consensus", {}).get("down", 0) > tf.get("consensus", {}).get("up", 0) for tf in long_tfs)
-        short_bullish = any(tf.get("consensus", {}).get("up", 0) > tf.get("consensus", {}).get("down", 0) for tf in short_tfs)
-
         if long_bullish and short_bearish:
             details.append("⚠️ 大级别看多但小级别回调中")
         elif long_bearish and short_bullish:
@@ -10,10 +10,22 @@ strategies.py - 通道分析策略集合
 每个策略返回统一格式的 dict，方便 ChannelAnalyzer 聚合。
 """
 
+import math
+
 import numpy as np
 import pandas as pd
-import ta
 from abc import ABC, abstractmethod
+from numpy.lib.stride_tricks import sliding_window_view
+
+try:
+    import bottleneck as bn  # 可选加速：移动窗口统计
+except ImportError:
+    bn = None
+
+try:
+    from numba import njit  # 可选加速：极值点搜索与线性拟合 JIT 编译
+except ImportError:
+    njit = None
 
 
 # ============================================================
@@ -25,6 +37,120 @@ CHANNEL_SIDEWAYS = "↔️  横盘震荡"
 CHANNEL_TRANSITION = "🔄 趋势转换中"
 
 
+# ============================================================
+# 数值工具
+# ============================================================
+if njit is not None:
+    @njit(cache=True, nogil=True)
+    def _linfit_kernel(y, x):
+        n = len(y)
+        xm = 0.0
+        ym = 0.0
+        for i in range(n):
+            xm += x[i]
+            ym += y[i]
+        xm /= n
+        ym /= n
+        sxy = 0.0
+        sxx = 0.0
+        for i in range(n):
+            dx = x[i] - xm
+            sxy += dx * (y[i] - ym)
+            sxx += dx * dx
+        slope = sxy / sxx
+        return slope, ym - slope * xm
+
+    @njit(cache=True, nogil=True)
+    def _pivots_kernel(values, window, is_high):
+        # NaN 口径与 _pivots_numpy 一致：中心为 NaN 或窗口内有 NaN 时都不算极值点
+        n = len(values)
+        idx = np.empty(n, np.int64)
+        k = 0
+        for i in range(window, n - window):
+            v = values[i]
+            if np.isnan(v):
+                continue
+            ok = True
+            for j in range(1, window + 1):
+                if is_high:
+                    if not (values[i - j] <= v and values[i + j] <= v):
+                        ok = False
+                        break
+                elif not (values[i - j] >= v and values[i + j] >= v):
+                    ok = False
+                    break
+            if ok:
+                idx[k] = i
+                k += 1
+        return idx[:k]
+else:
+    _linfit_kernel = None
+    _pivots_kernel = None
+
+
+def _linfit(y: np.ndarray, x: np.ndarray = None) -> tuple:
+    """一元线性回归的闭式解，返回 (slope, intercept)
+
+    等价于 np.polyfit(x, y, 1)，但只需几次点积，无需构造范德蒙矩阵和 SVD。
+    x 缺省时为 0..n-1。安装 numba 时走编译后的单循环实现。
+    """
+    y = np.asarray(y, dtype=np.float64)
+    if _linfit_kernel is not None:
+        x = np.arange(len(y), dtype=np.float64) if x is None else np.asarray(x, dtype=np.float64)
+        return _linfit_kernel(y, x)
+    if x is None:
+        n = len(y)
+        xm = (n - 1) / 2.0
+        dx = np.arange(n, dtype=np.float64) - xm
+    else:
+        x = np.asarray(x, dtype=np.float64)
+        xm = x.mean()
+        dx = x - xm
+    ym = y.mean()
+    slope = (dx @ (y - ym)) / (dx @ dx)
+    return slope, ym - slope * xm
+
+
+def _pivots_numpy(values: np.ndarray, window: int, is_high: bool) -> np.ndarray:
+    """_pivots_kernel 的 NumPy 实现，返回局部极值点下标
+
+    每个 (2w+1) 窗口的中心等于窗口极值即为局部极值（含平局）；首尾 window 根没有完整窗口，
+    自然排除。窗口含 NaN 时极值为 NaN，与中心比较恒为 False，该点不算极值点。
+    """
+    if len(values) < 2 * window + 1:
+        return np.empty(0, dtype=np.int64)
+    view = sliding_window_view(values, 2 * window + 1)
+    centers = view[:, window]
+    extreme = view.max(axis=1) if is_high else view.min(axis=1)
+    return np.flatnonzero(centers == extreme) + window
+
+
+# 转为数组时降为 float32 的价格列
+_PRICE_COLUMNS = ("open", "high", "low", "close")
+
+
+def _to_soa(df: pd.DataFrame) -> dict:
+    """将 OHLCV DataFrame 转为 {列名: 连续数组}
+
+    ChannelAnalyzer 每个级别只转换一次，各策略直接在数组上计算，
+    避免 pandas 索引与对齐的逐次开销。价格列在转换时降为 float32（数据量与内存带宽减半，
+    调用方的 DataFrame 不变），成交量保留原 dtype；各策略的累加与最终标量统一在 float64 下计算。
+    """
+    return {
+        k: np.ascontiguousarray(df[k].to_numpy(dtype=np.float32 if k in _PRICE_COLUMNS else None))
+        for k in ("open", "high", "low", "close", "volume")
+        if k in df.columns
+    }
+
+
+def _tail_windows(values: np.ndarray, window: int, count: int) -> np.ndarray:
+    """返回最后 count 个完整滚动窗口的只读视图，形状 (count, window)
+
+    数据不足时返回全部完整窗口。等价于 rolling(window) 去掉 NaN 后再 tail(count)。
+    """
+    return sliding_window_view(values[-(count + window - 1):], window)
+
+
 # ============================================================
 # 策略基类
 # ============================================================
@@ -59,11 +185,18 @@ class BaseChannelStrategy(ABC):
             return round(max(0, min(100, pct)), 1)
         return 50.0
 
-    def _calc_adx(self, df: pd.DataFrame, lookback: int) -> float:
-        """计算 ADX 值"""
-        adx_data = df.tail(lookback + 20).copy()
+    @staticmethod
+    def _calc_adx(df: pd.DataFrame, lookback: int) -> float:
+        """计算 ADX 值
+
+        同一级别的各策略使用相同的 df 与 lookback，ChannelAnalyzer 会预先计算一次
+        并通过 adx 关键字参数传入，此处仅作为单独调用策略时的回退。
+        """
+        adx_data = df.tail(lookback + 20)  # ta 不修改输入，直接传视图
         if len(adx_data) < 16:
             return 0.0
+        import ta  # 依赖树较大，推迟到首次计算时导入
+
         try:
             indicator = ta.trend.ADXIndicator(
                 high=adx_data["high"],
@@ -73,17 +206,16 @@ class BaseChannelStrategy(ABC):
             )
             adx_series = indicator.adx()
             val = adx_series.iloc[-1]
-            return round(val, 1) if not np.isnan(val) else 0.0
+            return round(float(val), 1) if not np.isnan(val) else 0.0
         except Exception:
             return 0.0
 
-    def _calc_sma_cross(self, df: pd.DataFrame, short: int, long: int) -> tuple:
+    def _calc_sma_cross(self, close: np.ndarray, short: int, long: int) -> tuple:
         """计算均线排列状态，返回 (short_val, long_val, cross_label)"""
-        close = df["close"]
-        sma_s = close.rolling(window=short).mean().iloc[-1]
-        sma_l = close.rolling(window=long).mean().iloc[-1]
-        if np.isnan(sma_s) or np.isnan(sma_l):
+        if len(close) < max(short, long):
             return None, None, "数据不足"
+        sma_s = close[-short:].mean(dtype=np.float64)
+        sma_l = close[-long:].mean(dtype=np.float64)
         label = "多头排列" if sma_s > sma_l else "空头排列"
         return round(sma_s, 2), round(sma_l, 2), label
 
@@ -110,36 +242,41 @@ class LinearRegressionStrategy(BaseChannelStrategy):
         sma_short = kwargs.get("sma_short", 20)
         sma_long = kwargs.get("sma_long", 60)
 
+        arrays = kwargs.get("arrays") or _to_soa(df)
+        full_close = arrays["close"]
+
         min_bars = max(lookback, sma_long + 10)
-        if len(df) < min_bars:
-            return {"error": f"数据不足：需要 {min_bars} 根，实际 {len(df)} 根"}
+        if len(full_close) < min_bars:
+            return {"error": f"数据不足：需要 {min_bars} 根，实际 {len(full_close)} 根"}
 
-        data = df.tail(lookback).copy().reset_index(drop=True)
-        close = data["close"].values
+        close = full_close[-lookback:].astype(np.float64)
 
-        # 线性回归
-        x = np.arange(len(close))
-        coeffs = np.polyfit(x, close, 1)
-        slope = coeffs[0]
-        regression_line = np.polyval(coeffs, x)
+        # 线性回归（中心化后一次算出斜率、残差、R² 与标准差，不构造回归线数组）
+        n = len(close)
+        dx = np.arange(n, dtype=np.float64) - (n - 1) / 2.0
+        ym = close.mean()
+        dy = close - ym
+        slope = (dx @ dy) / (dx @ dx)
+        resid = dy - slope * dx
 
         # R²
-        ss_res = np.sum((close - regression_line) ** 2)
-        ss_tot = np.sum((close - np.mean(close)) ** 2)
+        ss_res = resid @ resid
+        ss_tot = dy @ dy
         r_squared = 1 - (ss_res / ss_tot) if ss_tot > 0 else 0
 
-        # 通道上下轨
-        residuals = close - regression_line
-        std_dev = np.std(residuals)
-        center = regression_line[-1]
+        # 通道上下轨（OLS 残差均值为 0，标准差即 sqrt(ss_res / n)）
+        std_dev = math.sqrt(ss_res / n)
+        center = ym + slope * dx[-1]
         upper = center + 1.5 * std_dev
         lower = center - 1.5 * std_dev
 
         # ADX & SMA
-        adx = self._calc_adx(df, lookback)
-        sma_s, sma_l, sma_cross = self._calc_sma_cross(df, sma_short, sma_long)
+        adx = kwargs.get("adx")
+        if adx is None:
+            adx = self._calc_adx(df, lookback)
+        sma_s, sma_l, sma_cross = self._calc_sma_cross(full_close, sma_short, sma_long)
 
-        current_price = close[-1]
+        current_price = float(close[-1])
         slope_pct = (slope / current_price) * 100 if current_price > 0 else 0
 
         # 通道判定
@@ -200,37 +337,47 @@ class BollingerBandStrategy(BaseChannelStrategy):
         bb_period = kwargs.get("bb_period", self.bb_period)
         bb_std = kwargs.get("bb_std", self.bb_std)
 
-        if len(df) < bb_period + 10:
-            return {"error": f"数据不足：需要 {bb_period + 10} 根，实际 {len(df)} 根"}
+        arrays = kwargs.get("arrays") or _to_soa(df)
+        close = arrays["close"]
 
-        # 布林带计算
-        bb = ta.volatility.BollingerBands(
-            close=df["close"], window=bb_period, window_dev=bb_std
-        )
+        if len(close) < bb_period + 10:
+            return {"error": f"数据不足：需要 {bb_period + 10} 根，实际 {len(close)} 根"}
 
-        upper = bb.bollinger_hband().iloc[-1]
-        lower = bb.bollinger_lband().iloc[-1]
-        middle = bb.bollinger_mavg().iloc[-1]
-        bandwidth = bb.bollinger_wband().iloc[-1]  # (上轨-下轨)/中轨
-        pct_b = bb.bollinger_pband().iloc[-1]      # %B = (价格-下轨)/(上轨-下轨)
-
-        current_price = df["close"].iloc[-1]
+        # 布林带计算：只对最后 lookback 个窗口求均值与总体标准差，其余各轨按算术推导
+        if bn is not None:
+            seg = close[-(lookback + bb_period - 1):].astype(np.float64)
+            mavg_s = bn.move_mean(seg, bb_period, min_count=bb_period)[bb_period - 1:]
+            mstd_s = bn.move_std(seg, bb_period, min_count=bb_period, ddof=0)[bb_period - 1:]
+        else:
+            windows = _tail_windows(close, bb_period, lookback)
+            mavg_s = windows.mean(axis=1, dtype=np.float64)
+            mstd_s = windows.std(axis=1, dtype=np.float64)
+        hband_s = mavg_s + bb_std * mstd_s
+        lband_s = mavg_s - bb_std * mstd_s
+        wband_s = (hband_s - lband_s) / mavg_s * 100
+
+        upper = hband_s[-1]
+        lower = lband_s[-1]
+        middle = mavg_s[-1]
+        bandwidth = wband_s[-1]  # (上轨-下轨)/中轨 × 100
+        current_price = float(close[-1])
+        # %B = (价格-下轨)/(上轨-下轨)，上下轨重合时无定义
+        pct_b = (current_price - lower) / (upper - lower) if upper != lower else np.nan
 
         # 均线斜率（中轨走向）
-        ma_vals = bb.bollinger_mavg().dropna().tail(lookback)
-        if len(ma_vals) >= 10:
-            x = np.arange(len(ma_vals))
-            ma_slope = np.polyfit(x, ma_vals.values, 1)[0]
+        if len(mavg_s) >= 10:
+            ma_slope = _linfit(mavg_s)[0]
         else:
             ma_slope = 0
 
         # ADX
-        adx = self._calc_adx(df, lookback)
+        adx = kwargs.get("adx")
+        if adx is None:
+            adx = self._calc_adx(df, lookback)
 
         # 带宽判断：带宽收窄 → 横盘蓄力
         # 带宽用最近值与历史中位数对比
-        bw_series = bb.bollinger_wband().dropna().tail(lookback)
-        bw_median = bw_series.median() if len(bw_series) > 0 else bandwidth
+        bw_median = np.median(wband_s) if len(wband_s) > 0 else bandwidth
         bw_is_narrow = bandwidth < bw_median * 0.7
 
         # 通道判定
@@ -286,37 +433,36 @@ class DonchianChannelStrategy(BaseChannelStrategy):
     def analyze(self, df: pd.DataFrame, lookback: int = 60, **kwargs) -> dict:
         dc_period = kwargs.get("dc_period", self.dc_period)
 
-        if len(df) < dc_period + 10:
-            return {"error": f"数据不足：需要 {dc_period + 10} 根，实际 {len(df)} 根"}
+        arrays = kwargs.get("arrays") or _to_soa(df)
+        close = arrays["close"]
 
-        # 唐奇安通道
-        dc = ta.volatility.DonchianChannel(
-            high=df["high"], low=df["low"], close=df["close"],
-            window=dc_period,
-        )
+        if len(close) < dc_period + 10:
+            return {"error": f"数据不足：需要 {dc_period + 10} 根，实际 {len(close)} 根"}
 
-        upper = dc.donchian_channel_hband().iloc[-1]
-        lower = dc.donchian_channel_lband().iloc[-1]
-        middle = dc.donchian_channel_mband().iloc[-1]
-        width = dc.donchian_channel_wband().iloc[-1]
+        # 唐奇安通道：最后 lookback 个窗口的最高/最低价，中轨与宽度按算术推导
+        upper_series = _tail_windows(arrays["high"], dc_period, lookback).max(axis=1)
+        lower_series = _tail_windows(arrays["low"], dc_period, lookback).min(axis=1)
 
-        current_price = df["close"].iloc[-1]
+        upper = float(upper_series[-1])
+        lower = float(lower_series[-1])
+        middle = (upper + lower) / 2
+        current_price = float(close[-1])
+        # 宽度沿用 ta 口径：(上轨-下轨) / 收盘均价 × 100
+        width = (upper - lower) / close[-dc_period:].mean(dtype=np.float64) * 100
 
         # 上轨斜率 — 最近 N 根上轨值做回归
-        upper_series = dc.donchian_channel_hband().dropna().tail(lookback)
-        lower_series = dc.donchian_channel_lband().dropna().tail(lookback)
 
         upper_slope = 0
         lower_slope = 0
         if len(upper_series) >= 10:
-            x = np.arange(len(upper_series))
-            upper_slope = np.polyfit(x, upper_series.values, 1)[0]
+            upper_slope = _linfit(upper_series)[0]
         if len(lower_series) >= 10:
-            x = np.arange(len(lower_series))
-            lower_slope = np.polyfit(x, lower_series.values, 1)[0]
+            lower_slope = _linfit(lower_series)[0]
 
         # ADX
-        adx = self._calc_adx(df, lookback)
+        adx = kwargs.get("adx")
+        if adx is None:
+            adx = self._calc_adx(df, lookback)
 
         # 通道判定
         # 上下轨同时上移 → 上涨通道
@@ -383,19 +529,21 @@ class TrendlineStrategy(BaseChannelStrategy):
     def analyze(self, df: pd.DataFrame, lookback: int = 60, **kwargs) -> dict:
         pivot_window = kwargs.get("pivot_window", self.pivot_window)
 
-        if len(df) < lookback:
-            return {"error": f"数据不足：需要 {lookback} 根，实际 {len(df)} 根"}
+        arrays = kwargs.get("arrays") or _to_soa(df)
+        n = len(arrays["close"])
 
-        data = df.tail(lookback).copy().reset_index(drop=True)
-        high = data["high"].values
-        low = data["low"].values
-        close = data["close"].values
+        if n < lookback:
+            return {"error": f"数据不足：需要 {lookback} 根，实际 {n} 根"}
+
+        high = arrays["high"][-lookback:]
+        low = arrays["low"][-lookback:]
+        close = arrays["close"][-lookback:]
 
         # 找局部高点和低点
         highs_idx, highs_val = self._find_pivots(high, pivot_window, mode="high")
         lows_idx, lows_val = self._find_pivots(low, pivot_window, mode="low")
 
-        current_price = close[-1]
+        current_price = float(close[-1])
         result_base = {
             "strategy_name": self.display_name,
             "current_price": round(current_price, 2),
@@ -405,9 +553,9 @@ class TrendlineStrategy(BaseChannelStrategy):
         if len(highs_idx) < 3 or len(lows_idx) < 3:
             result_base.update({
                 "channel_type": CHANNEL_SIDEWAYS,
-                "upper_band": round(np.max(high), 2),
-                "lower_band": round(np.min(low), 2),
-                "center": round(np.mean(close), 2),
+                "upper_band": round(float(high.max()), 2),
+                "lower_band": round(float(low.min()), 2),
+                "center": round(close.mean(dtype=np.float64), 2),
                 "position_pct": 50.0,
                 "sma_cross": "极值点不足",
                 "details": {
@@ -419,19 +567,19 @@ class TrendlineStrategy(BaseChannelStrategy):
             return result_base
 
         # 高点趋势线回归
-        h_coeffs = np.polyfit(highs_idx, highs_val, 1)
-        h_slope = h_coeffs[0]
-        upper_at_end = np.polyval(h_coeffs, len(data) - 1)
+        h_slope, h_intercept = _linfit(highs_val, highs_idx)
+        upper_at_end = h_intercept + h_slope * (len(close) - 1)
 
         # 低点趋势线回归
-        l_coeffs = np.polyfit(lows_idx, lows_val, 1)
-        l_slope = l_coeffs[0]
-        lower_at_end = np.polyval(l_coeffs, len(data) - 1)
+        l_slope, l_intercept = _linfit(lows_val, lows_idx)
+        lower_at_end = l_intercept + l_slope * (len(close) - 1)
 
         center = (upper_at_end + lower_at_end) / 2
 
         # ADX
-        adx = self._calc_adx(df, lookback)
+        adx = kwargs.get("adx")
+        if adx is None:
+            adx = self._calc_adx(df, lookback)
 
         # 通道判定
         both_up = h_slope > 0 and l_slope > 0
@@ -489,20 +637,9 @@ class TrendlineStrategy(BaseChannelStrategy):
         Returns:
             (indices, values) 两个数组
         """
-        indices = []
-        vals = []
-        for i in range(window, len(values) - window):
-            left = values[i - window : i]
-            right = values[i + 1 : i + window + 1]
-            if mode == "high":
-                if values[i] >= np.max(left) and values[i] >= np.max(right):
-                    indices.append(i)
-                    vals.append(values[i])
-            else:
-                if values[i] <= np.min(left) and values[i] <= np.min(right):
-                    indices.append(i)
-                    vals.append(values[i])
-        return np.array(indices), np.array(vals)
+        pivots = _pivots_kernel if _pivots_kernel is not None else _pivots_numpy
+        idx = pivots(np.asarray(values), window, mode == "high")
+        return idx, values[idx]
 
 
 # ============================================================
@@ -517,6 +654,9 @@ ALL_STRATEGIES = {
 
 DEFAULT_STRATEGY_NAMES = ["regression", "bollinger", "donchian", "trendline"]
 
+# 默认参数下的全部策略实例（策略只保存阈值参数、analyze 无副作用，可安全共享）
+_DEFAULT_STRATEGIES = None
+
 
 def get_strategies(names: list = None, **kwargs) -> list:
     """根据名称列表创建策略实例
@@ -528,6 +668,12 @@ def get_strategies(names: list = None, **kwargs) -> list:
     Returns:
         list[BaseChannelStrategy]: 策略实例列表
     """
+    global _DEFAULT_STRATEGIES
+    if not names and not kwargs:
+        if _DEFAULT_STRATEGIES is None:
+            _DEFAULT_STRATEGIES = [ALL_STRATEGIES[n]() for n in DEFAULT_STRATEGY_NAMES]
+        return list(_DEFAULT_STRATEGIES)
+
     names = names or DEFAULT_STRATEGY_NAMES
     strategies = []
     for n in names:
@@ -6,13 +6,16 @@ engine.py - 回测引擎模块
 并在回测完成后输出夏普比率等关键绩效指标。
 """
 
+import math
 import os
 import sys
+import weakref
 from datetime import datetime
 from typing import Optional, Type
 
 import backtrader as bt
 import backtrader.analyzers as btanalyzers
+import numpy as np
 import pandas as pd
 
 # 将项目根目录加入 sys.path，以支持模块间导入
@@ -21,6 +24,203 @@ if _PROJECT_ROOT not in sys.path:
     sys.path.insert(0, _PROJECT_ROOT)
 
 from strategies.dual_ma_strategy import DualMAStrategy
+from strategies.enhanced_ma_strategy import EnhancedMAStrategy
+from strategies.optimized_swing import EXHAUSTION_SLOPE_PERIOD, OptimizedSwingStrategy
+from strategies.optimized_swing_v2 import OptimizedSwingV2
+from strategies.swing_strategy import SwingStrategy
+
+
+# 时间列候选名（按优先级排列），load_data 取与 DataFrame 列名交集中的第一个
+_TIME_COLUMNS = pd.Index(["time", "date", "datetime", "Date", "Time", "Datetime"])
+
+# Backtrader 日期数值（date2num）中 1970-01-01 对应的序数
+_EPOCH_ORDINAL = 719163.0
+_NS_PER_DAY = 86_400_000_000_000
+
+# NumpyData 换算好的数组按 DataFrame 缓存：id(df) → (df 的弱引用, {"datetime" 或列名: 数组})。
+# 多组参数各建一个引擎、反复 load_data 同一份数据时，时间换算与各列 float64 转换只做一次；
+# 数据源只读这些数组，可在多个 Cerebro 间共用。df 被回收时对应条目随之清除
+_FEED_ARRAYS = {}
+
+
+def _feed_arrays(df: pd.DataFrame) -> dict:
+    """返回 df 的数组缓存（首次调用时换算时间索引），各列数组由 NumpyData.start() 按需补入"""
+    key = id(df)
+    entry = _FEED_ARRAYS.get(key)
+    if entry is None or entry[0]() is not df:
+        ns = df.index.values.astype("datetime64[ns]").view(np.int64)
+        entry = (weakref.ref(df), {"datetime": _EPOCH_ORDINAL + ns // _NS_PER_DAY + (ns % _NS_PER_DAY) / _NS_PER_DAY})
+        _FEED_ARRAYS[key] = entry
+        weakref.finalize(df, _FEED_ARRAYS.pop, key, None)
+    return entry[1]
+
+
+def _column(df: pd.DataFrame, col: str) -> np.ndarray:
+    """df 某列的连续 float64 数组（经 _feed_arrays 缓存，同一 DataFrame 每列只转换一次）
+
+    同一列每次返回同一个数组对象，strategies._indicator_cache 可据此复用已算好的指标。
+    """
+    arrays = _feed_arrays(df)
+    if col not in arrays:
+        arrays[col] = df[col].to_numpy(dtype=np.float64, copy=True)
+    return arrays[col]
+
+
+class NumpyData(bt.feeds.DataBase):
+    """基于 NumPy 列数组的数据源
+
+    dataname 为以 DatetimeIndex 为索引的 DataFrame。start() 时取得各数据线对应列的
+    连续 float64 数组与换算为 Backtrader 日期数值的时间索引（同一 DataFrame 只换算一次，
+    见 _feed_arrays），_load() 逐根按下标读取数组，省去 PandasData 每根 K 线的 pandas 取值开销。
+    DataFrame 中不存在的数据线（如 openinterest）保持 NaN。
+    """
+
+    def _column_name(self, line_name: str) -> str:
+        """数据线对应的 DataFrame 列名（默认同名）"""
+        return line_name
+
+    def column_array(self, col: str) -> np.ndarray:
+        """整段列数组（float64，下标为 K 线序号），即 _load() 逐根读取的同一数组
+
+        策略可在 __init__ 中据此一次性算好整段指标（见 strategies._precomputed.rsi_atr）。
+        """
+        return _column(self.p.dataname, col)
+
+    def start(self):
+        super().start()
+        df = self.p.dataname
+        self._datetimes = _feed_arrays(df)["datetime"]
+        self._columns = []
+        for name in self.getlinealiases():
+            col = self._column_name(name)
+            if name == "datetime" or col not in df.columns:
+                continue
+            self._columns.append((getattr(self.lines, name), self.column_array(col)))
+        self._idx = 0
+
+    def _load(self):
+        i = self._idx
+        if i >= len(self._datetimes):
+            return False
+
+        self.lines.datetime[0] = self._datetimes[i]
+        for line, values in self._columns:
+            line[0] = values[i]
+        self._idx = i + 1
+        return True
+
+
+def _bt_sma(close: np.ndarray, period: int) -> np.ndarray:
+    """与 Backtrader SMA 逐位一致的简单移动平均
+
+    Backtrader 对每个窗口用 math.fsum 精确求和后再除以周期，这里按同样方式计算
+    （编译内核 _fsum_sma 移植了 math.fsum 的精确求和，未安装 numba 时直接调用 math.fsum），
+    预计算的均线与策略内 bt.indicators.SMA 的取值完全相同，前 period-1 个值为 NaN。
+    """
+    from backtest.engine_numba import _fsum_sma
+
+    return _fsum_sma(np.ascontiguousarray(close, dtype=np.float64), period)
+
+
+# SwingStrategy 决定指标数组的参数（run_param_grid 按此分组）
+_SWING_STRATEGY_PERIOD_PARAMS = ("short_period", "long_period", "rsi_period", "adx_period", "atr_period")
+
+
+def _swing_inputs(df: pd.DataFrame, params: dict) -> tuple:
+    """按 Backtrader 口径准备 SwingStrategy 编译内核的行情与指标数组
+
+    均线优先复用 add_sma_columns 预计算的列，其余指标经 strategies._indicator_cache 按
+    （数据, 周期）缓存。
+
+    Returns:
+        (open_, close, sma_short, sma_long, cross, rsi, adx, plus_di, minus_di, atr, first)，
+        first 为策略首次执行 next() 的下标（所有指标预热完成）
+    """
+    from backtest.engine_numba import _crossover
+    from strategies._indicator_cache import adx_dmi, rsi_atr
+
+    open_, high, low, close = (_column(df, c) for c in ("open", "high", "low", "close"))
+    short, long_ = params["short_period"], params["long_period"]
+    sma_short, sma_long = (
+        df[f"sma_{n}"].to_numpy(dtype=np.float64) if f"sma_{n}" in df.columns
+        else _bt_sma(close, n)
+        for n in (short, long_)
+    )
+    rsi, atr = rsi_atr(high, low, close, params["rsi_period"], params["atr_period"])
+    adx, plus_di, minus_di = adx_dmi(high, low, close, params["adx_period"])
+    # 与 Cerebro 相同：所有指标预热完成后才开始执行策略逻辑
+    first = max(short + 1, long_ + 1, params["rsi_period"] + 1,
+                2 * params["adx_period"], params["atr_period"] + 1) - 1
+    return (open_, close, sma_short, sma_long,
+            _crossover(sma_short, sma_long, max(short, long_) - 1),
+            rsi, adx, plus_di, minus_di, atr, first)
+
+
+# OptimizedSwingStrategy / OptimizedSwingV2 决定指标数组的参数（run_param_grid 按此分组）
+_SWING_PERIOD_PARAMS = ("short_period", "long_period", "rsi_period", "adx_period", "atr_period",
+                        "macd_fast", "macd_slow", "macd_signal")
+
+
+def _optimized_swing_inputs(df: pd.DataFrame, params: dict) -> tuple:
+    """按 Backtrader 口径准备 OptimizedSwingStrategy / OptimizedSwingV2 编译内核的行情与指标数组
+
+    均线优先复用 add_sma_columns 预计算的列，其余指标经 strategies._indicator_cache 按
+    （数据, 周期）缓存，同一份数据上周期相同的多次调用只算一次。
+
+    Returns:
+        (open_, high, low, close, sma_short, sma_long, cross, rsi, adx, plus_di, minus_di,
+         macd_hist, atr, first)，first 为策略首次执行 next() 的下标（所有指标预热完成）
+    """
+    from backtest.engine_numba import _crossover
+    from strategies._indicator_cache import adx_dmi, macd_hist, rsi_atr
+
+    open_, high, low, close = (_column(df, c) for c in ("open", "high", "low", "close"))
+    short, long_ = params["short_period"], params["long_period"]
+    sma_short, sma_long = (
+        df[f"sma_{n}"].to_numpy(dtype=np.float64) if f"sma_{n}" in df.columns
+        else _bt_sma(close, n)
+        for n in (short, long_)
+    )
+    rsi, atr = rsi_atr(high, low, close, params["rsi_period"], params["atr_period"])
+    adx, plus_di, minus_di = adx_dmi(high, low, close, params["adx_period"])
+    hist = macd_hist(close, params["macd_fast"], params["macd_slow"], params["macd_signal"])
+    first = max(short + 1, long_ + 1, params["rsi_period"] + 1, 2 * params["adx_period"],
+                params["atr_period"] + 1, params["macd_slow"] + params["macd_signal"] - 1) - 1
+    return (open_, high, low, close, sma_short, sma_long,
+            _crossover(sma_short, sma_long, max(short, long_) - 1),
+            rsi, adx, plus_di, minus_di, hist, atr, first)
+
+
+def num2datetime(nums) -> pd.DatetimeIndex:
+    """批量把 Backtrader 日期数值（bt.date2num）换算为 DatetimeIndex（NumpyData.start 中换算的逆运算）
+
+    逐笔交易的开/平仓时间可先按数值收集，回测结束后一次性换算，免去每笔调用 bt.num2date；
+    K 线时间均为整秒，结果取整到秒以消除浮点误差，与 bt.num2date 的结果一致。
+    """
+    days = np.asarray(nums, dtype=np.float64) - _EPOCH_ORDINAL
+    return pd.to_datetime(np.round(days * 86400.0).astype(np.int64), unit="s")
+
+
+class PrecomputedSMAData(NumpyData):
+    """附带预计算均线的数据源
+
+    fast_sma / slow_sma 两条数据线分别读取 sma_<fast_period> / sma_<slow_period> 列
+    （add_sma_columns 的结果），fast_period / slow_period 同时供各均线策略判断
+    能否直接复用而无需逐 K 线计算 SMA。
+    """
+
+    lines = ("fast_sma", "slow_sma")
+    params = (
+        ("fast_period", None),
+        ("slow_period", None),
+    )
+
+    def _column_name(self, line_name: str) -> str:
+        if line_name == "fast_sma":
+            return f"sma_{self.p.fast_period}"
+        if line_name == "slow_sma":
+            return f"sma_{self.p.slow_period}"
+        return line_name
 
 
 class BacktestEngine:
@@ -33,9 +233,16 @@ class BacktestEngine:
         initial_cash (float): 初始资金
         commission (float): 交易手续费比例
         results (list): 回测结果
+        fast_result (dict): fast 模式下编译内核的回测结果（净值、成交、绩效）
+        verbose (bool): 是否输出运行日志与绩效报告
     """
 
-    def __init__(self, initial_cash: float = 100000.0, commission: float = 0.001):
+    def __init__(
+        self,
+        initial_cash: float = 100000.0,
+        commission: float = 0.001,
+        verbose: bool = True,
+    ):
         """初始化回测引擎
 
         创建 Cerebro 实例并配置初始资金和手续费。
@@ -43,10 +250,15 @@ class BacktestEngine:
         Args:
             initial_cash: 初始账户资金，默认 100,000
             commission: 手续费比例，默认 0.1%（0.001）
+            verbose: 是否输出运行日志与绩效报告，参数扫描等批量回测时可设为 False
         """
         self.initial_cash = initial_cash
         self.commission = commission
+        self.verbose = verbose
         self.results = None
+        self.fast_result = None
+        self._df = None
+        self._strategy = None
 
         # 创建 Cerebro 引擎
         self.cerebro = bt.Cerebro()
@@ -64,7 +276,44 @@ class BacktestEngine:
         self.cerebro.addanalyzer(btanalyzers.Returns, _name="returns")
         self.cerebro.addanalyzer(btanalyzers.TradeAnalyzer, _name="trades")
 
-        print(f"[BacktestEngine] 初始化完成 | 初始资金: {initial_cash:,.0f} | 手续费: {commission*100:.2f}%")
+        if self.verbose:
+            print(f"[BacktestEngine] 初始化完成 | 初始资金: {initial_cash:,.0f} | 手续费: {commission*100:.2f}%")
+
+    @staticmethod
+    def prepare_data(df: pd.DataFrame) -> pd.DataFrame:
+        """将 OHLCV 数据整理为 load_data 直接使用的形式（DatetimeIndex 索引、小写列名）
+
+        load_data 内部会调用本方法；多组参数回测同一份数据时，可预先调用一次
+        并把结果传给各次 load_data，已整理好的数据不会再做任何转换。
+        返回新对象，不修改传入的 df，也无需整表复制。
+
+        Raises:
+            ValueError: 既没有时间列也没有 DatetimeIndex 索引时抛出异常
+        """
+        matches = _TIME_COLUMNS.intersection(df.columns)
+        time_col = matches[0] if len(matches) else None
+
+        if time_col is not None:
+            df = df.set_index(time_col)
+            df.index = pd.to_datetime(df.index)
+        elif not isinstance(df.index, pd.DatetimeIndex):
+            raise ValueError("DataFrame 必须包含 'time'/'date'/'datetime' 列或 DatetimeIndex 索引")
+
+        # 标准化列名为小写（已是小写时不重建 Index）
+        lower = df.columns.str.lower()
+        if not lower.equals(df.columns):
+            df = df.set_axis(lower, axis=1)
+        return df
+
+    @staticmethod
+    def add_sma_columns(df: pd.DataFrame, periods) -> pd.DataFrame:
+        """为 df 追加 sma_<周期> 列（每个周期只计算一次），返回新 DataFrame
+
+        多组参数共用同一份数据回测时，在分发前调用一次，各次 load_data(sma_periods=...)
+        直接读取对应列，不再重复计算均线。df 应已经过 prepare_data 整理。
+        """
+        close = df["close"].to_numpy(dtype=np.float64)
+        return df.assign(**{f"sma_{n}": _bt_sma(close, n) for n in sorted(set(periods))})
 
     def load_data(
         self,
@@ -72,10 +321,13 @@ class BacktestEngine:
         csv_path: Optional[str] = None,
         fromdate: Optional[str] = None,
         todate: Optional[str] = None,
+        sma_periods: Optional[tuple] = None,
     ) -> None:
         """加载回测数据
 
         支持从 pandas DataFrame 或 CSV 文件加载 OHLCV 数据到 Cerebro 引擎。
+        数据源所需的数组按 DataFrame 对象缓存：多组参数回测同一份数据时，先用 prepare_data
+        （或 add_sma_columns）整理一次并把同一对象传给各次 load_data，换算只在第一次进行。
 
         Args:
             df: 包含 OHLCV 数据的 DataFrame（与 csv_path 二选一）。
@@ -83,6 +335,9 @@ class BacktestEngine:
             csv_path: CSV 文件路径（与 df 二选一）
             fromdate: 数据起始日期，格式 'YYYY-MM-DD'
             todate: 数据截止日期，格式 'YYYY-MM-DD'
+            sma_periods: (短周期, 长周期)，提供时两条均线随数据源传入（优先读取 add_sma_columns
+                         生成的 sma_<周期> 列，否则当场计算），与策略的 short_period/long_period
+                         一致时策略直接读取
 
         Raises:
             ValueError: 当 df 和 csv_path 均未提供时抛出异常
@@ -93,40 +348,35 @@ class BacktestEngine:
         if csv_path is not None:
             # 从 CSV 文件加载
             df = pd.read_csv(csv_path, parse_dates=True)
-            print(f"[BacktestEngine] 从 CSV 加载数据: {csv_path}")
+            if self.verbose:
+                print(f"[BacktestEngine] 从 CSV 加载数据: {csv_path}")
 
-        # 确保有 datetime 索引
-        df = df.copy()
-        time_col = None
-        for col_name in ["time", "date", "datetime", "Date", "Time", "Datetime"]:
-            if col_name in df.columns:
-                time_col = col_name
-                break
+        df = self.prepare_data(df)
 
-        if time_col is not None:
-            df[time_col] = pd.to_datetime(df[time_col])
-            df = df.set_index(time_col)
-        elif not isinstance(df.index, pd.DatetimeIndex):
-            raise ValueError("DataFrame 必须包含 'time'/'date'/'datetime' 列或 DatetimeIndex 索引")
-
-        # 日期筛选
-        if fromdate:
-            df = df[df.index >= pd.to_datetime(fromdate)]
-        if todate:
-            df = df[df.index <= pd.to_datetime(todate)]
-
-        # 标准化列名为小写
-        df.columns = [c.lower() for c in df.columns]
+        # 日期筛选：索引有序时二分查找边界后按位置切片，无需构造布尔掩码
+        if fromdate or todate:
+            if not df.index.is_monotonic_increasing:
+                df = df.sort_index()
+            lo = df.index.searchsorted(pd.Timestamp(fromdate)) if fromdate else 0
+            hi = df.index.searchsorted(pd.Timestamp(todate), side="right") if todate else len(df)
+            df = df.iloc[lo:hi]
 
         # 创建 Backtrader 数据源
-        data = bt.feeds.PandasData(
-            dataname=df,
-            openinterest=-1,  # 无持仓量数据
-        )
+        if sma_periods:
+            fast, slow = sma_periods
+            missing = [n for n in (fast, slow) if f"sma_{n}" not in df.columns]
+            if missing:
+                df = self.add_sma_columns(df, missing)
+            data = PrecomputedSMAData(dataname=df, fast_period=fast, slow_period=slow)
+        else:
+            data = NumpyData(dataname=df)
 
         self.cerebro.adddata(data)
-        print(f"[BacktestEngine] ✅ 数据加载完成 | {len(df)} 条 | "
-              f"{df.index[0].strftime('%Y-%m-%d')} ～ {df.index[-1].strftime('%Y-%m-%d')}")
+        self._df = df
+        if self.verbose:
+            dates = df.index.values
+            print(f"[BacktestEngine] ✅ 数据加载完成 | {len(df)} 条 | "
+                  f"{str(dates[0])[:10]} ～ {str(dates[-1])[:10]}")
 
     def add_strategy(self, strategy_class: Type[bt.Strategy] = DualMAStrategy, **kwargs) -> None:
         """添加交易策略
@@ -138,27 +388,41 @@ class BacktestEngine:
             **kwargs: 传递给策略的参数
         """
         self.cerebro.addstrategy(strategy_class, **kwargs)
-        print(f"[BacktestEngine] 策略已添加: {strategy_class.__name__}")
+        self._strategy = (strategy_class, kwargs)
+        if self.verbose:
+            print(f"[BacktestEngine] 策略已添加: {strategy_class.__name__}")
 
-    def run(self) -> list:
+    def run(self, fast: bool = False) -> list:
         """执行回测
 
         运行 Cerebro 引擎，执行完整的回测流程。
 
+        Args:
+            fast: 为 True 时跳过 Cerebro，改用 backtest.engine_numba 中的编译内核
+                  一次性完成撮合（仅支持 DualMAStrategy / SwingStrategy / EnhancedMAStrategy /
+                  OptimizedSwingStrategy / OptimizedSwingV2，不输出逐笔策略日志）
+
         Returns:
-            list: 回测结果列表（包含策略实例及其状态）
+            list: 回测结果列表（包含策略实例及其状态；fast 模式下为 [fast_result]）
         """
-        print("\n" + "=" * 60)
-        print(f"[BacktestEngine] 🚀 开始回测...")
-        print(f"  初始资金: {self.cerebro.broker.getvalue():,.2f}")
-        print("=" * 60 + "\n")
-
-        self.results = self.cerebro.run()
-
-        final_value = self.cerebro.broker.getvalue()
-        print("\n" + "=" * 60)
-        print(f"[BacktestEngine] 🏁 回测完成 | 最终净值: {final_value:,.2f}")
-        print("=" * 60)
+        if self.verbose:
+            print("\n" + "=" * 60)
+            print(f"[BacktestEngine] 🚀 开始回测...")
+            print(f"  初始资金: {self.cerebro.broker.getvalue():,.2f}")
+            print("=" * 60 + "\n")
+
+        if fast:
+            self.fast_result = self._run_fast()
+            self.results = [self.fast_result]
+            final_value = self.fast_result["perf"]["final_value"]
+        else:
+            self.results = self.cerebro.run()
+            final_value = self.cerebro.broker.getvalue()
+
+        if self.verbose:
+            print("\n" + "=" * 60)
+            print(f"[BacktestEngine] 🏁 回测完成 | 最终净值: {final_value:,.2f}")
+            print("=" * 60)
 
         return self.results
 
@@ -181,19 +445,27 @@ class BacktestEngine:
             print("[BacktestEngine] ⚠️ 请先执行 run() 进行回测")
             return {}
 
-        strat = self.results[0]
+        if self.fast_result is not None:
+            perf = self.fast_result["perf"]
+            self._print_perf(perf)
+            return perf
+
+        perf = self._perf_from_analyzers(self.results[0].analyzers, self.cerebro.broker.getvalue())
+        self._print_perf(perf)
+        return perf
 
-        # 提取分析器数据
-        sharpe = strat.analyzers.sharpe.get_analysis()
-        drawdown = strat.analyzers.drawdown.get_analysis()
-        returns = strat.analyzers.returns.get_analysis()
-        trades = strat.analyzers.trades.get_analysis()
+    @staticmethod
+    def _perf_from_analyzers(analyzers, final_value: float) -> dict:
+        """从策略的分析器中提取绩效字典，键同 print_performance"""
+        sharpe = analyzers.sharpe.get_analysis()
+        drawdown = analyzers.drawdown.get_analysis()
+        returns = analyzers.returns.get_analysis()
+        trades = analyzers.trades.get_analysis()
 
         # 安全获取值
         sharpe_ratio = sharpe.get("sharperatio", None)
         max_dd = drawdown.get("max", {}).get("drawdown", 0.0)
         total_return = returns.get("rtot", 0.0) * 100  # 转为百分比
-        final_value = self.cerebro.broker.getvalue()
 
         # 交易统计
         total_trades = trades.get("total", {}).get("total", 0)
@@ -209,8 +481,21 @@ class BacktestEngine:
             "won_trades": won_trades,
             "lost_trades": lost_trades,
         }
+        return perf
+
+    def _print_perf(self, perf: dict) -> None:
+        """打印绩效报告"""
+        if not self.verbose:
+            return
+
+        sharpe_ratio = perf["sharpe_ratio"]
+        max_dd = perf["max_drawdown"]
+        total_return = perf["total_return"]
+        final_value = perf["final_value"]
+        total_trades = perf["total_trades"]
+        won_trades = perf["won_trades"]
+        lost_trades = perf["lost_trades"]
 
-        # 打印绩效报告
         print("\n" + "=" * 60)
         print("📊 回测绩效报告")
         print("=" * 60)
@@ -228,7 +513,230 @@ class BacktestEngine:
             print(f"  胜率:         {win_rate:>14.1f}%")
         print("=" * 60 + "\n")
 
-        return perf
+    def _run_fast(self) -> dict:
+        """用编译内核执行回测（DualMAStrategy / SwingStrategy / EnhancedMAStrategy /
+        OptimizedSwingStrategy / OptimizedSwingV2），并按 Backtrader 分析器口径计算绩效"""
+        from backtest.engine_numba import (
+            SWING_TRADE_FIELDS, TRADE_FIELDS, _crossover, _run_dual_ma, _run_enhanced_ma,
+            _run_optimized_swing, _run_optimized_swing_v2, _run_swing, _warm_up,
+        )
+        from strategies._indicator_cache import rsi_atr
+
+        if self._df is None:
+            raise ValueError("请先调用 load_data() 加载数据")
+        _warm_up()
+        strategy_class, kwargs = self._strategy or (DualMAStrategy, {})
+        if strategy_class not in (DualMAStrategy, SwingStrategy, EnhancedMAStrategy,
+                                  OptimizedSwingStrategy, OptimizedSwingV2):
+            raise ValueError(
+                "fast 模式仅支持 DualMAStrategy / SwingStrategy / EnhancedMAStrategy / "
+                f"OptimizedSwingStrategy / OptimizedSwingV2，当前为 {strategy_class.__name__}"
+            )
+
+        params = dict(strategy_class.params._getitems())
+        params.update(kwargs)
+        df = self._df
+        open_ = df["open"].to_numpy(dtype=np.float64)
+        close = df["close"].to_numpy(dtype=np.float64)
+
+        if strategy_class is DualMAStrategy:
+            fast_sma, slow_sma = (
+                df[f"sma_{n}"].to_numpy(dtype=np.float64) if f"sma_{n}" in df.columns
+                else _bt_sma(close, n)
+                for n in (params["short_period"], params["long_period"])
+            )
+            equity, trades, open_pos = _run_dual_ma(
+                open_, close, fast_sma, slow_sma,
+                float(self.initial_cash), float(self.commission),
+            )
+            fields = TRADE_FIELDS
+        elif strategy_class is EnhancedMAStrategy:
+            short, long_ = params["short_period"], params["long_period"]
+            sma_short, sma_long = (
+                df[f"sma_{n}"].to_numpy(dtype=np.float64) if f"sma_{n}" in df.columns
+                else _bt_sma(close, n)
+                for n in (short, long_)
+            )
+            rsi, atr = rsi_atr(
+                _column(df, "high"), _column(df, "low"), _column(df, "close"),
+                params["rsi_period"], params["atr_period"],
+            )
+            first = max(short + 1, long_ + 1, params["rsi_period"] + 1, params["atr_period"] + 1) - 1
+            equity, trades, open_pos = _run_enhanced_ma(
+                open_, close, _crossover(sma_short, sma_long, max(short, long_) - 1), rsi, atr, first,
+                float(self.initial_cash), float(self.commission),
+                float(params["rsi_upper"]), float(params["atr_sl_mult"]), float(params["atr_tp_mult"]),
+                float(params["trail_atr_mult"]), float(params["risk_pct"]),
+            )
+            fields = SWING_TRADE_FIELDS
+        elif strategy_class in (OptimizedSwingStrategy, OptimizedSwingV2):
+            arrays = (*_optimized_swing_inputs(df, params),
+                      float(self.initial_cash), float(self.commission),
+                      float(params["rsi_long_min"]), float(params["rsi_short_max"]),
+                      float(params["adx_threshold"]), float(params["atr_sl_mult"]))
+            if strategy_class is OptimizedSwingStrategy:
+                equity, trades, open_pos = _run_optimized_swing(
+                    *arrays,
+                    float(params["atr_tp1_mult"]), float(params["tp1_close_pct"]),
+                    float(params["trail_atr_mult"]), float(params["risk_pct"]),
+                    float(params["max_ma_spread"]), int(params["reentry_cooldown"]),
+                    bool(params["enable_short"]), EXHAUSTION_SLOPE_PERIOD,
+                )
+            else:
+                equity, trades, open_pos = _run_optimized_swing_v2(
+                    *arrays,
+                    float(params["atr_trail_trigger"]), float(params["trail_atr_mult"]),
+                    float(params["breakeven_trigger"]), float(params["risk_pct"]),
+                    float(params["max_ma_spread"]), int(params["reentry_cooldown"]),
+                    bool(params["enable_short"]),
+                )
+            fields = SWING_TRADE_FIELDS
+        else:
+            equity, trades, open_pos = _run_swing(
+                *_swing_inputs(df, params),
+                float(self.initial_cash), float(self.commission),
+                float(params["rsi_upper"]), float(params["adx_threshold"]),
+                float(params["atr_sl_mult"]), float(params["atr_tp_mult"]),
+                float(params["trail_atr_mult"]), float(params["risk_pct"]),
+                int(params["reentry_cooldown"]),
+            )
+            fields = SWING_TRADE_FIELDS
+
+        # 最大回撤（DrawDown）：相对历史最高净值的百分比
+        peak = np.maximum.accumulate(np.concatenate(([self.initial_cash], equity)))[1:]
+        max_dd = float((100.0 * (peak - equity) / peak).max()) if len(equity) else 0.0
+
+        # 夏普比率（SharpeRatio，timeframe=Days）：按自然日取收盘净值计算日收益，
+        # 无风险利率 1% 折算为日利率，总体标准差，按 252 年化；
+        # 均值与方差同 Backtrader 一样用 math.fsum 求和，结果逐位一致
+        day_end = pd.Series(equity, index=df.index).groupby(df.index.normalize()).last().to_numpy()
+        rets = day_end / np.concatenate(([self.initial_cash], day_end[:-1])) - 1.0
+        excess = (rets - (pow(1.01, 1.0 / 252) - 1.0)).tolist()
+        sharpe_ratio = None
+        if excess:
+            avg = math.fsum(excess) / len(excess)
+            std = math.sqrt(math.fsum([(x - avg) ** 2.0 for x in excess]) / len(excess))
+            if std > 0:
+                sharpe_ratio = math.sqrt(252) * (avg / std)
+
+        final_value = float(equity[-1]) if len(equity) else float(self.initial_cash)
+        pnlcomm = trades[:, 5]
+        won_trades = int((pnlcomm >= 0).sum())
+        perf = {
+            "sharpe_ratio": sharpe_ratio,
+            "max_drawdown": max_dd,
+            # Returns.rtot 为对数收益（同样用 math.log）；做空亏损可使净值非正，此时与 Returns 一样记为 -inf
+            "total_return": (math.log(final_value / self.initial_cash) * 100
+                             if final_value > 0.0 else float("-inf")),
+            "final_value": final_value,
+            "total_trades": len(trades) + int(open_pos),
+            "won_trades": won_trades,
+            "lost_trades": len(trades) - won_trades,
+        }
+        return {
+            "equity": equity,
+            "trades": pd.DataFrame(trades, columns=list(fields)),
+            "perf": perf,
+        }
+
+    def run_many(self, fast_range, slow_range) -> np.ndarray:
+        """双均线参数网格扫描
+
+        对 fast_range × slow_range 的每组 (短周期, 长周期) 用编译内核并行回测，
+        收盘价前缀和在所有组合间共享，安装 numba 时按 CPU 核数并行。
+        夏普比率口径与 run(fast=True) 一致。
+
+        Args:
+            fast_range: 短期均线周期序列，如 range(5, 50)
+            slow_range: 长期均线周期序列，如 range(20, 200, 5)
+
+        Returns:
+            np.ndarray: 形状 (len(fast_range), len(slow_range)) 的夏普比率矩阵，
+            短周期不小于长周期或无法计算的组合为 NaN
+        """
+        from backtest.engine_numba import _sweep
+
+        if self._df is None:
+            raise ValueError("请先调用 load_data() 加载数据")
+
+        df = self._df
+        days = df.index.normalize()
+        day_end = np.flatnonzero(np.append(days[1:] != days[:-1], True))
+        return _sweep(
+            df["open"].to_numpy(dtype=np.float64),
+            df["close"].to_numpy(dtype=np.float64),
+            day_end,
+            np.asarray(fast_range, dtype=np.int64),
+            np.asarray(slow_range, dtype=np.int64),
+            float(self.initial_cash), float(self.commission),
+        )
+
+    def run_param_grid(self, strategy_class: Type[bt.Strategy], param_sets: list) -> np.ndarray:
+        """SwingStrategy / OptimizedSwingStrategy / OptimizedSwingV2 参数组并行扫描
+
+        各组参数按指标周期（均线、RSI、ADX、ATR、MACD）分组，每组指标数组只算一次；
+        其余参数按固定列序排成 float64 矩阵，连同各周期组的指标一起交给编译内核，
+        所有参数组在一次 prange 中回测，安装 numba 时按 CPU 核数并行。夏普比率口径与 run_many 一致。
+
+        Args:
+            strategy_class: SwingStrategy、OptimizedSwingStrategy 或 OptimizedSwingV2
+            param_sets: 参数字典列表，未给出的参数取策略默认值
+
+        Returns:
+            np.ndarray: 与 param_sets 等长的夏普比率数组，收益无波动的参数组为 NaN
+
+        Raises:
+            ValueError: 未加载数据，或 strategy_class 不受支持
+        """
+        from backtest.engine_numba import (
+            OPTIMIZED_SWING_SWEEP_FIELDS, OPTIMIZED_SWING_V2_SWEEP_FIELDS, SWING_SWEEP_FIELDS,
+            _sweep_optimized_swing, _sweep_swing, _warm_up,
+        )
+
+        if self._df is None:
+            raise ValueError("请先调用 load_data() 加载数据")
+        _warm_up()
+        if strategy_class is SwingStrategy:
+            fields, periods = SWING_SWEEP_FIELDS, _SWING_STRATEGY_PERIOD_PARAMS
+        elif strategy_class is OptimizedSwingStrategy:
+            fields, periods = OPTIMIZED_SWING_SWEEP_FIELDS, _SWING_PERIOD_PARAMS
+        elif strategy_class is OptimizedSwingV2:
+            fields, periods = OPTIMIZED_SWING_V2_SWEEP_FIELDS, _SWING_PERIOD_PARAMS
+        else:
+            raise ValueError(
+                "run_param_grid 仅支持 SwingStrategy / OptimizedSwingStrategy / OptimizedSwingV2，"
+                f"当前为 {strategy_class.__name__}"
+            )
+
+        defaults = dict(strategy_class.params._getitems())
+        full = [{**defaults, **p} for p in param_sets]
+        if not full:
+            return np.full(0, np.nan)
+        groups = {}
+        for k, p in enumerate(full):
+            groups.setdefault(tuple(p[name] for name in periods), []).append(k)
+
+        df = self._df
+        days = df.index.normalize()
+        day_end = np.flatnonzero(np.append(days[1:] != days[:-1], True))
+
+        # 各周期组的指标数组堆叠为 (组数, K 线数)，行情数组各组共用；所有参数组在一次 prange 中并行
+        swing = strategy_class is SwingStrategy
+        inputs_of = _swing_inputs if swing else _optimized_swing_inputs
+        n_shared = 2 if swing else 4
+        group = np.empty(len(full), dtype=np.int64)
+        inputs = []
+        for g, idx in enumerate(groups.values()):
+            group[idx] = g
+            inputs.append(inputs_of(df, full[idx[0]]))
+        shared = inputs[0][:n_shared]
+        stacked = [np.stack(col) for col in zip(*(x[n_shared:-1] for x in inputs))]
+        first = np.array([x[-1] for x in inputs], dtype=np.int64)
+        grid = np.array([[float(p[name]) for name in fields] for p in full], dtype=np.float64)
+        args = (*shared, *stacked, first, float(self.initial_cash), float(self.commission), day_end, grid, group)
+        if swing:
+            return _sweep_swing(*args)
+        return _sweep_optimized_swing(*args, strategy_class is OptimizedSwingV2, EXHAUSTION_SLOPE_PERIOD)
 
     def plot(self) -> None:
         """绘制回测结果图表
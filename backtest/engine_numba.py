@@ -0,0 +1,1144 @@
+"""
+engine_numba.py - 编译型回测内核
+
+将各策略的逐 K 线撮合逻辑改写为基于 NumPy 数组的单循环，
+安装 numba 时以 @njit 编译为本地代码，免去 Backtrader 在 Python 层
+逐根驱动指标、策略与经纪商的开销；未安装 numba 时退化为普通 Python 函数，
+结果一致，仅速度较慢。由 BacktestEngine.run(fast=True) 与 run_param_grid 调用。
+
+内容：
+    - 指标：_fsum_sma（各窗口 math.fsum 精确求和，与 Backtrader SMA 逐位一致）、
+      _smma / _ema（Wilder 平滑与指数均线）、_rsi_atr、_adx_dmi、_macd_hist、_crossover
+    - 回测内核（每个策略一个）：
+        _run_dual_ma              DualMAStrategy
+        _run_enhanced_ma          EnhancedMAStrategy
+        _run_swing                SwingStrategy
+        _run_optimized_swing      OptimizedSwingStrategy
+        _run_optimized_swing_v2   OptimizedSwingV2
+    - 参数网格并行回测（@njit(parallel=True)，各组合以 prange 分发）：
+      _sweep（双均线，收盘价前缀和只算一次）、_sweep_swing、_sweep_optimized_swing
+
+撮合规则与 Backtrader 默认设置保持一致：
+    - 信号在当根 K 线收盘时产生，下一根 K 线开盘价成交（市价单）
+    - 提交时按下单收盘价、成交时按开盘价各检查一次资金，不足则拒单
+    - 手续费按成交金额的百分比收取，资金增减按 BackBroker 的运算顺序展开
+单次回测内核的净值与成交记录与 Cerebro 逐位一致（test_integration.py 逐策略比对）；
+_sweep 的均线由前缀和差分得到，只用于参数筛选。
+
+使用方法：
+    from backtest.engine_numba import _run_dual_ma, _fsum_sma
+    equity, trades, open_pos = _run_dual_ma(open_, close, _fsum_sma(close, 10), _fsum_sma(close, 30),
+                                            100000.0, 0.001)
+"""
+
+import math
+
+import numpy as np
+
+try:
+    from numba import njit, prange
+    _HAS_NUMBA = True
+except ImportError:  # 未安装 numba 时退化为普通 Python 函数
+    _HAS_NUMBA = False
+    prange = range
+
+    def njit(*args, **kwargs):
+        if len(args) == 1 and callable(args[0]) and not kwargs:
+            return args[0]
+        return lambda func: func
+
+
+# 成交记录列：开仓下标、平仓下标、开仓价、平仓价、毛利润、净利润
+TRADE_FIELDS = ("entry_idx", "exit_idx", "entry_price", "exit_price", "pnl", "pnlcomm")
+
+
+@njit(cache=True, nogil=True)
+def _fsum(x, start, stop, partials):
+    """x[start:stop] 的精确舍入和，与 math.fsum 逐位一致（移植 CPython 的 Shewchuk 部分和算法）
+
+    partials 为长度不小于 stop - start 的工作数组；含 NaN / inf 时返回其普通和。
+    """
+    n = 0
+    special = 0.0
+    for k in range(start, stop):
+        x_k = x[k]
+        if not math.isfinite(x_k):
+            special += x_k
+            continue
+        i = 0
+        for j in range(n):
+            y = partials[j]
+            if abs(x_k) < abs(y):
+                x_k, y = y, x_k
+            hi = x_k + y
+            lo = y - (hi - x_k)
+            if lo != 0.0:
+                partials[i] = lo
+                i += 1
+            x_k = hi
+        n = i
+        if x_k != 0.0:
+            partials[n] = x_k
+            n += 1
+    if special != 0.0 or math.isnan(special):
+        return special
+
+    hi = 0.0
+    if n > 0:
+        n -= 1
+        hi = partials[n]
+        lo = 0.0
+        while n > 0:
+            x_k = hi
+            n -= 1
+            y = partials[n]
+            hi = x_k + y
+            lo = y - (hi - x_k)
+            if lo != 0.0:
+                break
+        # 残差与下一部分和同号时，按“四舍六入五成双”修正末位
+        if n > 0 and ((lo < 0.0 and partials[n - 1] < 0.0) or (lo > 0.0 and partials[n - 1] > 0.0)):
+            y = lo * 2.0
+            x_k = hi + y
+            if y == x_k - hi:
+                hi = x_k
+    return hi
+
+
+@njit(cache=True, nogil=True)
+def _fsum_sma(close, period):
+    """与 Backtrader SMA 逐位一致的简单移动平均（各窗口 math.fsum 精确求和后除以周期），
+    前 period-1 个值为 NaN"""
+    n = len(close)
+    out = np.full(n, np.nan)
+    partials = np.empty(period + 1)
+    for i in range(period, n + 1):
+        out[i - 1] = _fsum(close, i - period, i, partials) / period
+    return out
+
+
+def _fsum_sma_py(close, period):
+    """_fsum_sma 的纯 Python 实现（未安装 numba 时使用，直接调用 math.fsum）"""
+    values = np.asarray(close, dtype=np.float64).tolist()
+    out = np.full(len(values), np.nan)
+    if period <= len(values):
+        out[period - 1:] = [
+            math.fsum(values[i - period:i]) / period for i in range(period, len(values) + 1)
+        ]
+    return out
+
+
+if not _HAS_NUMBA:
+    _fsum_sma = _fsum_sma_py
+
+
+@njit(cache=True, nogil=True)
+def _run_dual_ma(open_, close, fast_sma, slow_sma, cash, commission):
+    """双均线交叉回测内核
+
+    Args:
+        open_, close: 开盘价 / 收盘价（float64）
+        fast_sma, slow_sma: 短期 / 长期均线，预热期为 NaN
+        cash: 初始资金
+        commission: 手续费比例
+
+    Returns:
+        (equity, trades, open_pos):
+            equity   每根 K 线收盘后的账户净值
+            trades   已平仓交易，形状 (k, 6)，列含义见 TRADE_FIELDS
+            open_pos 回测结束时是否仍有持仓（1/0）
+    """
+    n = len(close)
+    equity = np.empty(n)
+    trades = np.empty((n // 2 + 1, 6))
+    k = 0
+
+    pos = 0
+    pending = 0  # 上一根 K 线发出的订单：1 买入，-1 卖出
+    entry_idx = -1
+    entry_price = 0.0
+    entry_comm = 0.0
+    last_nz = 0.0  # 最近一次非零均线差（对应 Backtrader 的 NonZeroDifference）
+
+    for i in range(n):
+        # 1) 以本根开盘价撮合挂单
+        # （资金按 BackBroker 的运算顺序增减，与 Cerebro 逐位一致）
+        if pending == 1:
+            # 提交时按下单收盘价、成交时按开盘价各检查一次资金，不足则拒单
+            left = cash - close[i - 1]
+            left -= commission * close[i - 1]
+            if left >= 0.0:
+                price = open_[i]
+                comm = commission * price
+                left = cash - price
+                left -= comm
+                if left >= 0.0:
+                    cash = left
+                    pos = 1
+                    entry_idx = i
+                    entry_price = price
+                    entry_comm = comm
+        elif pending == -1:
+            price = open_[i]
+            pnl = price - entry_price
+            cash += entry_price + pnl
+            comm = commission * price
+            cash -= comm
+            pos = 0
+            trades[k, 0] = entry_idx
+            trades[k, 1] = i
+            trades[k, 2] = entry_price
+            trades[k, 3] = price
+            trades[k, 4] = pnl
+            trades[k, 5] = pnl - (entry_comm + comm)
+            k += 1
+        pending = 0
+
+        # 2) 收盘检测交叉：上一非零差值异号且当前差值越过 0
+        diff = fast_sma[i] - slow_sma[i]
+        if not np.isnan(diff):
+            if pos == 0 and last_nz < 0.0 and diff > 0.0:
+                pending = 1
+            elif pos == 1 and last_nz > 0.0 and diff < 0.0:
+                pending = -1
+            if diff != 0.0:
+                last_nz = diff
+
+        if pos == 1:
+            unrealized = close[i] - entry_price
+            equity[i] = cash + ((close[i] - unrealized) + unrealized)
+        else:
+            equity[i] = cash
+
+    return equity, trades[:k], pos
+
+
+@njit(cache=True, nogil=True)
+def _sma_from_csum(csum, window):
+    """由前缀和（首元素为 0）差分得到简单移动平均，前 window-1 个值为 NaN"""
+    n = len(csum) - 1
+    out = np.full(n, np.nan)
+    for i in range(window - 1, n):
+        out[i] = (csum[i + 1] - csum[i + 1 - window]) / window
+    return out
+
+
+@njit(cache=True, nogil=True)
+def _daily_sharpe(day_equity, cash):
+    """按日末净值计算年化夏普比率（与 _run_fast / Backtrader SharpeRatio 口径一致）
+
+    无风险利率 1% 折算为日利率，总体标准差，按 252 年化；标准差为 0 时返回 NaN。
+    """
+    m = len(day_equity)
+    if m == 0:
+        return np.nan
+    rf = 1.01 ** (1.0 / 252) - 1.0
+    excess = np.empty(m)
+    prev = cash
+    for i in range(m):
+        excess[i] = (day_equity[i] - prev) / prev - rf
+        prev = day_equity[i]
+    std = excess.std()
+    if std <= 0.0:
+        return np.nan
+    return excess.mean() / std * np.sqrt(252.0)
+
+
+@njit(cache=True, parallel=True)
+def _sweep(open_, close, day_end, fast_arr, slow_arr, cash, commission):
+    """双均线参数网格并行回测
+
+    Args:
+        open_, close: 开盘价 / 收盘价（float64）
+        day_end: 每个自然日最后一根 K 线的下标，用于取日末净值
+        fast_arr, slow_arr: 短期 / 长期均线周期（int64）
+        cash: 初始资金
+        commission: 手续费比例
+
+    Returns:
+        形状 (len(fast_arr), len(slow_arr)) 的夏普比率矩阵；
+        短周期不小于长周期或收益无波动的组合为 NaN
+    """
+    n = len(close)
+    csum = np.zeros(n + 1)
+    for i in range(n):
+        csum[i + 1] = csum[i] + close[i]
+
+    n_fast = len(fast_arr)
+    n_slow = len(slow_arr)
+    grid = np.full((n_fast, n_slow), np.nan)
+    for k in prange(n_fast * n_slow):
+        i = k // n_slow
+        j = k % n_slow
+        if fast_arr[i] >= slow_arr[j]:
+            continue
+        equity, _, _ = _run_dual_ma(
+            open_, close,
+            _sma_from_csum(csum, fast_arr[i]), _sma_from_csum(csum, slow_arr[j]),
+            cash, commission,
+        )
+        grid[i, j] = _daily_sharpe(equity[day_end], cash)
+    return grid
+
+
+# ============================================================
+# SwingStrategy 编译内核
+# ============================================================
+# 指标逐位复现 Backtrader 的计算方式（SmoothedMovingAverage 以 math.fsum 求种子均值，
+# 之后 prev * (1 - 1/period) + x * (1/period) 递推），撮合与资金计算按 BackBroker
+# 的运算顺序展开，回测结果与 Cerebro 一致。
+
+# 成交记录列：在 TRADE_FIELDS 之后追加成交数量
+SWING_TRADE_FIELDS = TRADE_FIELDS + ("size",)
+
+
+@njit(cache=True, nogil=True)
+def _smooth(x, start, seed, alpha):
+    """从 start 处的种子值开始按系数 alpha 做指数平滑，start 之前为 NaN"""
+    n = len(x)
+    out = np.full(n, np.nan)
+    if start >= n:
+        return out
+    alpha1 = 1.0 - alpha
+    prev = seed
+    out[start] = prev
+    for i in range(start + 1, n):
+        prev = prev * alpha1 + x[i] * alpha
+        out[i] = prev
+    return out
+
+
+def _smma(x: np.ndarray, first: int, period: int) -> np.ndarray:
+    """Backtrader SmoothedMovingAverage：x 自下标 first 起有效，种子为前 period 个有效值的精确均值"""
+    start = first + period - 1
+    seed = math.fsum(x[first:start + 1].tolist()) / period if start < len(x) else np.nan
+    return _smooth(x, start, seed, 1.0 / period)
+
+
+def _ema(x: np.ndarray, first: int, period: int) -> np.ndarray:
+    """Backtrader ExponentialMovingAverage：种子同 _smma，平滑系数为 2 / (1 + period)"""
+    start = first + period - 1
+    seed = math.fsum(x[first:start + 1].tolist()) / period if start < len(x) else np.nan
+    return _smooth(x, start, seed, 2.0 / (1.0 + period))
+
+
+@njit(cache=True, nogil=True)
+def _crossover(fast, slow, start):
+    """Backtrader CrossOver：1 上穿、-1 下穿、0 无交叉，start 为两条均线同时有效的首个下标
+
+    上一根的非零均线差（NonZeroDifference）小于 0 且当前短均线高于长均线为上穿，反之为下穿。
+    两个方向的判断写成布尔相减，循环体内不分支。
+    """
+    n = len(fast)
+    out = np.full(n, np.nan)
+    if start >= n:
+        return out
+    prev = fast[start] - slow[start]
+    for i in range(start + 1, n):
+        up = (prev < 0.0) & (fast[i] > slow[i])
+        down = (prev > 0.0) & (fast[i] < slow[i])
+        out[i] = int(up) - int(down)
+        d = fast[i] - slow[i]
+        if d != 0.0:
+            prev = d
+    return out
+
+
+def _rsi_atr(high, low, close, rsi_period, atr_period):
+    """按 Backtrader 口径计算 RSI / ATR
+
+    Returns:
+        (rsi, atr)，预热期为 NaN
+    """
+    prev_close = np.concatenate(([np.nan], close[:-1]))
+
+    # RSI：涨跌幅分别做 Wilder 平滑
+    maup = _smma(np.maximum(close - prev_close, 0.0), 1, rsi_period)
+    madown = _smma(np.maximum(prev_close - close, 0.0), 1, rsi_period)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        rsi = 100.0 - 100.0 / (1.0 + maup / madown)
+
+    # ATR：真实波幅的 Wilder 平滑
+    tr = np.maximum(high, prev_close) - np.minimum(low, prev_close)
+    return rsi, _smma(tr, 1, atr_period)
+
+
+def _adx_dmi(high, low, close, adx_period):
+    """按 Backtrader 口径计算 ADX / +DI / -DI
+
+    Returns:
+        (adx, plus_di, minus_di)，预热期为 NaN
+    """
+    nan1 = np.array([np.nan])
+    prev_close = np.concatenate((nan1, close[:-1]))
+    tr = np.maximum(high, prev_close) - np.minimum(low, prev_close)
+    upmove = high - np.concatenate((nan1, high[:-1]))
+    downmove = np.concatenate((nan1, low[:-1])) - low
+    plus_dm = np.where((upmove > downmove) & (upmove > 0.0), upmove, 0.0)
+    minus_dm = np.where((downmove > upmove) & (downmove > 0.0), downmove, 0.0)
+    adx_atr = _smma(tr, 1, adx_period)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        plus_di = 100.0 * _smma(plus_dm, 1, adx_period) / adx_atr
+        minus_di = 100.0 * _smma(minus_dm, 1, adx_period) / adx_atr
+        dx = np.abs(plus_di - minus_di) / (plus_di + minus_di)
+    adx = 100.0 * _smma(dx, adx_period, adx_period)
+    return adx, plus_di, minus_di
+
+
+def _macd_hist(close, fast_period, slow_period, signal_period):
+    """按 Backtrader 口径计算 MACD 柱（MACD 线 - 信号线）
+
+    Returns:
+        MACD 柱，前 slow_period + signal_period - 2 个值为 NaN
+    """
+    macd = _ema(close, 0, fast_period) - _ema(close, 0, slow_period)
+    return macd - _ema(macd, slow_period - 1, signal_period)
+
+
+@njit(cache=True, nogil=True)
+def _run_swing(open_, close, sma_short, sma_long, cross, rsi, adx, plus_di, minus_di, atr,
+               first, cash, commission, rsi_upper, adx_threshold, atr_sl_mult, atr_tp_mult,
+               trail_atr_mult, risk_pct, reentry_cooldown):
+    """SwingStrategy 回测内核
+
+    Args:
+        open_, close: 开盘价 / 收盘价（float64）
+        sma_short, sma_long, cross, rsi, adx, plus_di, minus_di, atr: 预计算指标
+        first: 策略首次执行 next() 的下标（所有指标预热完成）
+        cash: 初始资金
+        commission: 手续费比例
+        其余参数与 SwingStrategy 同名参数一致
+
+    Returns:
+        (equity, trades, open_pos):
+            equity   每根 K 线收盘后的账户净值
+            trades   已平仓交易，形状 (k, 7)，列含义见 SWING_TRADE_FIELDS
+            open_pos 回测结束时是否仍有持仓（1/0）
+    """
+    n = len(close)
+    equity = np.empty(n)
+    trades = np.empty((n // 2 + 1, 7))
+    k = 0
+
+    pos = 0.0
+    pos_price = 0.0
+    pending = 0  # 上一根 K 线发出的订单：1 买入，-1 平仓
+    order_size = 0.0
+    order_price = 0.0  # 下单时的收盘价，提交时按此价预检资金
+    entry_idx = -1
+    entry_comm = 0.0
+    trade_price = 0.0
+
+    stop_price = 0.0
+    trail_activated = False
+    highest = 0.0
+    last_exit_bar = -999
+
+    for i in range(n):
+        # 1) 以本根开盘价撮合挂单
+        if pending == 1:
+            # 提交时按下单收盘价、成交时按开盘价各检查一次资金，不足则拒单
+            left = cash - order_size * order_price
+            left -= order_size * commission * order_price
+            if left >= 0.0:
+                price = open_[i]
+                comm = order_size * commission * price
+                left = cash - order_size * price
+                left -= comm
+                if left >= 0.0:
+                    cash = left
+                    pos = order_size
+                    pos_price = price
+                    entry_idx = i
+                    entry_comm = comm
+                    trade_price = (order_size * price) / order_size
+                    stop_price = price - atr[i] * atr_sl_mult
+                    highest = price
+                    trail_activated = False
+        elif pending == -1:
+            price = open_[i]
+            pnl = pos * (price - pos_price)
+            cash += pos * pos_price + pnl
+            comm = pos * commission * price
+            cash -= comm
+            trade_pnl = pos * (price - trade_price)
+            trades[k, 0] = entry_idx
+            trades[k, 1] = i
+            trades[k, 2] = trade_price
+            trades[k, 3] = price
+            trades[k, 4] = trade_pnl
+            trades[k, 5] = trade_pnl - (entry_comm + comm)
+            trades[k, 6] = pos
+            k += 1
+            pos = 0.0
+            pos_price = 0.0
+            last_exit_bar = i + 1
+            stop_price = 0.0
+            highest = 0.0
+            trail_activated = False
+        pending = 0
+
+        # 2) 收盘净值（与 BackBroker 相同的运算顺序）
+        if pos > 0.0:
+            unrealized = pos * (close[i] - pos_price)
+            value = cash + ((pos * close[i] - unrealized) + unrealized)
+        else:
+            value = cash
+        equity[i] = value
+
+        if i < first:
+            continue
+
+        # 3) 策略逻辑
+        price = close[i]
+        if pos > 0.0:
+            highest = max(highest, price)
+
+            if not trail_activated and highest - pos_price >= atr[i] * atr_tp_mult:
+                trail_activated = True
+
+            if trail_activated:
+                trail_stop = highest - atr[i] * trail_atr_mult
+                if trail_stop > stop_price:
+                    stop_price = trail_stop
+
+            if stop_price != 0.0 and price <= stop_price:
+                pending = -1
+                continue
+
+            # 死叉且短均线低于长均线 0.3% 才平仓
+            if cross[i] < 0.0 and (sma_short[i] - sma_long[i]) / sma_long[i] * 100 < -0.3:
+                pending = -1
+        else:
+            if i + 1 - last_exit_bar < reentry_cooldown:
+                continue
+            if cross[i] <= 0.0 or rsi[i] < rsi_upper or adx[i] < adx_threshold:
+                continue
+            if plus_di[i] <= minus_di[i]:
+                continue
+
+            # 基于 ATR 的动态仓位
+            if atr[i] <= 0.0:
+                order_size = 1.0
+            else:
+                order_size = float(max(int(value * risk_pct / (atr[i] * atr_sl_mult)), 1))
+            order_price = price
+            pending = 1
+
+    return equity, trades[:k], 1 if pos > 0.0 else 0
+
+
+@njit(cache=True, nogil=True)
+def _run_enhanced_ma(open_, close, cross, rsi, atr, first, cash, commission,
+                     rsi_upper, atr_sl_mult, atr_tp_mult, trail_atr_mult, risk_pct):
+    """EnhancedMAStrategy 回测内核
+
+    持仓期间的最高价、移动止盈激活与止损线均为循环内的标量状态，
+    撮合与资金检查同 _run_swing。
+
+    Args:
+        open_, close: 开盘价 / 收盘价（float64）
+        cross, rsi, atr: 预计算指标
+        first: 策略首次执行 next() 的下标（所有指标预热完成）
+        cash: 初始资金
+        commission: 手续费比例
+        其余参数与 EnhancedMAStrategy 同名参数一致
+
+    Returns:
+        (equity, trades, open_pos): 含义同 _run_swing，trades 列见 SWING_TRADE_FIELDS
+    """
+    n = len(close)
+    equity = np.empty(n)
+    trades = np.empty((n // 2 + 1, 7))
+    k = 0
+
+    pos = 0.0
+    pos_price = 0.0
+    pending = 0  # 上一根 K 线发出的订单：1 买入，-1 平仓
+    order_size = 0.0
+    order_price = 0.0  # 下单时的收盘价，提交时按此价预检资金
+    entry_idx = -1
+    entry_comm = 0.0
+    trade_price = 0.0
+
+    stop_price = 0.0
+    trail_activated = False
+    highest = 0.0
+
+    for i in range(n):
+        # 1) 以本根开盘价撮合挂单
+        if pending == 1:
+            # 提交时按下单收盘价、成交时按开盘价各检查一次资金，不足则拒单
+            left = cash - order_size * order_price
+            left -= order_size * commission * order_price
+            if left >= 0.0:
+                price = open_[i]
+                comm = order_size * commission * price
+                left = cash - order_size * price
+                left -= comm
+                if left >= 0.0:
+                    cash = left
+                    pos = order_size
+                    pos_price = price
+                    entry_idx = i
+                    entry_comm = comm
+                    trade_price = (order_size * price) / order_size
+                    stop_price = price - atr[i] * atr_sl_mult
+                    highest = price
+                    trail_activated = False
+        elif pending == -1:
+            price = open_[i]
+            pnl = pos * (price - pos_price)
+            cash += pos * pos_price + pnl
+            comm = pos * commission * price
+            cash -= comm
+            trade_pnl = pos * (price - trade_price)
+            trades[k, 0] = entry_idx
+            trades[k, 1] = i
+            trades[k, 2] = trade_price
+            trades[k, 3] = price
+            trades[k, 4] = trade_pnl
+            trades[k, 5] = trade_pnl - (entry_comm + comm)
+            trades[k, 6] = pos
+            k += 1
+            pos = 0.0
+            pos_price = 0.0
+            stop_price = 0.0
+            highest = 0.0
+            trail_activated = False
+        pending = 0
+
+        # 2) 收盘净值（与 BackBroker 相同的运算顺序）
+        if pos > 0.0:
+            unrealized = pos * (close[i] - pos_price)
+            value = cash + ((pos * close[i] - unrealized) + unrealized)
+        else:
+            value = cash
+        equity[i] = value
+
+        if i < first:
+            continue
+
+        # 3) 策略逻辑
+        price = close[i]
+        if pos > 0.0:
+            highest = max(highest, price)
+
+            if not trail_activated and highest - pos_price >= atr[i] * atr_tp_mult:
+                trail_activated = True
+
+            if trail_activated:
+                trail_stop = highest - atr[i] * trail_atr_mult
+                if trail_stop > stop_price:
+                    stop_price = trail_stop
+
+            # 触及止损（含移动止盈）或死叉 → 平仓
+            if price <= stop_price or cross[i] < 0.0:
+                pending = -1
+        elif cross[i] > 0.0 and rsi[i] > rsi_upper:
+            # 基于 ATR 的动态仓位
+            if atr[i] <= 0.0:
+                order_size = 1.0
+            else:
+                order_size = float(max(int(value * risk_pct / (atr[i] * atr_sl_mult)), 1))
+            order_price = price
+            pending = 1
+
+    return equity, trades[:k], 1 if pos > 0.0 else 0
+
+
+@njit(cache=True, nogil=True)
+def _submit_cash(cash, order_size, order_price, commission, opening):
+    """BackBroker 提交订单时按下单收盘价试算的成交后现金（为负则拒单），order_size 带方向"""
+    if opening:
+        left = cash - order_size * order_price
+    else:
+        left = cash + (-order_size * order_price + 0.0)
+    left -= abs(order_size) * commission * order_price
+    return left
+
+
+@njit(cache=True, nogil=True)
+def _shortcash_value(cash, pos, pos_price, price):
+    """按 BackBroker shortcash 口径的账户净值（与其运算顺序相同，空头持仓市值为负）"""
+    if pos > 0.0:
+        unrealized = pos * (price - pos_price)
+        return cash + ((pos * price - unrealized) + unrealized)
+    if pos < 0.0:
+        return cash + pos * price
+    return cash
+
+
+@njit(cache=True, nogil=True)
+def _atr_size(value, risk_pct, atr, atr_sl_mult):
+    """按 ATR 止损距离折算的开仓数量（至少 1 手；ATR 非正时为 1 手）"""
+    if atr <= 0.0:
+        return 1.0
+    return float(max(int(value * risk_pct / (atr * atr_sl_mult)), 1))
+
+
+@njit(cache=True, nogil=True)
+def _swing_entry_direction(cross, spread, rsi, adx, plus_di, minus_di, macd_hist,
+                           rsi_long_min, rsi_short_max, adx_threshold, max_ma_spread, enable_short):
+    """OptimizedSwingStrategy / OptimizedSwingV2 共用的入场过滤：1 做多、-1 做空、0 不入场"""
+    if cross > 0.0:
+        if (abs(spread) > max_ma_spread or rsi < rsi_long_min
+                or adx < adx_threshold or plus_di <= minus_di):
+            return 0
+        return 1
+    if cross < 0.0 and enable_short:
+        if (abs(spread) > max_ma_spread or rsi > rsi_short_max
+                or adx < adx_threshold or minus_di <= plus_di or macd_hist >= 0.0):
+            return 0
+        return -1
+    return 0
+
+
+@njit(cache=True, nogil=True)
+def _run_optimized_swing(open_, high, low, close, sma_short, sma_long, cross, rsi, adx, plus_di,
+                         minus_di, macd_hist, atr, first, cash, commission,
+                         rsi_long_min, rsi_short_max, adx_threshold, atr_sl_mult, atr_tp1_mult,
+                         tp1_close_pct, trail_atr_mult, risk_pct, max_ma_spread,
+                         reentry_cooldown, enable_short, exhaustion_period):
+    """OptimizedSwingStrategy 回测内核
+
+    双向持仓、第一止盈分批平仓、保本后移动止损、趋势衰竭离场均为循环内的标量状态。
+    做空按 BackBroker 默认的 shortcash 口径记账：开空时现金增加卖出金额，持仓市值为负；
+    分批平仓不结束交易，交易盈亏与手续费逐次累加，全部平仓时记为一笔。
+
+    Args:
+        open_, high, low, close: 开盘价 / 最高价 / 最低价 / 收盘价（float64）
+        sma_short, sma_long, cross, rsi, adx, plus_di, minus_di, macd_hist, atr: 预计算指标
+        first: 策略首次执行 next() 的下标（所有指标预热完成）
+        cash: 初始资金
+        commission: 手续费比例
+        exhaustion_period: 趋势衰竭检查的短均线斜率回看周期
+        其余参数与 OptimizedSwingStrategy 同名参数一致
+
+    Returns:
+        (equity, trades, open_pos): 含义同 _run_swing，trades 列见 SWING_TRADE_FIELDS，
+        其中 size 为开仓数量（做空为负）
+    """
+    n = len(close)
+    equity = np.empty(n)
+    trades = np.empty((n // 2 + 1, 7))
+    k = 0
+
+    pos = 0.0
+    pos_price = 0.0
+    pending = 0  # 上一根 K 线发出的订单：1 开仓，-1 平仓（含分批）
+    order_size = 0.0  # 带方向的订单数量
+    order_price = 0.0  # 下单时的收盘价，提交时按此价预检资金
+    entry_idx = -1
+    trade_price = 0.0
+    trade_size = 0.0
+    trade_pnl = 0.0
+    trade_comm = 0.0
+
+    direction = 0
+    entry_price = 0.0
+    entry_bar = 0
+    initial_size = 0.0
+    stop_price = 0.0
+    trail_activated = False
+    tp1_done = False
+    extreme = 0.0
+    last_exit_bar = -999
+
+    for i in range(n):
+        # 1) 以本根开盘价撮合挂单
+        if pending != 0:
+            # 提交时按下单收盘价试算成交后的现金，为负则拒单
+            if _submit_cash(cash, order_size, order_price, commission, pending == 1) >= 0.0:
+                price = open_[i]
+                comm = abs(order_size) * commission * price
+                if pending == 1:
+                    # 开仓成交时再检查一次资金
+                    left = cash - order_size * price
+                    left -= comm
+                    if left >= 0.0:
+                        cash = left
+                        pos = order_size
+                        pos_price = price
+                        entry_idx = i
+                        trade_size = order_size
+                        trade_price = (order_size * price) / order_size
+                        trade_pnl = 0.0
+                        trade_comm = comm
+                        entry_price = price
+                        entry_bar = i + 1
+                        initial_size = abs(order_size)
+                        trail_activated = False
+                        tp1_done = False
+                        extreme = price
+                        if direction == 1:
+                            stop_price = price - atr[i] * atr_sl_mult
+                        else:
+                            stop_price = price + atr[i] * atr_sl_mult
+                else:
+                    closed = -order_size  # 被平掉的持仓数量（带方向）
+                    cash += closed * pos_price + closed * (price - pos_price)
+                    cash -= comm
+                    trade_pnl += closed * (price - trade_price)
+                    trade_comm += comm
+                    pos += order_size
+                    if pos == 0.0:
+                        trades[k, 0] = entry_idx
+                        trades[k, 1] = i
+                        trades[k, 2] = trade_price
+                        trades[k, 3] = price
+                        trades[k, 4] = trade_pnl
+                        trades[k, 5] = trade_pnl - trade_comm
+                        trades[k, 6] = trade_size
+                        k += 1
+                        pos_price = 0.0
+                        last_exit_bar = i + 1
+                        direction = 0
+                        stop_price = 0.0
+                        trail_activated = False
+                        tp1_done = False
+        pending = 0
+
+        # 2) 收盘净值
+        value = _shortcash_value(cash, pos, pos_price, close[i])
+        equity[i] = value
+
+        if i < first:
+            continue
+
+        # 3) 策略逻辑
+        price = close[i]
+        a = atr[i]
+        if pos != 0.0:
+            # 多空统一按方向符号 sign (+1/-1) 计算：乘以 sign 后空头的 min / >= 即多头的 max / <=，
+            # 两个分支合成同一条算术路径（乘 ±1 与取负都是精确运算，结果与分支写法逐位一致）
+            sign = float(direction)
+            ref = high[i] if direction > 0 else low[i]
+            extreme = sign * max(sign * extreme, sign * ref)
+            float_pnl = sign * (price - entry_price)
+
+            # 第一止盈：分批平仓，止损移到保本并启动移动止损
+            if not tp1_done and a > 0.0 and float_pnl >= a * atr_tp1_mult:
+                close_size = max(int(initial_size * tp1_close_pct), 1)
+                current_size = abs(pos)
+                close_size = min(close_size, current_size - 1) if current_size > 1 else 0
+                if close_size > 0:
+                    tp1_done = True
+                    order_size = -direction * float(close_size)
+                    order_price = price
+                    pending = -1
+                    stop_price = entry_price
+                    trail_activated = True
+                    continue
+
+            # 移动止盈
+            if trail_activated and a > 0.0:
+                new_stop = extreme - sign * (a * trail_atr_mult)
+                stop_price = sign * max(sign * stop_price, sign * new_stop)
+
+            # 止损检查
+            if sign * (price - stop_price) <= 0.0:
+                order_size = -pos
+                order_price = price
+                pending = -1
+                continue
+
+            # 趋势衰竭：持仓 20 根以上，短均线明确拐头且价格穿越短均线
+            if i + 1 - entry_bar > 20:
+                p = exhaustion_period
+                if i + 1 <= p or sma_short[i - p] == 0.0:
+                    slope = 0.0
+                else:
+                    slope = (sma_short[i] - sma_short[i - p]) / sma_short[i - p] * 100 / p
+                if sign * slope < -0.1 and sign * (price - sma_short[i]) < 0.0:
+                    order_size = -pos
+                    order_price = price
+                    pending = -1
+        else:
+            if i + 1 - last_exit_bar < reentry_cooldown:
+                continue
+            if sma_long[i] == 0.0:
+                spread = 0.0
+            else:
+                spread = (sma_short[i] - sma_long[i]) / sma_long[i] * 100
+            direction = _swing_entry_direction(
+                cross[i], spread, rsi[i], adx[i], plus_di[i], minus_di[i], macd_hist[i],
+                rsi_long_min, rsi_short_max, adx_threshold, max_ma_spread, enable_short,
+            )
+            if direction == 0:
+                continue
+
+            # 基于 ATR 的动态仓位
+            order_size = direction * _atr_size(value, risk_pct, a, atr_sl_mult)
+            order_price = price
+            pending = 1
+
+    return equity, trades[:k], 1 if pos != 0.0 else 0
+
+
+@njit(cache=True, nogil=True)
+def _run_optimized_swing_v2(open_, high, low, close, sma_short, sma_long, cross, rsi, adx, plus_di,
+                            minus_di, macd_hist, atr, first, cash, commission,
+                            rsi_long_min, rsi_short_max, adx_threshold, atr_sl_mult,
+                            atr_trail_trigger, trail_atr_mult, breakeven_trigger, risk_pct,
+                            max_ma_spread, reentry_cooldown, enable_short):
+    """OptimizedSwingV2 回测内核
+
+    三阶段止损（初始 → 保本 → 移动跟踪）与均线交叉离场均为循环内的标量状态，
+    做空记账与撮合、资金检查同 _run_optimized_swing（V2 不分批平仓）。
+
+    Args:
+        open_, high, low, close: 开盘价 / 最高价 / 最低价 / 收盘价（float64）
+        sma_short, sma_long, cross, rsi, adx, plus_di, minus_di, macd_hist, atr: 预计算指标
+        first: 策略首次执行 next() 的下标（所有指标预热完成）
+        cash: 初始资金
+        commission: 手续费比例
+        其余参数与 OptimizedSwingV2 同名参数一致
+
+    Returns:
+        (equity, trades, open_pos): 含义同 _run_swing，trades 列见 SWING_TRADE_FIELDS，
+        其中 size 为开仓数量（做空为负）
+    """
+    n = len(close)
+    equity = np.empty(n)
+    trades = np.empty((n // 2 + 1, 7))
+    k = 0
+
+    pos = 0.0
+    pos_price = 0.0
+    pending = 0  # 上一根 K 线发出的订单：1 开仓，-1 平仓
+    order_size = 0.0  # 带方向的订单数量
+    order_price = 0.0  # 下单时的收盘价，提交时按此价预检资金
+    entry_idx = -1
+    entry_comm = 0.0
+    trade_price = 0.0
+
+    direction = 0
+    entry_price = 0.0
+    stop_price = 0.0
+    breakeven_done = False
+    trail_activated = False
+    extreme = 0.0
+    last_exit_bar = -999
+
+    for i in range(n):
+        # 1) 以本根开盘价撮合挂单
+        if pending != 0:
+            # 提交时按下单收盘价试算成交后的现金，为负则拒单
+            if _submit_cash(cash, order_size, order_price, commission, pending == 1) >= 0.0:
+                price = open_[i]
+                comm = abs(order_size) * commission * price
+                if pending == 1:
+                    # 开仓成交时再检查一次资金
+                    left = cash - order_size * price
+                    left -= comm
+                    if left >= 0.0:
+                        cash = left
+                        pos = order_size
+                        pos_price = price
+                        entry_idx = i
+                        entry_comm = comm
+                        trade_price = (order_size * price) / order_size
+                        entry_price = price
+                        extreme = price
+                        breakeven_done = False
+                        trail_activated = False
+                        if direction == 1:
+                            stop_price = price - atr[i] * atr_sl_mult
+                        elif direction == -1:
+                            stop_price = price + atr[i] * atr_sl_mult
+                else:
+                    closed = -order_size
+                    cash += closed * pos_price + closed * (price - pos_price)
+                    cash -= comm
+                    trade_pnl = closed * (price - trade_price)
+                    trades[k, 0] = entry_idx
+                    trades[k, 1] = i
+                    trades[k, 2] = trade_price
+                    trades[k, 3] = price
+                    trades[k, 4] = trade_pnl
+                    trades[k, 5] = trade_pnl - (entry_comm + comm)
+                    trades[k, 6] = pos
+                    k += 1
+                    pos = 0.0
+                    pos_price = 0.0
+                    last_exit_bar = i + 1
+                    direction = 0
+                    stop_price = 0.0
+                    breakeven_done = False
+                    trail_activated = False
+        pending = 0
+
+        # 2) 收盘净值
+        value = _shortcash_value(cash, pos, pos_price, close[i])
+        equity[i] = value
+
+        if i < first:
+            continue
+
+        # 3) 策略逻辑
+        price = close[i]
+        a = atr[i]
+        if sma_long[i] == 0.0:
+            spread = 0.0
+        else:
+            spread = (sma_short[i] - sma_long[i]) / sma_long[i] * 100
+
+        if pos != 0.0:
+            # 多空统一按方向符号 sign (+1/-1) 计算：乘以 sign 后空头的 min / >= 即多头的 max / <=，
+            # 两个分支合成同一条算术路径（乘 ±1 与取负都是精确运算，结果与分支写法逐位一致）
+            sign = float(direction)
+            ref = high[i] if direction > 0 else low[i]
+            extreme = sign * max(sign * extreme, sign * ref)
+            float_pnl = sign * (price - entry_price)
+
+            # 阶段1 → 阶段2：保本止损
+            if not breakeven_done and a > 0.0 and float_pnl >= a * breakeven_trigger:
+                breakeven_done = True
+                stop_price = sign * max(sign * stop_price, sign * entry_price)
+
+            # 阶段2 → 阶段3：移动跟踪
+            if not trail_activated and a > 0.0 and float_pnl >= a * atr_trail_trigger:
+                trail_activated = True
+            if trail_activated and a > 0.0:
+                stop_price = sign * max(sign * stop_price, sign * (extreme - sign * (a * trail_atr_mult)))
+
+            # 止损触发，或均线明确反向交叉 → 平仓
+            if (sign * (price - stop_price) <= 0.0
+                    or (sign * cross[i] < 0.0 and sign * spread < -0.5)):
+                order_size = -pos
+                order_price = price
+                pending = -1
+        else:
+            if i + 1 - last_exit_bar < reentry_cooldown:
+                continue
+            direction = _swing_entry_direction(
+                cross[i], spread, rsi[i], adx[i], plus_di[i], minus_di[i], macd_hist[i],
+                rsi_long_min, rsi_short_max, adx_threshold, max_ma_spread, enable_short,
+            )
+            if direction == 0:
+                continue
+
+            # 基于 ATR 的动态仓位
+            order_size = direction * _atr_size(value, risk_pct, a, atr_sl_mult)
+            order_price = price
+            pending = 1
+
+    return equity, trades[:k], 1 if pos != 0.0 else 0
+
+
+# SwingStrategy 参数扫描矩阵的列序（与 _run_swing 中 commission 之后的参数顺序一致；
+# reentry_cooldown 取整）
+SWING_SWEEP_FIELDS = (
+    "rsi_upper", "adx_threshold", "atr_sl_mult", "atr_tp_mult", "trail_atr_mult", "risk_pct",
+    "reentry_cooldown",
+)
+
+
+@njit(cache=True, parallel=True)
+def _sweep_swing(open_, close, sma_short, sma_long, cross, rsi, adx, plus_di, minus_di, atr, first,
+                 cash, commission, day_end, grid, group):
+    """SwingStrategy 参数矩阵并行回测
+
+    指标周期不同的各组参数共用一次 prange：指标数组按周期组堆叠为二维（每行一组），
+    grid 每行按 group 取所属周期组的指标行，所有参数组一起按 CPU 核数并行。
+
+    Args:
+        open_, close: 开盘价 / 收盘价
+        sma_short ... atr: 形状 (周期组数, K 线数) 的指标数组，含义同 _run_swing
+        first: 各周期组策略首次执行 next() 的下标
+        cash: 初始资金
+        commission: 手续费比例
+        day_end: 每个自然日最后一根 K 线的下标，用于取日末净值
+        grid: 参数矩阵，每行一组，列序见 SWING_SWEEP_FIELDS
+        group: 各行所属周期组的下标
+
+    Returns:
+        与 grid 行数等长的夏普比率数组，收益无波动的参数组为 NaN
+    """
+    out = np.full(len(grid), np.nan)
+    for k in prange(len(grid)):
+        g = grid[k]
+        j = group[k]
+        equity, _, _ = _run_swing(
+            open_, close, sma_short[j], sma_long[j], cross[j], rsi[j], adx[j], plus_di[j],
+            minus_di[j], atr[j], first[j], cash, commission,
+            g[0], g[1], g[2], g[3], g[4], g[5], int(g[6]),
+        )
+        out[k] = _daily_sharpe(equity[day_end], cash)
+    return out
+
+
+# 参数扫描矩阵的列序（与 _run_optimized_swing / _run_optimized_swing_v2 中 commission
+# 之后的参数顺序一致；reentry_cooldown 取整，enable_short 非零为真）
+OPTIMIZED_SWING_SWEEP_FIELDS = (
+    "rsi_long_min", "rsi_short_max", "adx_threshold", "atr_sl_mult", "atr_tp1_mult",
+    "tp1_close_pct", "trail_atr_mult", "risk_pct", "max_ma_spread", "reentry_cooldown",
+    "enable_short",
+)
+OPTIMIZED_SWING_V2_SWEEP_FIELDS = (
+    "rsi_long_min", "rsi_short_max", "adx_threshold", "atr_sl_mult", "atr_trail_trigger",
+    "trail_atr_mult", "breakeven_trigger", "risk_pct", "max_ma_spread", "reentry_cooldown",
+    "enable_short",
+)
+
+
+@njit(cache=True, parallel=True)
+def _sweep_optimized_swing(open_, high, low, close, sma_short, sma_long, cross, rsi, adx, plus_di,
+                           minus_di, macd_hist, atr, first, cash, commission, day_end, grid, group,
+                           v2, exhaustion_period):
+    """OptimizedSwingStrategy / OptimizedSwingV2 参数矩阵并行回测
+
+    指标数组按周期组堆叠，所有参数组共用一次 prange，做法同 _sweep_swing。
+
+    Args:
+        open_, high, low, close: 开盘价 / 最高价 / 最低价 / 收盘价
+        sma_short ... atr: 形状 (周期组数, K 线数) 的指标数组，含义同 _run_optimized_swing
+        first: 各周期组策略首次执行 next() 的下标
+        cash: 初始资金
+        commission: 手续费比例
+        day_end: 每个自然日最后一根 K 线的下标，用于取日末净值
+        grid: 参数矩阵，每行一组，列序见 OPTIMIZED_SWING_SWEEP_FIELDS /
+              OPTIMIZED_SWING_V2_SWEEP_FIELDS
+        group: 各行所属周期组的下标
+        v2: 为 True 时回测 OptimizedSwingV2，否则为 OptimizedSwingStrategy
+        exhaustion_period: OptimizedSwingStrategy 趋势衰竭检查的斜率回看周期
+
+    Returns:
+        与 grid 行数等长的夏普比率数组，收益无波动的参数组为 NaN
+    """
+    out = np.full(len(grid), np.nan)
+    for k in prange(len(grid)):
+        g = grid[k]
+        j = group[k]
+        if v2:
+            equity, _, _ = _run_optimized_swing_v2(
+                open_, high, low, close, sma_short[j], sma_long[j], cross[j], rsi[j], adx[j],
+                plus_di[j], minus_di[j], macd_hist[j], atr[j], first[j], cash, commission,
+                g[0], g[1], g[2], g[3], g[4], g[5], g[6], g[7], g[8], int(g[9]), g[10] != 0.0,
+            )
+        else:
+            equity, _, _ = _run_optimized_swing(
+                open_, high, low, close, sma_short[j], sma_long[j], cross[j], rsi[j], adx[j],
+                plus_di[j], minus_di[j], macd_hist[j], atr[j], first[j], cash, commission,
+                g[0], g[1], g[2], g[3], g[4], g[5], g[6], g[7], g[8], int(g[9]), g[10] != 0.0,
+                exhaustion_period,
+            )
+        out[k] = _daily_sharpe(equity[day_end], cash)
+    return out
+
+
+_warmed = False
+
+
+def _warm_up() -> None:
+    """用极小数组触发一次编译（cache=True 时直接读取磁盘缓存），避免首次回测计入 JIT 耗时
+
+    由 BacktestEngine.run(fast=True) / run_param_grid 调用，导入本模块时不编译；重复调用无开销。
+    """
+    global _warmed
+    if _warmed:
+        return
+    warm = np.ones(4)
+    _run_dual_ma(warm, warm, warm, warm, 1.0, 0.0)
+    _warmed = True
@@ -0,0 +1,91 @@
+"""
+report_io.py - 回测报告输出
+
+各回测脚本共用的报告写出函数：JSON 主报告，逐笔交易的 JSON Lines（每组参数一个文件，
+或所有参数组写入同一个 NDJSON 文件），以及写出前对汇总数值统一取整。安装 orjson 时走 C 实现序列化，否则回退标准库 json，
+两种方式输出格式一致（中文不转义、无法识别的对象按 str 处理；主报告 2 空格缩进）。
+
+使用方法：
+    from backtest.report_io import write_json, write_trades_jsonl
+
+    res["trades"] = write_trades_jsonl(tdf, _TRADE_COLUMNS, _OUTPUT_DIR, "daily", cfg["name"])
+    write_json(report, os.path.join(_OUTPUT_DIR, "gold_daily_backtest.json"))
+"""
+
+import json
+import os
+import re
+from itertools import repeat
+
+# 参数组名称写入文件名时替换为下划线的字符
+_UNSAFE_FILENAME_CHARS = re.compile(r"[^\w.()-]+")
+
+
+def write_json(obj, path: str) -> None:
+    """把 obj 写出为 JSON 报告"""
+    try:
+        import orjson
+    except ImportError:
+        with open(path, "w") as f:
+            json.dump(obj, f, indent=2, default=str, ensure_ascii=False)
+        return
+
+    option = orjson.OPT_INDENT_2 | orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_PASSTHROUGH_DATETIME
+    with open(path, "wb") as f:
+        f.write(orjson.dumps(obj, default=str, option=option))
+
+
+def round_report(res: dict, digits: dict) -> dict:
+    """按 digits（{分节: {字段: 小数位数}}）对结果中的汇总数值统一取整（原地修改并返回 res），None 保持不变"""
+    for section, fields in digits.items():
+        part = res[section]
+        for key, n in fields.items():
+            if part[key] is not None:
+                part[key] = round(part[key], n)
+    return res
+
+
+def _line_dumps():
+    """返回把一条记录序列化为单行 JSON（bytes，不含换行符）的函数"""
+    try:
+        import orjson
+    except ImportError:
+        def dumps(row):
+            return json.dumps(row, default=str, ensure_ascii=False).encode()
+    else:
+        def dumps(row):
+            return orjson.dumps(row, default=str, option=orjson.OPT_SERIALIZE_NUMPY)
+    return dumps
+
+
+def write_trades_jsonl(tdf, columns, output_dir: str, prefix: str, name: str) -> dict:
+    """把一组参数的逐笔记录逐行写入 output_dir/<prefix>_trades_<名称>.jsonl，返回报告中的引用
+
+    tdf 各列依次对应 columns；不再把整份逐笔列表嵌入主报告，主报告中只保留
+    {"count": 笔数, "file": 文件名}。
+    """
+    fname = f"{prefix}_trades_{_UNSAFE_FILENAME_CHARS.sub('_', name)}.jsonl"
+    dumps = _line_dumps()
+    with open(os.path.join(output_dir, fname), "wb") as f:
+        for row in tdf.itertuples(index=False, name=None):
+            f.write(dumps(dict(zip(columns, row))) + b"\n")
+    return {"count": len(tdf), "file": fname}
+
+
+def write_trades_ndjson(results: list, key: str, path: str) -> None:
+    """把各组参数的逐笔记录逐行写入 path（每行一笔，strategy 字段为参数组名称）
+
+    各组的 res[key] 为按列存放的 {字段: 列表}，写出时逐行拼成记录，随后替换为
+    {"count": 笔数, "file": 文件名} 引用（原地修改 results）；
+    下游可用 pd.read_json(path, lines=True) 读取。
+    """
+    dumps = _line_dumps()
+    fname = os.path.basename(path)
+    with open(path, "wb") as f:
+        for res in results:
+            names = ["strategy", *res[key]]
+            count = 0
+            for row in zip(repeat(res["name"]), *res[key].values()):
+                f.write(dumps(dict(zip(names, row))) + b"\n")
+                count += 1
+            res[key] = {"count": count, "file": fname}
@@ -0,0 +1,66 @@
+"""
+reporting_mixin.py - 回测逐笔交易记录
+
+TradeLoggingMixin 可与任意 Backtrader 策略组合（继承时放在策略类之前），
+在 notify_trade 中把每笔已平仓交易的原始字段按元组追加到 self.trade_rows，
+不在回测过程中做日期换算与格式化；回测结束后由 trades_frame() 一次性转为 DataFrame。
+
+使用方法：
+    from backtest.reporting_mixin import trades_frame, with_trade_logging
+    eng.add_strategy(strategy_class=with_trade_logging(SwingStrategy), **params)
+    strat = eng.run()[0]
+    tdf = trades_frame(strat.trade_rows)
+"""
+
+import pandas as pd
+
+from backtest.engine import num2datetime
+
+# trade_rows 中每个元组的字段（均取自 bt.Trade 的同名属性，平仓时 size 为 0）
+TRADE_ROW_FIELDS = ("dtopen", "dtclose", "long", "size", "price", "pnl", "pnlcomm", "barlen")
+
+
+class TradeLoggingMixin:
+    """记录已平仓交易的策略混入类"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.trade_rows = []
+
+    def notify_trade(self, trade):
+        super().notify_trade(trade)
+        if trade.isclosed:
+            self.trade_rows.append((
+                trade.dtopen, trade.dtclose, trade.long, trade.size,
+                trade.price, trade.pnl, trade.pnlcomm, trade.barlen,
+            ))
+
+
+_LOGGING_CLASSES = {}
+
+
+def with_trade_logging(strategy_class):
+    """返回在 strategy_class 基础上混入 TradeLoggingMixin 的子类（每个策略类只生成一次）"""
+    cls = _LOGGING_CLASSES.get(strategy_class)
+    if cls is None:
+        cls = type(f"{strategy_class.__name__}TradeLog", (TradeLoggingMixin, strategy_class), {})
+        _LOGGING_CLASSES[strategy_class] = cls
+    return cls
+
+
+def trades_frame(rows: list) -> pd.DataFrame:
+    """把 trade_rows 转为 DataFrame
+
+    列为 TRADE_ROW_FIELDS，另加开/平仓时间 entry_dt / exit_dt（datetime64）
+    与持仓自然日数 days；开/平仓时间由 num2datetime 一次性换算。
+    """
+    df = pd.DataFrame(rows, columns=list(TRADE_ROW_FIELDS))
+    entry_dt = num2datetime(df["dtopen"].to_numpy())
+    exit_dt = num2datetime(df["dtclose"].to_numpy())
+    return df.assign(
+        long=df["long"].astype(bool),
+        entry_dt=entry_dt,
+        exit_dt=exit_dt,
+        days=(exit_dt - entry_dt).days,
+    )
+
@@ -0,0 +1,105 @@
+"""
+result_cache.py - 回测结果磁盘缓存
+
+同一份数据、同一组参数、同一版代码的回测结果是确定的。参数扫描或反复运行对比脚本时，
+按 sha256(参数 + 数据摘要 + 源码摘要 + 依赖库版本) 生成键，把每组参数的结果 pickle 到项目
+cache/ 目录；再次运行时命中缓存即直接读取，跳过整个回测。
+
+键中包含 backtest/、strategies/ 两个包下全部源码（引擎、编译内核、指标缓存、交易统计等）、
+调用方另行指定的源码文件（生成结果的脚本等）的内容摘要，以及 backtrader / numba / numpy / pandas
+的版本号，任一文件改动或依赖库升级后旧缓存自然失效，不会读到过期结果。
+
+使用方法：
+    from backtest.result_cache import data_digest, load_result, result_key, save_result
+
+    digest = data_digest(df_bt)
+    key = result_key(cfg["p"], digest, _run_cfg)
+    r = load_result(key)
+    if r is None:
+        r = _run_cfg(cfg, frame)
+        save_result(key, r)
+"""
+
+import hashlib
+import inspect
+import json
+import os
+import pickle
+from functools import lru_cache
+from importlib import metadata
+from typing import Optional
+
+import pandas as pd
+
+# 项目 cache 目录
+_PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+CACHE_DIR = os.path.join(_PROJECT_DIR, "cache")
+
+# 回测结果依赖的项目包（其下任一源码改动都使缓存失效）与第三方库（版本变化时缓存失效）
+_PROJECT_PACKAGES = ("backtest", "strategies")
+_LIBRARIES = ("backtrader", "numba", "numpy", "pandas")
+
+
+def data_digest(df: pd.DataFrame) -> str:
+    """返回 DataFrame 内容（含索引与列名）的 sha256 摘要"""
+    h = hashlib.sha256()
+    h.update(json.dumps([str(c) for c in df.columns]).encode())
+    h.update(pd.util.hash_pandas_object(df, index=True).to_numpy().tobytes())
+    return h.hexdigest()
+
+
+@lru_cache(maxsize=None)
+def _file_digest(path: str) -> bytes:
+    """源码文件内容的 sha256 摘要（同一进程内每个文件只读一次）"""
+    with open(path, "rb") as f:
+        return hashlib.sha256(f.read()).digest()
+
+
+@lru_cache(maxsize=None)
+def _environment_digest() -> bytes:
+    """_PROJECT_PACKAGES 下全部源码与 _LIBRARIES 版本号的 sha256 摘要（同一进程内只算一次）"""
+    h = hashlib.sha256()
+    for package in _PROJECT_PACKAGES:
+        package_dir = os.path.join(_PROJECT_DIR, package)
+        for name in sorted(os.listdir(package_dir)):
+            if name.endswith(".py"):
+                h.update(f"{package}/{name}".encode())
+                h.update(_file_digest(os.path.join(package_dir, name)))
+    for lib in _LIBRARIES:
+        try:
+            version = metadata.version(lib)
+        except metadata.PackageNotFoundError:
+            version = ""
+        h.update(f"{lib}=={version}".encode())
+    return h.digest()
+
+
+def result_key(params: dict, digest: str, *code) -> str:
+    """由参数、数据摘要、项目包源码与依赖库版本，以及 code 中各对象（类/函数/模块）所在源码文件生成缓存键"""
+    h = hashlib.sha256()
+    h.update(json.dumps(params, sort_keys=True, default=str).encode())
+    h.update(digest.encode())
+    h.update(_environment_digest())
+    for obj in code:
+        h.update(_file_digest(inspect.getsourcefile(obj)))
+    return h.hexdigest()
+
+
+def load_result(key: str) -> Optional[object]:
+    """读取缓存的回测结果，未命中或缓存文件损坏时返回 None"""
+    path = os.path.join(CACHE_DIR, f"{key}.pkl")
+    try:
+        with open(path, "rb") as f:
+            return pickle.load(f)
+    except (FileNotFoundError, pickle.UnpicklingError, EOFError, AttributeError, ImportError):
+        return None
+
+
+def save_result(key: str, result) -> None:
+    """把回测结果写入缓存（先写临时文件再原子替换，并发写同一键时不会留下残缺文件）"""
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    path = os.path.join(CACHE_DIR, f"{key}.pkl")
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "wb") as f:
+        pickle.dump(result, f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp, path)
@@ -0,0 +1,104 @@
+"""
+shared_frame.py - 跨进程共享回测数据
+
+多组参数并行回测时，各工作进程用的是同一份 K 线数据。shared_frame() 在主进程中
+把 DataFrame 的索引与各列逐列写入一块共享内存，只把体积很小的 SharedFrame 句柄
+（共享内存名称 + 各列 dtype 与偏移）交给工作进程；attach_frame() 按句柄直接在共享内存上
+重建 DataFrame，不再把整表 pickle 给每个任务，也不在每个进程里各复制一份。
+
+使用方法：
+    from backtest.shared_frame import attach_frame, shared_frame
+
+    with shared_frame(df_bt) as handle, ProcessPoolExecutor() as pool:
+        results = list(pool.map(_run_cfg, configs, [handle] * len(configs)))
+
+    # 工作进程中
+    df = attach_frame(handle)
+"""
+
+from contextlib import contextmanager
+from multiprocessing import shared_memory
+from typing import NamedTuple, Optional
+
+import numpy as np
+import pandas as pd
+
+# 索引在 SharedFrame.layout 中使用的占位名（不会与列名冲突）
+_INDEX_KEY = None
+# 各列起始偏移按 8 字节对齐
+_ALIGN = 8
+
+
+class SharedFrame(NamedTuple):
+    """共享内存中 DataFrame 的描述，可廉价 pickle 给工作进程"""
+    name: str                 # 共享内存块名称
+    nrows: int                # 行数
+    layout: tuple             # ((列名, dtype.str, 字节偏移), ...)，首项为索引
+    index_name: Optional[str]
+    index_tz: object          # 带时区索引的时区，无时区为 None
+
+
+def _columns(df: pd.DataFrame) -> list:
+    """返回 [(列名, 一维 ndarray), ...]，首项为索引；索引须为 DatetimeIndex，各列须为定长数值类型"""
+    if not isinstance(df.index, pd.DatetimeIndex):
+        raise ValueError("shared_frame 只支持 DatetimeIndex 索引（请先调用 BacktestEngine.prepare_data）")
+    # 带时区索引按 UTC 存储，attach 时再转换回原时区
+    index = df.index.tz_convert("UTC").tz_localize(None) if df.index.tz is not None else df.index
+    columns = [(_INDEX_KEY, index.to_numpy())]
+    for col in df.columns:
+        arr = df[col].to_numpy()
+        if arr.dtype.hasobject:
+            raise ValueError(f"列 {col!r} 为 object 类型，无法放入共享内存")
+        columns.append((col, arr))
+    return columns
+
+
+@contextmanager
+def shared_frame(df: pd.DataFrame):
+    """把 df 写入新建的共享内存块，产出 SharedFrame 句柄；退出时关闭并释放共享内存
+
+    Raises:
+        ValueError: 索引不是 DatetimeIndex，或存在 object 类型的列
+    """
+    columns = _columns(df)
+    layout, offset = [], 0
+    for key, arr in columns:
+        layout.append((key, arr.dtype.str, offset))
+        offset += -(-arr.nbytes // _ALIGN) * _ALIGN
+
+    shm = shared_memory.SharedMemory(create=True, size=max(offset, 1))
+    try:
+        for (key, arr), (_, _, off) in zip(columns, layout):
+            np.ndarray(arr.shape, arr.dtype, buffer=shm.buf, offset=off)[:] = arr
+        yield SharedFrame(shm.name, len(df), tuple(layout), df.index.name, df.index.tz)
+    finally:
+        shm.close()
+        shm.unlink()
+
+
+# 工作进程中已映射的共享内存块及其上重建的 DataFrame（按名称缓存）；同一进程处理多个任务时
+# 只映射一次并返回同一 DataFrame 对象（BacktestEngine 按对象缓存数据源数组，可直接复用），
+# 映射随进程退出释放，共享内存本身由主进程在 shared_frame 退出时统一 unlink
+_ATTACHED = {}
+
+
+def attach_frame(handle: SharedFrame) -> pd.DataFrame:
+    """按句柄在共享内存上重建 DataFrame（各列为只读视图，不复制数据）"""
+    cached = _ATTACHED.get(handle.name)
+    if cached is not None:
+        return cached[1]
+
+    shm = shared_memory.SharedMemory(name=handle.name)
+
+    views = {}
+    for key, dtype, offset in handle.layout:
+        view = np.ndarray((handle.nrows,), np.dtype(dtype), buffer=shm.buf, offset=offset)
+        view.flags.writeable = False
+        views[key] = view
+
+    index = pd.DatetimeIndex(views.pop(_INDEX_KEY), name=handle.index_name, copy=False)
+    if handle.index_tz is not None:
+        index = index.tz_localize("UTC").tz_convert(handle.index_tz)
+    df = pd.DataFrame(views, index=index, copy=False)
+    _ATTACHED[handle.name] = (shm, df)
+    return df
@@ -0,0 +1,70 @@
+"""
+trade_stats.py - 逐笔交易统计
+
+各回测脚本把逐笔记录整理为按列的数组后，用这里的函数一次算出持仓/盈亏均值、
+最大连续亏损笔数与年度汇总，均为 NumPy 列运算，不逐笔循环。
+
+使用方法：
+    from backtest.trade_stats import max_consecutive_losses, trade_averages, yearly_totals
+
+    pnl = tdf["pnlcomm"].to_numpy(dtype=np.float64)
+    days = tdf["days"].to_numpy(dtype=np.float64)
+    win = pnl > 0
+    avg_hold, avg_hold_win, avg_hold_loss, avg_win, avg_loss = trade_averages(pnl, days, win)
+"""
+
+import numpy as np
+
+
+def trade_averages(pnl, days, win) -> tuple:
+    """各项均值一次批量相除，没有交易的分组记为 0
+
+    Args:
+        pnl: 各笔盈亏（float64 数组）
+        days: 各笔持仓天数（float64 数组）
+        win: 各笔是否盈利（布尔数组）
+
+    Returns:
+        tuple: (平均持仓, 盈利单平均持仓, 亏损单平均持仓, 平均盈利, 平均亏损)，均为 float
+    """
+    n_all = len(pnl)
+    n_won = int(win.sum())
+    n_lost = n_all - n_won
+    sums = np.array([days.sum(), days[win].sum(), days[~win].sum(),
+                     pnl[win].sum(), pnl[~win].sum()], dtype=np.float64)
+    counts = np.array([n_all, n_won, n_lost, n_won, n_lost], dtype=np.float64)
+    return tuple(np.divide(sums, counts, out=np.zeros_like(sums), where=counts > 0).tolist())
+
+
+def max_consecutive_losses(win) -> int:
+    """最大连续亏损笔数
+
+    亏损标记前后补 0 后做一阶差分，+1 / -1 处分别为各段连续亏损的起点 / 终点，
+    终点减起点即各段长度，取最大值；没有亏损时为 0。
+    """
+    edges = np.diff(np.asarray(~np.asarray(win, dtype=bool), dtype=np.int8), prepend=0, append=0)
+    starts = np.flatnonzero(edges == 1)
+    if not starts.size:
+        return 0
+    return int((np.flatnonzero(edges == -1) - starts).max())
+
+
+def yearly_totals(years, pnl, win) -> tuple:
+    """按开仓年份汇总逐笔交易
+
+    年份编为序号后由 np.bincount 一次求出各年笔数、盈亏合计与盈利笔数（按成交顺序累加，
+    无逐笔 Python 循环，也不为每个年份分配字典）。
+
+    Args:
+        years: 各笔开仓年份（整数数组）
+        pnl: 各笔盈亏
+        win: 各笔是否盈利（布尔数组）
+
+    Returns:
+        tuple: (年份 list, 笔数 ndarray, 盈亏合计 ndarray, 盈利笔数 ndarray)，按年份升序
+    """
+    uniq, codes = np.unique(np.asarray(years), return_inverse=True)
+    counts = np.bincount(codes, minlength=len(uniq))
+    totals = np.bincount(codes, weights=np.asarray(pnl, dtype=np.float64), minlength=len(uniq))
+    won = np.bincount(codes[np.asarray(win, dtype=bool)], minlength=len(uniq))
+    return uniq.tolist(), counts, totals, won
@@ -8,8 +8,10 @@ data_fetcher.py - 数据获取模块
 
 import os
 import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
-from typing import Optional
+from typing import Dict, List, Optional
 
 import pandas as pd
 import yfinance as yf
@@ -17,9 +19,16 @@ from dotenv import load_dotenv
 
 load_dotenv()
 
-# 项目 data 目录（用于 CSV 缓存）
+# 项目 data 目录（用于 CSV / Parquet 缓存）
 _DATA_DIR = os.path.dirname(os.path.abspath(__file__))
 
+# K 线周期对应秒数，用于判断本地缓存是否仍在当前 K 线内（未过期）
+_INTERVAL_SECONDS = {
+    "1m": 60, "2m": 120, "5m": 300, "15m": 900, "30m": 1800,
+    "60m": 3600, "90m": 5400, "1h": 3600,
+    "1d": 86400, "5d": 432000, "1wk": 604800, "1mo": 2592000, "3mo": 7776000,
+}
+
 
 # ============================================================
 # Yahoo Finance 数据获取器（Linux 开发环境推荐）
@@ -34,9 +43,10 @@ class YFinanceDataFetcher:
     Attributes:
         symbol (str): Yahoo Finance 品种代码，默认 'GC=F'（黄金期货）
         data_dir (str): 本地数据缓存目录
+        verbose (bool): 是否输出进度日志
     """
 
-    def __init__(self, symbol: str = "GC=F"):
+    def __init__(self, symbol: str = "GC=F", verbose: bool = True):
         """初始化 Yahoo Finance 数据获取器
 
         Args:
@@ -44,8 +54,10 @@ class YFinanceDataFetcher:
                 - 'GC=F': COMEX 黄金期货（推荐，走势贴近 XAUUSD）
                 - 'GLD': SPDR 黄金 ETF
                 - 'XAUUSD=X': 现货黄金（部分时段数据可能不全）
+            verbose: 是否输出获取/缓存进度日志（错误与警告始终输出）
         """
         self.symbol = symbol
+        self.verbose = verbose
         self.data_dir = _DATA_DIR
         self._ticker = yf.Ticker(self.symbol)
 
@@ -55,10 +67,15 @@ class YFinanceDataFetcher:
         interval: str = "1h",
         start_date: Optional[str] = None,
         end_date: Optional[str] = None,
+        use_cache: bool = False,
+        cache_max_age: Optional[float] = None,
     ) -> Optional[pd.DataFrame]:
         """拉取指定周期的 OHLCV 数据
 
         从 Yahoo Finance 获取历史 K 线数据。
+        开启 use_cache 时结果以 Parquet 缓存在 data 目录，缓存文件修改时间
+        距今不足一根 K 线周期（或 cache_max_age 秒）时直接读取缓存，跳过网络请求。
+        缓存文件按品种、周期与时间跨度命名，各脚本以相同参数拉取时共用同一份缓存。
 
         Args:
             period: 数据时间跨度，默认 '1y'。
@@ -67,14 +84,26 @@ class YFinanceDataFetcher:
                       可选值：'1m','2m','5m','15m','30m','60m','90m','1h','1d','5d','1wk','1mo'
             start_date: 起始日期，格式 'YYYY-MM-DD'（与 period 互斥）
             end_date: 截止日期，格式 'YYYY-MM-DD'（与 period 互斥）
+            use_cache: 是否启用本地 Parquet 缓存，默认 False
+            cache_max_age: 缓存有效期（秒），默认 None 表示一根 K 线周期
 
         Returns:
             pd.DataFrame: 包含 open, high, low, close, volume 列的 DataFrame。
             若获取失败返回 None。
         """
+        cache_file = None
+        if use_cache:
+            tag = self.symbol.replace("=", "").replace(".", "").lower()
+            span = f"{start_date}_{end_date}" if start_date else period
+            cache_file = f"cache_{tag}_{interval}_{span}.parquet"
+            cached = self._load_fresh_cache(cache_file, interval, cache_max_age)
+            if cached is not None:
+                return cached
+
         try:
-            print(f"[DataFetcher] 正在从 Yahoo Finance 获取 {self.symbol} 数据...")
-            print(f"  周期={period}, 间隔={interval}, 起始={start_date}, 截止={end_date}")
+            if self.verbose:
+                print(f"[DataFetcher] 正在从 Yahoo Finance 获取 {self.symbol} 数据...")
+                print(f"  周期={period}, 间隔={interval}, 起始={start_date}, 截止={end_date}")
 
             if start_date and end_date:
                 # 使用日期范围模式
@@ -100,32 +129,123 @@ class YFinanceDataFetcher:
                 return None
 
             # 标准化列名为小写
-            df.columns = [c.lower() for c in df.columns]
+            df.columns = df.columns.str.lower()
 
             # 只保留核心 OHLCV 列
             ohlcv_cols = ["open", "high", "low", "close", "volume"]
             available_cols = [c for c in ohlcv_cols if c in df.columns]
             df = df[available_cols].copy()
 
-            # 确保索引是 datetime 且列名为 'time'
+            # 去掉时区信息（backtrader 不兼容 tz-aware datetime），保留交易所本地时间；
+            # 直接作用于 DatetimeIndex，reset_index 时随索引一并成为 'time' 列
+            if isinstance(df.index, pd.DatetimeIndex):
+                df.index = df.index.tz_localize(None)
             df.index.name = "time"
             df = df.reset_index()
 
-            # 去掉时区信息（backtrader 不兼容 tz-aware datetime）
-            if pd.api.types.is_datetime64_any_dtype(df["time"]):
-                df["time"] = df["time"].dt.tz_localize(None)
-
-            # 去除 NaN 行
-            df.dropna(inplace=True)
+            # 去除缺失 K 线（yfinance 仅在收盘价上出现 NaN，只检查该列）
+            df.dropna(subset=["close"], inplace=True)
 
-            print(f"[DataFetcher] ✅ 成功获取 {len(df)} 条数据")
-            print(f"  时间范围: {df['time'].iloc[0]} ～ {df['time'].iloc[-1]}")
-            return df
+            if self.verbose:
+                print(f"[DataFetcher] ✅ 成功获取 {len(df)} 条数据")
+                print(f"  时间范围: {df['time'].iloc[0]} ～ {df['time'].iloc[-1]}")
 
         except Exception as e:
             print(f"[DataFetcher] ❌ 数据获取失败: {e}")
             return None
 
+        if cache_file is not None:
+            try:
+                self.save_to_parquet(df, cache_file)
+            except ImportError as e:
+                print(f"[DataFetcher] ⚠️ 未安装 Parquet 引擎（pyarrow/fastparquet），跳过缓存: {e}")
+        return df
+
+    def fetch_many(
+        self,
+        symbols: List[str],
+        max_workers: Optional[int] = None,
+        **kwargs,
+    ) -> Dict[str, Optional[pd.DataFrame]]:
+        """并发拉取多个品种的 OHLCV 数据
+
+        每个品种使用独立的获取器（各自持有 Ticker），在线程池中并行请求，
+        总耗时约为单次请求的最大网络延迟，而非逐个累加。
+
+        Args:
+            symbols: Yahoo Finance 品种代码列表，如 ['GC=F', 'GLD', 'XAUUSD=X']
+            max_workers: 最大并发线程数，默认与品种数量相同
+            **kwargs: 透传给 fetch_ohlcv 的参数（period、interval、use_cache 等）
+
+        Returns:
+            dict: 品种代码 → DataFrame（获取失败的品种为 None），顺序与 symbols 一致
+        """
+        if not symbols:
+            return {}
+
+        fetchers = [
+            self if symbol == self.symbol else YFinanceDataFetcher(symbol, verbose=self.verbose)
+            for symbol in symbols
+        ]
+        with ThreadPoolExecutor(max_workers=max_workers or len(fetchers)) as pool:
+            frames = list(pool.map(lambda f: f.fetch_ohlcv(**kwargs), fetchers))
+        return dict(zip(symbols, frames))
+
+    def _load_fresh_cache(
+        self, filename: str, interval: str, max_age: Optional[float] = None
+    ) -> Optional[pd.DataFrame]:
+        """缓存文件存在且未超过有效期（默认一根 K 线周期）时读取，否则返回 None"""
+        filepath = os.path.join(self.data_dir, filename)
+        if not os.path.exists(filepath):
+            return None
+        if max_age is None:
+            max_age = _INTERVAL_SECONDS.get(interval, 0)
+        age = time.time() - os.path.getmtime(filepath)
+        if age >= max_age:
+            return None
+        try:
+            return self.load_from_parquet(filename)
+        except ImportError:
+            return None
+
+    def save_to_parquet(self, df: pd.DataFrame, filename: str = "xauusd_ohlcv.parquet") -> str:
+        """将 DataFrame 保存为本地 Parquet 文件（snappy 压缩）
+
+        列式二进制格式，读写无需解析文本，dtype 与时间列原样保留。
+        需要安装 pyarrow 或 fastparquet。
+
+        Args:
+            df: 包含 OHLCV 数据的 DataFrame
+            filename: 保存的文件名，默认 'xauusd_ohlcv.parquet'
+
+        Returns:
+            str: 保存文件的完整路径
+        """
+        filepath = os.path.join(self.data_dir, filename)
+        df.to_parquet(filepath, compression="snappy", index=False)
+        if self.verbose:
+            print(f"[DataFetcher] 💾 数据已保存至: {filepath}")
+        return filepath
+
+    def load_from_parquet(self, filename: str = "xauusd_ohlcv.parquet") -> Optional[pd.DataFrame]:
+        """从本地 Parquet 文件加载数据
+
+        Args:
+            filename: Parquet 文件名，默认 'xauusd_ohlcv.parquet'
+
+        Returns:
+            pd.DataFrame: 加载的数据 DataFrame，文件不存在则返回 None
+        """
+        filepath = os.path.join(self.data_dir, filename)
+        if not os.path.exists(filepath):
+            print(f"[DataFetcher] ⚠️ 本地缓存文件不存在: {filepath}")
+            return None
+
+        df = pd.read_parquet(filepath)
+        if self.verbose:
+            print(f"[DataFetcher] 📂 从本地加载 {len(df)} 条数据: {filepath}")
+        return df
+
     def save_to_csv(self, df: pd.DataFrame, filename: str = "xauusd_ohlcv.csv") -> str:
         """将 DataFrame 保存为本地 CSV 文件
 
@@ -138,7 +258,8 @@ class YFinanceDataFetcher:
         """
         filepath = os.path.join(self.data_dir, filename)
         df.to_csv(filepath, index=False)
-        print(f"[DataFetcher] 💾 数据已保存至: {filepath}")
+        if self.verbose:
+            print(f"[DataFetcher] 💾 数据已保存至: {filepath}")
         return filepath
 
     def load_from_csv(self, filename: str = "xauusd_ohlcv.csv") -> Optional[pd.DataFrame]:
@@ -156,7 +277,8 @@ class YFinanceDataFetcher:
             return None
 
         df = pd.read_csv(filepath, parse_dates=["time"])
-        print(f"[DataFetcher] 📂 从本地加载 {len(df)} 条数据: {filepath}")
+        if self.verbose:
+            print(f"[DataFetcher] 📂 从本地加载 {len(df)} 条数据: {filepath}")
         return df
 
 
@@ -179,15 +301,19 @@ class MT5DataFetcher:
         server (str): MT5 服务器地址
         mt5_path (str): MT5 终端安装路径
         symbol (str): 交易品种，默认 'XAUUSD'
+        verbose (bool): 是否输出进度日志
     """
 
-    def __init__(self, symbol: str = "XAUUSD"):
+    _mt5_module = None  # MetaTrader5 模块，延迟导入后所有实例共享
+
+    def __init__(self, symbol: str = "XAUUSD", verbose: bool = True):
         """初始化 MT5 数据获取器
 
         从 .env 文件加载 MT5 连接配置信息。
 
         Args:
             symbol: 交易品种代码，默认为 'XAUUSD'
+            verbose: 是否输出连接/获取进度日志（错误与警告始终输出）
         """
         self.login = int(os.getenv("MT5_LOGIN", "0"))
         self.password = os.getenv("MT5_PASSWORD", "")
@@ -195,20 +321,21 @@ class MT5DataFetcher:
         self.mt5_path = os.getenv("MT5_PATH", "")
         self.symbol = symbol
         self.data_dir = _DATA_DIR
-        self._mt5 = None  # 延迟导入
+        self.verbose = verbose
 
     def _import_mt5(self):
         """延迟导入 MetaTrader5，避免在 Linux 上直接报错"""
-        if self._mt5 is None:
+        cls = type(self)
+        if cls._mt5_module is None:
             try:
                 import MetaTrader5 as mt5
-                self._mt5 = mt5
+                cls._mt5_module = mt5
             except ImportError:
                 raise ImportError(
                     "MetaTrader5 模块仅支持 Windows 平台。"
                     "Linux 环境请使用 YFinanceDataFetcher 作为替代数据源。"
                 )
-        return self._mt5
+        return cls._mt5_module
 
     def connect(self) -> bool:
         """初始化并连接 MT5 终端
@@ -240,14 +367,16 @@ class MT5DataFetcher:
                 return False
 
         account = mt5.account_info()
-        print(f"[MT5DataFetcher] ✅ 已连接 MT5 - 账户: {account.login}, 服务器: {account.server}")
+        if self.verbose:
+            print(f"[MT5DataFetcher] ✅ 已连接 MT5 - 账户: {account.login}, 服务器: {account.server}")
         return True
 
     def disconnect(self) -> None:
         """断开 MT5 终端连接"""
         mt5 = self._import_mt5()
         mt5.shutdown()
-        print("[MT5DataFetcher] 🔌 MT5 连接已断开")
+        if self.verbose:
+            print("[MT5DataFetcher] 🔌 MT5 连接已断开")
 
     def fetch_ohlcv(
         self,
@@ -275,7 +404,8 @@ class MT5DataFetcher:
         if timeframe is None:
             timeframe = mt5.TIMEFRAME_H1
 
-        print(f"[MT5DataFetcher] 正在获取 {self.symbol} 数据 (bars={num_bars})...")
+        if self.verbose:
+            print(f"[MT5DataFetcher] 正在获取 {self.symbol} 数据 (bars={num_bars})...")
 
         try:
             if start_date and end_date:
@@ -292,29 +422,20 @@ class MT5DataFetcher:
                 print(f"[MT5DataFetcher] ⚠️ 未获取到数据: {mt5.last_error()}")
                 return None
 
-            # 转为 DataFrame
-            df = pd.DataFrame(rates)
-            df["time"] = pd.to_datetime(df["time"], unit="s")
-
-            # 标准化列名
-            col_map = {
-                "time": "time",
-                "open": "open",
-                "high": "high",
-                "low": "low",
-                "close": "close",
-                "tick_volume": "volume",
-                "real_volume": "real_volume",
-                "spread": "spread",
-            }
-            df = df.rename(columns=col_map)
-
-            # 只保留核心列
-            keep_cols = [c for c in ["time", "open", "high", "low", "close", "volume"] if c in df.columns]
-            df = df[keep_cols].copy()
-
-            print(f"[MT5DataFetcher] ✅ 成功获取 {len(df)} 条数据")
-            print(f"  时间范围: {df['time'].iloc[0]} ～ {df['time'].iloc[-1]}")
+            # 直接取结构化数组的各字段构造 DataFrame（字段视图，不逐列复制），
+            # 时间戳按秒重新解释为 datetime64，列名即为标准 OHLCV
+            df = pd.DataFrame({
+                "time": rates["time"].astype("datetime64[s]"),
+                "open": rates["open"],
+                "high": rates["high"],
+                "low": rates["low"],
+                "close": rates["close"],
+                "volume": rates["tick_volume"],
+            }, copy=False)
+
+            if self.verbose:
+                print(f"[MT5DataFetcher] ✅ 成功获取 {len(df)} 条数据")
+                print(f"  时间范围: {df['time'].iloc[0]} ～ {df['time'].iloc[-1]}")
             return df
 
         except Exception as e:
@@ -333,7 +454,8 @@ class MT5DataFetcher:
         """
         filepath = os.path.join(self.data_dir, filename)
         df.to_csv(filepath, index=False)
-        print(f"[MT5DataFetcher] 💾 数据已保存至: {filepath}")
+        if self.verbose:
+            print(f"[MT5DataFetcher] 💾 数据已保存至: {filepath}")
         return filepath
 
     def load_from_csv(self, filename: str = "xauusd_ohlcv.csv") -> Optional[pd.DataFrame]:
@@ -351,5 +473,6 @@ class MT5DataFetcher:
             return None
 
         df = pd.read_csv(filepath, parse_dates=["time"])
-        print(f"[MT5DataFetcher] 📂 从本地加载 {len(df)} 条数据: {filepath}")
+        if self.verbose:
+            print(f"[MT5DataFetcher] 📂 从本地加载 {len(df)} 条数据: {filepath}")
         return df
@@ -29,6 +29,8 @@ class MT5Trader:
         magic (int): EA 魔术号，用于标识本系统发出的订单
     """
 
+    _mt5_module = None  # MetaTrader5 模块，延迟导入后所有实例共享
+
     def __init__(self, symbol: str = "XAUUSD"):
         """初始化 MT5 交易执行器
 
@@ -42,20 +44,39 @@ class MT5Trader:
         self.server = os.getenv("MT5_SERVER", "")
         self.symbol = symbol
         self.magic = int(os.getenv("MAGIC_NUMBER", "123456"))
-        self._mt5 = None  # 延迟导入
+
+        # MT5 常量，首次导入 MetaTrader5 时解析一次，下单热路径直接读取
+        self._ACTION_DEAL = None
+        self._BUY = None
+        self._SELL = None
+        self._GTC = None
+        self._IOC = None
+        self._OK = None
+
+        # 品种信息在连接期间不变，缓存至断开；报价用于下单定价，每次都重新获取
+        self._sym_info_cache = None
 
     def _import_mt5(self):
-        """延迟导入 MetaTrader5，避免在 Linux 上直接报错"""
-        if self._mt5 is None:
+        """延迟导入 MetaTrader5，避免在 Linux 上直接报错；首次调用时同时解析 MT5 常量"""
+        cls = type(self)
+        if cls._mt5_module is None:
             try:
                 import MetaTrader5 as mt5
-                self._mt5 = mt5
+                cls._mt5_module = mt5
             except ImportError:
                 raise ImportError(
                     "MetaTrader5 模块仅支持 Windows 平台。"
                     "请在 Windows 环境下运行实盘交易模块。"
                 )
-        return self._mt5
+        mt5 = cls._mt5_module
+        if self._OK is None:
+            self._ACTION_DEAL = mt5.TRADE_ACTION_DEAL
+            self._BUY = mt5.ORDER_TYPE_BUY
+            self._SELL = mt5.ORDER_TYPE_SELL
+            self._GTC = mt5.ORDER_TIME_GTC
+            self._IOC = mt5.ORDER_FILLING_IOC
+            self._OK = mt5.TRADE_RETCODE_DONE
+        return mt5
 
     def connect(self) -> bool:
         """连接 MT5 交易终端
@@ -66,6 +87,7 @@ class MT5Trader:
             bool: 连接成功返回 True，失败返回 False
         """
         mt5 = self._import_mt5()
+        self._invalidate_cache()
 
         if not mt5.initialize():
             print(f"[MT5Trader] ❌ MT5 初始化失败: {mt5.last_error()}")
@@ -91,8 +113,13 @@ class MT5Trader:
         """断开 MT5 交易终端连接"""
         mt5 = self._import_mt5()
         mt5.shutdown()
+        self._invalidate_cache()
         print("[MT5Trader] 🔌 MT5 连接已断开")
 
+    def _invalidate_cache(self) -> None:
+        """清空品种信息缓存"""
+        self._sym_info_cache = None
+
     def get_account_info(self) -> Optional[dict]:
         """查询账户信息
 
@@ -125,7 +152,10 @@ class MT5Trader:
         return info
 
     def _get_symbol_info(self):
-        """获取品种信息并确保品种可见"""
+        """获取品种信息并确保品种可见（连接期间缓存）"""
+        if self._sym_info_cache is not None:
+            return self._sym_info_cache
+
         mt5 = self._import_mt5()
         symbol_info = mt5.symbol_info(self.symbol)
         if symbol_info is None:
@@ -137,8 +167,13 @@ class MT5Trader:
                 print(f"[MT5Trader] ❌ 无法选中品种 {self.symbol}")
                 return None
 
+        self._sym_info_cache = symbol_info
         return symbol_info
 
+    def _get_tick(self):
+        """获取最新报价（下单定价与止盈止损都依赖它，不做缓存）"""
+        return self._import_mt5().symbol_info_tick(self.symbol)
+
     def buy(
         self,
         lot: float = 0.01,
@@ -169,19 +204,19 @@ class MT5Trader:
         if symbol_info is None:
             return None
 
-        price = mt5.symbol_info_tick(self.symbol).ask
+        price = self._get_tick().ask
         point = symbol_info.point
 
         request = {
-            "action": mt5.TRADE_ACTION_DEAL,
+            "action": self._ACTION_DEAL,
             "symbol": self.symbol,
             "volume": lot,
-            "type": mt5.ORDER_TYPE_BUY,
+            "type": self._BUY,
             "price": price,
             "magic": self.magic,
             "comment": comment,
-            "type_time": mt5.ORDER_TIME_GTC,
-            "type_filling": mt5.ORDER_FILLING_IOC,
+            "type_time": self._GTC,
+            "type_filling": self._IOC,
         }
 
         # 设置止损
@@ -193,7 +228,7 @@ class MT5Trader:
             request["tp"] = price + tp_points * point
 
         result = mt5.order_send(request)
-        if result.retcode != mt5.TRADE_RETCODE_DONE:
+        if result.retcode != self._OK:
             print(f"[MT5Trader] ❌ 买入失败 | 错误码: {result.retcode} | {result.comment}")
             return None
 
@@ -233,19 +268,19 @@ class MT5Trader:
         if symbol_info is None:
             return None
 
-        price = mt5.symbol_info_tick(self.symbol).bid
+        price = self._get_tick().bid
         point = symbol_info.point
 
         request = {
-            "action": mt5.TRADE_ACTION_DEAL,
+            "action": self._ACTION_DEAL,
             "symbol": self.symbol,
             "volume": lot,
-            "type": mt5.ORDER_TYPE_SELL,
+            "type": self._SELL,
             "price": price,
             "magic": self.magic,
             "comment": comment,
-            "type_time": mt5.ORDER_TIME_GTC,
-            "type_filling": mt5.ORDER_FILLING_IOC,
+            "type_time": self._GTC,
+            "type_filling": self._IOC,
         }
 
         # 设置止损（卖出方向止损在上方）
@@ -257,7 +292,7 @@ class MT5Trader:
             request["tp"] = price - tp_points * point
 
         result = mt5.order_send(request)
-        if result.retcode != mt5.TRADE_RETCODE_DONE:
+        if result.retcode != self._OK:
             print(f"[MT5Trader] ❌ 卖出失败 | 错误码: {result.retcode} | {result.comment}")
             return None
 
@@ -292,13 +327,15 @@ class MT5Trader:
         pos = positions[0]
 
         # 反向下单平仓
-        close_type = mt5.ORDER_TYPE_SELL if pos.type == mt5.ORDER_TYPE_BUY else mt5.ORDER_TYPE_BUY
-        price = (mt5.symbol_info_tick(self.symbol).bid
-                 if pos.type == mt5.ORDER_TYPE_BUY
-                 else mt5.symbol_info_tick(self.symbol).ask)
+        close_type = self._SELL if pos.type == self._BUY else self._BUY
+        tick = self._get_tick()
+        if tick is None:
+            print(f"[MT5Trader] ❌ 获取 {self.symbol} 报价失败: {mt5.last_error()}")
+            return False
+        price = tick.bid if pos.type == self._BUY else tick.ask
 
         request = {
-            "action": mt5.TRADE_ACTION_DEAL,
+            "action": self._ACTION_DEAL,
             "symbol": self.symbol,
             "volume": pos.volume,
             "type": close_type,
@@ -306,12 +343,12 @@ class MT5Trader:
             "price": price,
             "magic": self.magic,
             "comment": "Gold_Quant_Close",
-            "type_time": mt5.ORDER_TIME_GTC,
-            "type_filling": mt5.ORDER_FILLING_IOC,
+            "type_time": self._GTC,
+            "type_filling": self._IOC,
         }
 
         result = mt5.order_send(request)
-        if result.retcode != mt5.TRADE_RETCODE_DONE:
+        if result.retcode != self._OK:
             print(f"[MT5Trader] ❌ 平仓失败 | ID: {position_id} | "
                   f"错误码: {result.retcode} | {result.comment}")
             return False
@@ -322,7 +359,9 @@ class MT5Trader:
     def close_all_positions(self) -> int:
         """平掉当前品种的所有持仓
 
-        遍历并平掉当前交易品种下的所有持仓。
+        只查询一次持仓，逐笔顺序发送反向平仓请求；每笔发送前重新获取报价，
+        避免后续订单带着过时价格被重新报价或拒单。
+        （MetaTrader5 接口未声明线程安全，实盘下单不并发调用 order_send）
 
         Returns:
             int: 成功平仓的数量
@@ -336,8 +375,34 @@ class MT5Trader:
 
         closed = 0
         for pos in positions:
-            if self.close_position(pos.ticket):
+            tick = mt5.symbol_info_tick(self.symbol)
+            if tick is None:
+                print(f"[MT5Trader] ❌ 获取 {self.symbol} 报价失败: {mt5.last_error()}")
+                continue
+
+            is_buy = pos.type == self._BUY
+            request = {
+                "action": self._ACTION_DEAL,
+                "symbol": self.symbol,
+                "volume": pos.volume,
+                "type": self._SELL if is_buy else self._BUY,
+                "position": pos.ticket,
+                "price": tick.bid if is_buy else tick.ask,
+                "magic": self.magic,
+                "comment": "Gold_Quant_Close",
+                "type_time": self._GTC,
+                "type_filling": self._IOC,
+            }
+            result = mt5.order_send(request)
+            if result is not None and result.retcode == self._OK:
                 closed += 1
+                print(f"[MT5Trader] ✅ 平仓成功 | ID: {pos.ticket} | "
+                      f"价格: {result.price:.2f}")
+            else:
+                retcode = result.retcode if result is not None else mt5.last_error()
+                comment = result.comment if result is not None else ""
+                print(f"[MT5Trader] ❌ 平仓失败 | ID: {pos.ticket} | "
+                      f"错误码: {retcode} | {comment}")
 
         print(f"[MT5Trader] 批量平仓完成 | 成功: {closed}/{len(positions)}")
         return closed
@@ -364,17 +429,18 @@ class MT5Trader:
             print(f"[MT5Trader] 当前 {self.symbol} 无持仓")
             return []
 
-        result = []
-        for pos in positions:
-            result.append({
-                "ticket": pos.ticket,
-                "type": "buy" if pos.type == mt5.ORDER_TYPE_BUY else "sell",
-                "volume": pos.volume,
-                "price_open": pos.price_open,
-                "sl": pos.sl,
-                "tp": pos.tp,
-                "profit": pos.profit,
-            })
+        result = [
+            {
+                "ticket": d["ticket"],
+                "type": "buy" if d["type"] == self._BUY else "sell",
+                "volume": d["volume"],
+                "price_open": d["price_open"],
+                "sl": d["sl"],
+                "tp": d["tp"],
+                "profit": d["profit"],
+            }
+            for d in (pos._asdict() for pos in positions)
+        ]
 
         print(f"[MT5Trader] 📋 当前持仓 {len(result)} 笔:")
         for p in result:
@@ -0,0 +1,425 @@
+"""
+_kernels.py - 技术指标计算内核
+
+以逐元素单循环实现 RSI、MACD、SMA、ATR 所需的底层运算，输入输出均为
+float64 NumPy 数组。安装 numba 时以 @njit 编译为本地代码，未安装时退化为
+普通 Python 函数，结果一致，仅速度较慢。
+
+未安装 numba 时，MACD 与 ATR 改用 _ema_vec 的分块闭式解向量化计算 EMA，
+SMA 改用 bottleneck / pandas 的移动平均，避免纯 Python 逐元素循环
+（与递推结果相差在浮点舍入量级）。
+
+各内核的数值口径与 ta 库保持一致：
+    - EMA 对应 pandas ewm(adjust=False)，缺失值处理与 ignore_na=False 相同
+    - RSI 使用 alpha=1/period 的 Wilder 平滑
+    - ATR 以前 period 根真实波幅均值为起点递推，预热期为 0
+"""
+
+import numpy as np
+
+try:
+    import bottleneck as bn  # 可选加速：未安装 numba 时的移动平均
+except ImportError:
+    bn = None
+
+try:
+    from numba import njit
+    _HAS_NUMBA = True
+except ImportError:  # 未安装 numba 时退化为普通 Python 函数
+    _HAS_NUMBA = False
+
+    def njit(*args, **kwargs):
+        if len(args) == 1 and callable(args[0]) and not kwargs:
+            return args[0]
+        return lambda func: func
+
+
+@njit(cache=True, nogil=True)
+def _ema_step(weighted, old_wt, cur, alpha):
+    """EMA 单步更新，返回新的 (均值, 旧权重)"""
+    if not np.isnan(weighted):
+        old_wt *= 1.0 - alpha
+        if not np.isnan(cur):
+            if weighted != cur:
+                weighted = (old_wt * weighted + alpha * cur) / (old_wt + alpha)
+            old_wt = 1.0
+    elif not np.isnan(cur):
+        weighted = cur
+    return weighted, old_wt
+
+
+@njit(cache=True, nogil=True)
+def _ema(x, alpha, min_periods):
+    """指数移动平均（pandas ewm(alpha=alpha, adjust=False) 口径）
+
+    首个有效值作为初值；缺失值不更新均值但旧权重继续衰减；
+    有效观测数不足 min_periods 的位置为 NaN。
+    """
+    n = len(x)
+    out = np.empty(n)
+    weighted = np.nan
+    old_wt = 1.0
+    nobs = 0
+    for i in range(n):
+        cur = x[i]
+        if not np.isnan(cur):
+            nobs += 1
+        weighted, old_wt = _ema_step(weighted, old_wt, cur, alpha)
+        out[i] = weighted if nobs >= min_periods else np.nan
+    return out
+
+
+def _ema_vec(x, alpha, min_periods):
+    """_ema 的向量化版本（无需 numba）
+
+    y_t = q*y_{t-1} + alpha*x_t（q = 1-alpha）在长度为 B 的块内展开为
+    y_{s+j} = q^(j+1)*y_{s-1} + alpha*q^j*cumsum(x_{s+k}/q^k)，
+    块间以上一块末值递推。块长按 q^-B 不超过 1e6 选取，限制块内缩放带来的精度损失。
+    仅处理“前导缺失 + 连续有效值”的序列，中间有缺失值时回退到逐步递推的 _ema。
+    """
+    x = np.asarray(x, dtype=np.float64)
+    n = len(x)
+    out = np.full(n, np.nan)
+    valid = ~np.isnan(x)
+    if not valid.any():
+        return out
+    start = int(valid.argmax())
+    if not valid[start:].all():
+        return _ema(x, alpha, min_periods)
+
+    y = x[start:]
+    q = 1.0 - alpha
+    if q <= 0.0:
+        ema = y.copy()
+    else:
+        block = max(1, min(512, int(6.0 / max(-np.log10(q), 1e-12))))
+        powers = q ** np.arange(block)
+        inv_powers = 1.0 / powers
+        ema = np.empty(len(y))
+        ema[0] = y[0]
+        prev = y[0]
+        for s in range(1, len(y), block):
+            seg = y[s:s + block]
+            m = len(seg)
+            acc = np.cumsum(seg * inv_powers[:m]) * (alpha * powers[:m])
+            ema[s:s + m] = acc + prev * q * powers[:m]
+            prev = ema[s + m - 1]
+
+    out[start:] = ema
+    out[start:start + min_periods - 1] = np.nan
+    return out
+
+
+def _macd_vec(close, fast, slow, signal):
+    """_macd 的向量化版本，EMA 由 _ema_vec 计算"""
+    ema_fast = _ema_vec(close, 2.0 / (fast + 1), fast)
+    ema_slow = _ema_vec(close, 2.0 / (slow + 1), slow)
+    macd = ema_fast - ema_slow
+    macd_signal = _ema_vec(macd, 2.0 / (signal + 1), signal)
+    return macd, macd_signal, macd - macd_signal
+
+
+def _atr_vec(high, low, close, period):
+    """_atr 的向量化版本（无需 numba）
+
+    真实波幅由三组数组运算取最大值得到；以前 period 根均值为起点的 Wilder 递推
+    等价于 alpha=1/period 的 EMA，交给 _ema_vec 计算。
+    """
+    high = np.asarray(high, dtype=np.float64)
+    low = np.asarray(low, dtype=np.float64)
+    close = np.asarray(close, dtype=np.float64)
+    n = len(close)
+    out = np.zeros(n)
+    if n < period:
+        return out
+
+    prev_close = np.empty(n)
+    prev_close[0] = close[0]
+    prev_close[1:] = close[:-1]
+    hl = high - low
+    tr = np.maximum(hl, np.maximum(np.abs(high - prev_close), np.abs(low - prev_close)))
+    tr[0] = hl[0]
+
+    seeded = np.empty(n - period + 1)
+    seeded[0] = tr[:period].mean()
+    seeded[1:] = tr[period:]
+    out[period - 1:] = _ema_vec(seeded, 1.0 / period, 1)
+    return out
+
+
+@njit(cache=True, nogil=True)
+def _rsi(close, period):
+    """相对强弱指标，涨跌幅分别做 Wilder 平滑，平均跌幅为 0 时取 100"""
+    n = len(close)
+    up = np.empty(n)
+    down = np.empty(n)
+    if n > 0:
+        up[0] = 0.0
+        down[0] = 0.0
+    for i in range(1, n):
+        diff = close[i] - close[i - 1]
+        up[i] = diff if diff > 0.0 else 0.0
+        down[i] = -diff if diff < 0.0 else 0.0
+
+    alpha = 1.0 / period
+    avg_gain = _ema(up, alpha, period)
+    avg_loss = _ema(down, alpha, period)
+
+    out = np.empty(n)
+    for i in range(n):
+        if avg_loss[i] == 0.0:
+            out[i] = 100.0
+        else:
+            out[i] = 100.0 - 100.0 / (1.0 + avg_gain[i] / avg_loss[i])
+    return out
+
+
+@njit(cache=True, nogil=True)
+def _macd(close, fast, slow, signal):
+    """MACD 线、信号线与柱状图，各 EMA 的 alpha 为 2/(周期+1)"""
+    ema_fast = _ema(close, 2.0 / (fast + 1), fast)
+    ema_slow = _ema(close, 2.0 / (slow + 1), slow)
+    macd = ema_fast - ema_slow
+    macd_signal = _ema(macd, 2.0 / (signal + 1), signal)
+    return macd, macd_signal, macd - macd_signal
+
+
+@njit(cache=True, nogil=True)
+def _sma(x, period):
+    """简单移动平均，窗口内有效值不足 period 个时为 NaN
+
+    滑动求和的加入与移出各自做 Kahan 补偿，逐步顺序与 pandas rolling().mean() 一致。
+    """
+    n = len(x)
+    out = np.empty(n)
+    total = 0.0
+    comp_add = 0.0
+    comp_remove = 0.0
+    nobs = 0
+    neg_ct = 0
+    same_ct = 0
+    prev = np.nan
+    for i in range(n):
+        if i == 0 or period == 1:
+            # 首根或窗口与上一窗口不重叠时重置状态
+            total = comp_add = comp_remove = 0.0
+            nobs = neg_ct = same_ct = 0
+            prev = x[i]
+        elif i >= period:
+            old = x[i - period]
+            if not np.isnan(old):
+                nobs -= 1
+                y = -old - comp_remove
+                t = total + y
+                comp_remove = t - total - y
+                total = t
+                if old < 0.0 or (old == 0.0 and np.signbit(old)):
+                    neg_ct -= 1
+
+        v = x[i]
+        if not np.isnan(v):
+            nobs += 1
+            y = v - comp_add
+            t = total + y
+            comp_add = t - total - y
+            total = t
+            if v < 0.0 or (v == 0.0 and np.signbit(v)):
+                neg_ct += 1
+            if v == prev:
+                same_ct += 1
+            else:
+                same_ct = 1
+            prev = v
+
+        if nobs >= period and nobs > 0:
+            mean = total / nobs
+            if same_ct >= nobs:
+                mean = prev
+            elif neg_ct == 0 and mean < 0.0:
+                mean = 0.0
+            elif neg_ct == nobs and mean > 0.0:
+                mean = 0.0
+            out[i] = mean
+        else:
+            out[i] = np.nan
+    return out
+
+
+def _sma_fallback(x, period):
+    """_sma 的无 numba 版本：优先 bottleneck.move_mean（C 实现滑动和），否则 pandas rolling().mean()
+
+    pandas 路径与 _sma 逐位一致；bottleneck 未做 Kahan 补偿，与之相差在浮点舍入量级。
+    """
+    x = np.asarray(x, dtype=np.float64)
+    if period > len(x):
+        return np.full(len(x), np.nan)
+    if bn is not None:
+        return bn.move_mean(x, window=period, min_count=period)
+    import pandas as pd
+    return pd.Series(x).rolling(period).mean().to_numpy()
+
+
+@njit(cache=True, nogil=True)
+def _atr(high, low, close, period):
+    """真实波动幅度均值，前 period-1 个值为 0（与 ta 一致）"""
+    n = len(close)
+    tr = np.empty(n)
+    for i in range(n):
+        hl = high[i] - low[i]
+        if i == 0:
+            tr[i] = hl
+        else:
+            tr[i] = max(hl, abs(high[i] - close[i - 1]), abs(low[i] - close[i - 1]))
+
+    out = np.zeros(n)
+    if n < period:
+        return out
+    out[period - 1] = tr[:period].mean()
+    # 周期相关常量在循环外折算为浮点数，保持除法形式以与 ta 逐位一致
+    keep = float(period - 1)
+    div = float(period)
+    for i in range(period, n):
+        out[i] = (out[i - 1] * keep + tr[i]) / div
+    return out
+
+
+@njit(cache=True, nogil=True)
+def _all_indicators(high, low, close, rsi_p, fast, slow, signal, sma_p, atr_p):
+    """单次遍历同时计算 RSI、MACD、SMA、ATR
+
+    逐根 K 线更新各指标的滚动状态（RSI 涨跌 EMA、MACD 三条 EMA、SMA 滑动和、
+    ATR 递推值），数值与上面各独立内核逐位一致。
+
+    Returns:
+        (rsi, macd, macd_signal, macd_hist, sma, atr)
+    """
+    n = len(close)
+    rsi = np.empty(n)
+    macd = np.empty(n)
+    macd_signal = np.empty(n)
+    macd_hist = np.empty(n)
+    sma = np.empty(n)
+    atr = np.zeros(n)
+
+    # RSI：涨跌幅 Wilder 平滑
+    rsi_alpha = 1.0 / rsi_p
+    gain, gain_wt = np.nan, 1.0
+    loss, loss_wt = np.nan, 1.0
+
+    # MACD：快慢线与信号线
+    fast_alpha = 2.0 / (fast + 1)
+    slow_alpha = 2.0 / (slow + 1)
+    sig_alpha = 2.0 / (signal + 1)
+    ema_fast, fast_wt = np.nan, 1.0
+    ema_slow, slow_wt = np.nan, 1.0
+    ema_sig, sig_wt = np.nan, 1.0
+    close_obs = 0
+    macd_obs = 0
+
+    # SMA：滑动和（加入 / 移出分别补偿）
+    total = comp_add = comp_remove = 0.0
+    sma_obs = neg_ct = same_ct = 0
+    prev = np.nan
+
+    # ATR：前 atr_p 根真实波幅求和作为起点
+    tr_sum = 0.0
+    atr_keep = float(atr_p - 1)
+    atr_div = float(atr_p)
+
+    for i in range(n):
+        c = close[i]
+
+        # ---- RSI ----
+        if i == 0:
+            up = 0.0
+            down = 0.0
+        else:
+            diff = c - close[i - 1]
+            up = diff if diff > 0.0 else 0.0
+            down = -diff if diff < 0.0 else 0.0
+        gain, gain_wt = _ema_step(gain, gain_wt, up, rsi_alpha)
+        loss, loss_wt = _ema_step(loss, loss_wt, down, rsi_alpha)
+        if i + 1 < rsi_p:
+            rsi[i] = np.nan
+        elif loss == 0.0:
+            rsi[i] = 100.0
+        else:
+            rsi[i] = 100.0 - 100.0 / (1.0 + gain / loss)
+
+        # ---- MACD ----
+        if not np.isnan(c):
+            close_obs += 1
+        ema_fast, fast_wt = _ema_step(ema_fast, fast_wt, c, fast_alpha)
+        ema_slow, slow_wt = _ema_step(ema_slow, slow_wt, c, slow_alpha)
+        f_val = ema_fast if close_obs >= fast else np.nan
+        s_val = ema_slow if close_obs >= slow else np.nan
+        m = f_val - s_val
+        if not np.isnan(m):
+            macd_obs += 1
+        ema_sig, sig_wt = _ema_step(ema_sig, sig_wt, m, sig_alpha)
+        sig_val = ema_sig if macd_obs >= signal else np.nan
+        macd[i] = m
+        macd_signal[i] = sig_val
+        macd_hist[i] = m - sig_val
+
+        # ---- SMA ----
+        if i == 0 or sma_p == 1:
+            total = comp_add = comp_remove = 0.0
+            sma_obs = neg_ct = same_ct = 0
+            prev = c
+        elif i >= sma_p:
+            old = close[i - sma_p]
+            if not np.isnan(old):
+                sma_obs -= 1
+                y = -old - comp_remove
+                t = total + y
+                comp_remove = t - total - y
+                total = t
+                if old < 0.0 or (old == 0.0 and np.signbit(old)):
+                    neg_ct -= 1
+        if not np.isnan(c):
+            sma_obs += 1
+            y = c - comp_add
+            t = total + y
+            comp_add = t - total - y
+            total = t
+            if c < 0.0 or (c == 0.0 and np.signbit(c)):
+                neg_ct += 1
+            if c == prev:
+                same_ct += 1
+            else:
+                same_ct = 1
+            prev = c
+        if sma_obs >= sma_p and sma_obs > 0:
+            mean = total / sma_obs
+            if same_ct >= sma_obs:
+                mean = prev
+            elif neg_ct == 0 and mean < 0.0:
+                mean = 0.0
+            elif neg_ct == sma_obs and mean > 0.0:
+                mean = 0.0
+            sma[i] = mean
+        else:
+            sma[i] = np.nan
+
+        # ---- ATR ----
+        hl = high[i] - low[i]
+        if i == 0:
+            tr = hl
+        else:
+            tr = max(hl, abs(high[i] - close[i - 1]), abs(low[i] - close[i - 1]))
+        if i < atr_p:
+            tr_sum += tr
+            if i == atr_p - 1:
+                atr[i] = tr_sum / atr_p
+        else:
+            atr[i] = (atr[i - 1] * atr_keep + tr) / atr_div
+
+    return rsi, macd, macd_signal, macd_hist, sma, atr
+
+
+if not _HAS_NUMBA:
+    # 未安装 numba 时 _macd、_sma、_atr 为纯 Python 逐元素循环，改用向量化 / C 实现
+    _macd = _macd_vec
+    _sma = _sma_fallback
+    _atr = _atr_vec
@@ -2,11 +2,26 @@
 technical_indicators.py - 技术指标计算模块
 
 提供常用技术指标的计算函数，包括 RSI、MACD、SMA、ATR 等，
-基于 ta（Technical Analysis）库进行封装，供因子挖掘和策略信号生成使用。
+底层由 factors._kernels 中的数组内核计算（数值口径与 ta 库一致），
+供因子挖掘和策略信号生成使用。
 """
 
+import numpy as np
 import pandas as pd
-import ta
+
+from factors._kernels import _HAS_NUMBA, _all_indicators, _atr, _ema, _ema_step, _macd, _rsi, _sma
+
+
+def _is_polars(df) -> bool:
+    """是否为 Polars DataFrame（按类型所在模块判断，无需导入 polars）"""
+    return type(df).__module__.partition(".")[0] == "polars"
+
+
+def _values(df: pd.DataFrame, column: str) -> np.ndarray:
+    """取列的 float64 数组视图（已是 float64 时不复制）"""
+    if _is_polars(df):
+        return df.get_column(column).to_numpy().astype(np.float64, copy=False)
+    return df[column].to_numpy(dtype=np.float64, copy=False)
 
 
 def calculate_rsi(df: pd.DataFrame, period: int = 14, column: str = "close") -> pd.Series:
@@ -23,8 +38,7 @@ def calculate_rsi(df: pd.DataFrame, period: int = 14, column: str = "close") ->
     Returns:
         pd.Series: RSI 指标序列，值域 [0, 100]
     """
-    indicator = ta.momentum.RSIIndicator(close=df[column], window=period)
-    return indicator.rsi()
+    return pd.Series(_rsi(_values(df, column), period), index=df.index, name="rsi")
 
 
 def calculate_macd(
@@ -51,17 +65,12 @@ def calculate_macd(
             - macd_signal (float): 信号线
             - macd_hist (float): MACD 柱状图（MACD 线 - 信号线）
     """
-    indicator = ta.trend.MACD(
-        close=df[column],
-        window_fast=fast_period,
-        window_slow=slow_period,
-        window_sign=signal_period,
-    )
+    macd, macd_signal, macd_hist = _macd(_values(df, column), fast_period, slow_period, signal_period)
     return pd.DataFrame({
-        "macd": indicator.macd(),
-        "macd_signal": indicator.macd_signal(),
-        "macd_hist": indicator.macd_diff(),
-    })
+        "macd": macd,
+        "macd_signal": macd_signal,
+        "macd_hist": macd_hist,
+    }, index=df.index)
 
 
 def calculate_sma(df: pd.DataFrame, period: int = 20, column: str = "close") -> pd.Series:
@@ -77,8 +86,7 @@ def calculate_sma(df: pd.DataFrame, period: int = 20, column: str = "close") ->
     Returns:
         pd.Series: SMA 指标序列
     """
-    indicator = ta.trend.SMAIndicator(close=df[column], window=period)
-    return indicator.sma_indicator()
+    return pd.Series(_sma(_values(df, column), period), index=df.index, name=f"sma_{period}")
 
 
 def calculate_atr(df: pd.DataFrame, period: int = 14) -> pd.Series:
@@ -94,13 +102,8 @@ def calculate_atr(df: pd.DataFrame, period: int = 14) -> pd.Series:
     Returns:
         pd.Series: ATR 指标序列
     """
-    indicator = ta.volatility.AverageTrueRange(
-        high=df["high"],
-        low=df["low"],
-        close=df["close"],
-        window=period,
-    )
-    return indicator.average_true_range()
+    atr = _atr(_values(df, "high"), _values(df, "low"), _values(df, "close"), period)
+    return pd.Series(atr, index=df.index, name="atr")
 
 
 def add_all_indicators(
@@ -111,49 +114,226 @@ def add_all_indicators(
     macd_signal: int = 9,
     sma_period: int = 20,
     atr_period: int = 14,
+    dtype=np.float64,
 ) -> pd.DataFrame:
     """批量计算所有技术指标并合并到原始 DataFrame
 
-    一次性计算 RSI、MACD、SMA、ATR 四个技术指标，
-    将结果作为新列添加到输入 DataFrame 中。
+    安装 numba 时由融合内核单次遍历 OHLC 数组同时计算 RSI、MACD、SMA、ATR
+    四个技术指标，否则逐个调用 calculate_*（MACD 走向量化 EMA）。
+    结果一次性拼接在输入数据之后返回（不修改输入 DataFrame）。
 
     Args:
-        df: 包含 OHLCV 数据的 DataFrame
+        df: 包含 OHLCV 数据的 DataFrame（pandas 或 Polars）
         rsi_period: RSI 周期，默认 14
         macd_fast: MACD 快线周期，默认 12
         macd_slow: MACD 慢线周期，默认 26
         macd_signal: MACD 信号线周期，默认 9
         sma_period: SMA 周期，默认 20
         atr_period: ATR 周期，默认 14
+        dtype: 指标列的输出类型，默认 float64；传入 np.float32 可减半指标列内存，
+            内核计算仍以 float64 进行，仅在输出时转换
 
     Returns:
-        pd.DataFrame: 添加了所有技术指标列的 DataFrame
+        pd.DataFrame: 添加了所有技术指标列的 DataFrame（输入为 Polars DataFrame 时返回 Polars DataFrame）
     """
-    result = df.copy()
-
-    # RSI
-    result["rsi"] = calculate_rsi(result, period=rsi_period)
-
-    # MACD
-    macd_df = calculate_macd(
-        result,
-        fast_period=macd_fast,
-        slow_period=macd_slow,
-        signal_period=macd_signal,
-    )
-    result["macd"] = macd_df["macd"].values
-    result["macd_signal"] = macd_df["macd_signal"].values
-    result["macd_hist"] = macd_df["macd_hist"].values
-
-    # SMA
-    result[f"sma_{sma_period}"] = calculate_sma(result, period=sma_period)
-
-    # ATR
-    result[f"atr_{atr_period}"] = calculate_atr(result, period=atr_period)
+    if _HAS_NUMBA:
+        rsi, macd, signal, hist, sma, atr = _all_indicators(
+            _values(df, "high"), _values(df, "low"), _values(df, "close"),
+            rsi_period, macd_fast, macd_slow, macd_signal, sma_period, atr_period,
+        )
+    else:
+        close = _values(df, "close")
+        rsi = _rsi(close, rsi_period)
+        macd, signal, hist = _macd(close, macd_fast, macd_slow, macd_signal)
+        sma = _sma(close, sma_period)
+        atr = _atr(_values(df, "high"), _values(df, "low"), close, atr_period)
+    new_cols = {
+        "rsi": rsi,
+        "macd": macd,
+        "macd_signal": signal,
+        "macd_hist": hist,
+        f"sma_{sma_period}": sma,
+        f"atr_{atr_period}": atr,
+    }
+    # 有效行 = 原始列与指标列均无缺失；指标只需检查各自数组，不必对整表 dropna
+    valid = ~np.isnan(np.column_stack(list(new_cols.values()))).any(axis=1)
+    new_cols = {name: values.astype(dtype, copy=False) for name, values in new_cols.items()}
+
+    if _is_polars(df):
+        # Polars 输入：以 with_columns 附加指标列并返回 Polars DataFrame
+        import polars as pl
+
+        result = df.with_columns([pl.Series(name, values) for name, values in new_cols.items()])
+        valid &= result.select(
+            pl.all_horizontal(pl.exclude(list(new_cols)).is_not_null())
+        ).to_series().to_numpy()
+    else:
+        # 新列一次性组装成 DataFrame 再与原数据横向拼接，避免逐列插入
+        indicators = pd.DataFrame(new_cols, index=df.index)
+        overlap = df.columns.intersection(indicators.columns)
+        base = df.drop(columns=overlap) if len(overlap) else df
+        result = pd.concat([base, indicators], axis=1)
+        valid &= base.notna().all(axis=1).to_numpy()
 
     print(f"[Indicators] ✅ 已计算全部技术指标: RSI({rsi_period}), "
           f"MACD({macd_fast}/{macd_slow}/{macd_signal}), "
           f"SMA({sma_period}), ATR({atr_period})")
-    print(f"[Indicators] 有效数据行数: {result.dropna().shape[0]} / {len(result)}")
+    print(f"[Indicators] 有效数据行数: {np.count_nonzero(valid)} / {len(result)}")
 
     return result
+
+
+# ============================================================
+# 增量更新（实盘 / 滚动前推中逐根 K 线 O(1) 计算）
+# ============================================================
+
+class EMAState:
+    """指数移动平均的滚动状态（与批量计算的 pandas ewm(adjust=False) 口径一致）
+
+    实盘循环中应长期持有该对象，每根新 K 线调用一次 update()，
+    无需对整段历史重新计算。
+
+    Attributes:
+        alpha (float): 平滑系数
+        min_periods (int): 输出有效值所需的最少观测数
+        mean (float): 当前均值（尚无有效观测时为 NaN）
+        nobs (int): 已累计的有效观测数
+    """
+
+    def __init__(self, alpha: float, min_periods: int = 1):
+        self.alpha = alpha
+        self.min_periods = min_periods
+        self.mean = np.nan
+        self._old_wt = 1.0
+        self.nobs = 0
+
+    @classmethod
+    def from_series(cls, values, alpha: float, min_periods: int = 1) -> "EMAState":
+        """由一段预热数据初始化状态，均值由批量内核一次算出"""
+        state = cls(alpha, min_periods)
+        x = np.asarray(values, dtype=np.float64)
+        valid = np.flatnonzero(~np.isnan(x))
+        if len(valid) == 0:
+            return state
+        # 最后一个有效值处的旧权重恒为 1，其后的缺失值逐个衰减
+        last = valid[-1]
+        state.mean = float(_ema(x[:last + 1], alpha, 1)[-1])
+        state.nobs = len(valid)
+        for v in x[last + 1:]:
+            state.update(v)
+        return state
+
+    @property
+    def value(self) -> float:
+        """当前 EMA 值，有效观测不足 min_periods 时为 NaN"""
+        return self.mean if self.nobs >= self.min_periods else np.nan
+
+    def update(self, x: float) -> float:
+        """加入一个新观测并返回更新后的 EMA 值"""
+        if not np.isnan(x):
+            self.nobs += 1
+        self.mean, self._old_wt = _ema_step(self.mean, self._old_wt, x, self.alpha)
+        return self.value
+
+
+class RSIState:
+    """RSI 的滚动状态，逐根更新结果与 calculate_rsi 一致
+
+    Attributes:
+        period (int): RSI 周期
+        prev_close (float): 上一根 K 线收盘价
+    """
+
+    def __init__(self, period: int = 14):
+        self.period = period
+        self.prev_close = np.nan
+        self._gain = EMAState(1.0 / period, period)
+        self._loss = EMAState(1.0 / period, period)
+        self._started = False
+
+    @classmethod
+    def from_series(cls, close, period: int = 14) -> "RSIState":
+        """由一段历史收盘价初始化状态，涨跌幅与平滑均值批量计算"""
+        state = cls(period)
+        c = np.asarray(close, dtype=np.float64)
+        if len(c) == 0:
+            return state
+        diff = np.diff(c)
+        up = np.r_[0.0, np.where(diff > 0.0, diff, 0.0)]
+        down = np.r_[0.0, np.where(diff < 0.0, -diff, 0.0)]
+        state._gain = EMAState.from_series(up, 1.0 / period, period)
+        state._loss = EMAState.from_series(down, 1.0 / period, period)
+        state.prev_close = float(c[-1])
+        state._started = True
+        return state
+
+    @property
+    def value(self) -> float:
+        """当前 RSI 值，预热期内为 NaN"""
+        avg_gain, avg_loss = self._gain.value, self._loss.value
+        if avg_loss == 0.0:
+            return 100.0
+        return 100.0 - 100.0 / (1.0 + avg_gain / avg_loss)
+
+    def update(self, close: float) -> float:
+        """加入一根新 K 线收盘价并返回更新后的 RSI"""
+        if self._started:
+            diff = close - self.prev_close
+            up = diff if diff > 0.0 else 0.0
+            down = -diff if diff < 0.0 else 0.0
+        else:
+            up = down = 0.0
+            self._started = True
+        self.prev_close = close
+        self._gain.update(up)
+        self._loss.update(down)
+        return self.value
+
+
+class ATRState:
+    """ATR 的滚动状态，逐根更新结果与 calculate_atr 一致（预热期为 0）
+
+    Attributes:
+        period (int): ATR 周期
+        value (float): 当前 ATR 值
+        prev_close (float): 上一根 K 线收盘价
+    """
+
+    def __init__(self, period: int = 14):
+        self.period = period
+        self.value = 0.0
+        self.prev_close = np.nan
+        self._count = 0
+        self._tr_sum = 0.0
+
+    @classmethod
+    def from_series(cls, high, low, close, period: int = 14) -> "ATRState":
+        """由一段历史 K 线初始化状态，预热期后的 ATR 由批量内核一次算出"""
+        state = cls(period)
+        h = np.asarray(high, dtype=np.float64)
+        lo = np.asarray(low, dtype=np.float64)
+        c = np.asarray(close, dtype=np.float64)
+        if len(c) < period:
+            for hi, l, cl in zip(h, lo, c):
+                state.update(hi, l, cl)
+            return state
+        state.value = float(_atr(h, lo, c, period)[-1])
+        state.prev_close = float(c[-1])
+        state._count = len(c)
+        return state
+
+    def update(self, high: float, low: float, close: float) -> float:
+        """加入一根新 K 线并返回更新后的 ATR"""
+        tr = high - low
+        if self._count > 0:
+            tr = max(tr, abs(high - self.prev_close), abs(low - self.prev_close))
+        self.prev_close = close
+        self._count += 1
+
+        if self._count <= self.period:
+            self._tr_sum += tr
+            if self._count == self.period:
+                self.value = self._tr_sum / self.period
+        else:
+            self.value = (self.value * (self.period - 1) + tr) / self.period
+        return self.value
@@ -10,7 +10,7 @@ main.py - Gold_Quant_Project 项目启动总入口
 
 from data.data_fetcher import YFinanceDataFetcher
 # from data.data_fetcher import MT5DataFetcher  # Windows 实盘环境使用
-from factors.technical_indicators import add_all_indicators
+from factors.technical_indicators import ATRState, RSIState, add_all_indicators
 from backtest.engine import BacktestEngine
 from execution.mt5_trader import MT5Trader
 
@@ -71,6 +71,11 @@ def main():
     # trader = MT5Trader(symbol="XAUUSD")
     # trader.connect()
     # account = trader.get_account_info()
+    # 实盘循环中长期持有指标状态，每根新 K 线 O(1) 更新，无需重算整段历史
+    # rsi_state = RSIState.from_series(df["close"], period=14)
+    # atr_state = ATRState.from_series(df["high"], df["low"], df["close"], period=14)
+    # rsi = rsi_state.update(bar["close"])
+    # atr = atr_state.update(bar["high"], bar["low"], bar["close"])
     # print(f"账户余额: {account['balance']}")
     # result = trader.buy(lot=0.01, sl_points=500, tp_points=1000)
     # positions = trader.get_positions()
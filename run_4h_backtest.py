@@ -6,227 +6,284 @@ run_4h_backtest.py - 4小时K线回测脚本（含详细报告）
 3. 按中期周期分析每笔交易
 4. 输出详细 JSON 报告
 """
+import os
 import sys
-import json
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
 from datetime import datetime, timedelta
-from collections import defaultdict
 
 import numpy as np
 import pandas as pd
 
 sys.path.insert(0, ".")
 
-report = {}
-
-try:
-    # ============================================================
-    # 1. 获取 1H 数据并重采样为 4H
-    # ============================================================
-    from data.data_fetcher import YFinanceDataFetcher
-
-    fetcher = YFinanceDataFetcher(symbol="GC=F")
-
-    # YFinance 1h 数据最多730天，分两段拉取拼接确保覆盖2年
-    print("[1/5] 拉取近2年 1H 数据...")
-    end_date = "2026-02-24"
-    mid_date = "2025-02-24"
-    start_date = "2024-02-24"
-
-    df_p1 = fetcher.fetch_ohlcv(start_date=start_date, end_date=mid_date, interval="1h")
-    df_p2 = fetcher.fetch_ohlcv(start_date=mid_date, end_date=end_date, interval="1h")
-
-    if df_p1 is not None and df_p2 is not None:
-        df_1h = pd.concat([df_p1, df_p2], ignore_index=True)
-        df_1h.drop_duplicates(subset="time", keep="last", inplace=True)
-        df_1h.sort_values("time", inplace=True)
-        df_1h.reset_index(drop=True, inplace=True)
-    elif df_p1 is not None:
-        df_1h = df_p1
-    elif df_p2 is not None:
-        df_1h = df_p2
-    else:
-        raise RuntimeError("数据获取失败")
-
-    print(f"  1H 数据: {len(df_1h)} 条 | {df_1h['time'].iloc[0]} ~ {df_1h['time'].iloc[-1]}")
-
-    # 重采样为 4H
-    print("[2/5] 重采样为 4H K线...")
-    df_1h_indexed = df_1h.set_index("time")
-    df_4h = df_1h_indexed.resample("4h").agg({
-        "open": "first",
-        "high": "max",
-        "low": "min",
-        "close": "last",
-        "volume": "sum",
-    }).dropna().reset_index()
-    df_4h.rename(columns={"time": "time"}, inplace=True)
-
-    fetcher.save_to_csv(df_4h, "gc_futures_4h_2y.csv")
-
-    report["data"] = {
-        "source": "GC=F (COMEX Gold Futures)",
-        "original_bars_1h": len(df_1h),
-        "resampled_bars_4h": len(df_4h),
-        "date_range": f"{df_4h['time'].iloc[0]} ~ {df_4h['time'].iloc[-1]}",
-        "price_range": f"${df_4h['close'].min():.2f} ~ ${df_4h['close'].max():.2f}",
-    }
-    print(f"  4H 数据: {len(df_4h)} 条 | {df_4h['time'].iloc[0]} ~ {df_4h['time'].iloc[-1]}")
-
-    # ============================================================
-    # 2. 计算技术指标
-    # ============================================================
-    print("[3/5] 计算技术指标...")
-    from factors.technical_indicators import add_all_indicators
-    df_4h_ind = add_all_indicators(df_4h)
-
-    # ============================================================
-    # 3. 回测 - 增强均衡型策略（参考之前最优参数，微调适配4H周期）
-    # ============================================================
-    print("[4/5] 运行回测...")
-    import backtrader as bt
+from backtest.report_io import write_json
+
+# 拼接后的 1H 数据以 Parquet 缓存在 data 目录，一天内重复运行直接读取
+_CACHE_1H = "gc_futures_1h_2y.parquet"
+_CACHE_MAX_AGE = 86400
+# 中期周期分析中每个周期包含的交易笔数
+_CYCLE_TRADES = 3
+
+
+def _resample_4h(df_1h: pd.DataFrame) -> pd.DataFrame:
+    """将按时间升序的 1H K 线聚合为 4H K 线（与 resample("4h") 后 dropna 结果一致）
+
+    每根 K 线按时间向下取整到 4 小时边界，相邻边界变化处即为分组起点，
+    再用 ufunc.reduceat 一次性聚合各列；无数据的 4H 区间自然不会出现。
+    """
+    times = df_1h["time"].to_numpy()
+    hours = times.astype("datetime64[h]").astype(np.int64)
+    bins = hours - hours % 4
+    starts = np.flatnonzero(np.r_[True, bins[1:] != bins[:-1]])
+    ends = np.r_[starts[1:], len(bins)] - 1
+
+    return pd.DataFrame({
+        "time": bins[starts].astype("datetime64[h]").astype(times.dtype),
+        "open": df_1h["open"].to_numpy()[starts],
+        "high": np.maximum.reduceat(df_1h["high"].to_numpy(), starts),
+        "low": np.minimum.reduceat(df_1h["low"].to_numpy(), starts),
+        "close": df_1h["close"].to_numpy()[ends],
+        "volume": np.add.reduceat(df_1h["volume"].to_numpy(), starts),
+    })
+
+
+def _run_cfg(cfg: dict, frame) -> dict:
+    """在独立进程中回测单组参数，返回该组的绩效与交易分析
+
+    frame 为主进程 shared_frame() 产出的句柄，4H 数据直接映射自共享内存
+    """
     from backtest.engine import BacktestEngine
+    from backtest.reporting_mixin import trades_frame, with_trade_logging
+    from backtest.shared_frame import attach_frame
     from strategies.enhanced_ma_strategy import EnhancedMAStrategy
 
-    # 自定义 Observer 记录每笔交易详情
-    class TradeCollector(bt.Strategy):
-        """用于收集交易详情的 mixin，需与实际策略搭配使用"""
-        pass
+    # 混入逐笔交易记录：运行期间只记录原始数值，日期换算与取整在回测结束后统一处理
+    eng = BacktestEngine(initial_cash=100000.0, commission=0.001, verbose=False)
+    eng.load_data(df=attach_frame(frame))
+    eng.add_strategy(strategy_class=with_trade_logging(EnhancedMAStrategy), printlog=False, **cfg["params"])
+    strat = eng.run()[0]
+    perf = eng.print_performance()
 
     trade_log = []
+    if strat.trade_rows:
+        tl = trades_frame(strat.trade_rows)
+        trade_log = [
+            {
+                "entry_date": entry,
+                "exit_date": exit_,
+                "direction": "LONG",
+                "size": size,
+                "entry_price": round(price, 2),
+                "exit_price": round(price + pnl / size, 2) if size != 0 else 0,
+                "pnl": round(pnl, 2),
+                "pnlcomm": round(pnlcomm, 2),
+                "duration_bars": barlen,
+            }
+            for entry, exit_, size, price, pnl, pnlcomm, barlen in zip(
+                tl["entry_dt"].dt.strftime("%Y-%m-%d %H:%M"), tl["exit_dt"].dt.strftime("%Y-%m-%d %H:%M"),
+                tl["size"].abs().tolist(), tl["price"].tolist(), tl["pnl"].tolist(),
+                tl["pnlcomm"].tolist(), tl["barlen"].tolist(),
+            )
+        ]
 
-    class ReportingStrategy(EnhancedMAStrategy):
-        """带详细交易记录的增强策略"""
-        def notify_trade(self, trade):
-            super().notify_trade(trade)
-            if trade.isclosed:
-                trade_log.append({
-                    "entry_date": bt.num2date(trade.dtopen).strftime("%Y-%m-%d %H:%M"),
-                    "exit_date": bt.num2date(trade.dtclose).strftime("%Y-%m-%d %H:%M"),
-                    "direction": "LONG",
-                    "size": abs(trade.size),
-                    "entry_price": round(trade.price, 2),
-                    "exit_price": round(trade.price + trade.pnl / abs(trade.size), 2) if trade.size != 0 else 0,
-                    "pnl": round(trade.pnl, 2),
-                    "pnlcomm": round(trade.pnlcomm, 2),
-                    "duration_bars": trade.barlen,
-                })
-
-    # 测试多组参数
-    configs = [
-        {
-            "name": "4H-保守型",
-            "desc": "MA(20/60) RSI>50 SL:2.5xATR 移动止盈:4xATR 风险1%",
-            "params": {"short_period": 20, "long_period": 60, "rsi_upper": 50,
-                       "atr_sl_mult": 2.5, "atr_tp_mult": 4.0, "trail_atr_mult": 2.0,
-                       "risk_pct": 0.01},
-        },
-        {
-            "name": "4H-均衡型",
-            "desc": "MA(15/45) RSI>50 SL:2xATR 移动止盈:3xATR 风险2%",
-            "params": {"short_period": 15, "long_period": 45, "rsi_upper": 50,
-                       "atr_sl_mult": 2.0, "atr_tp_mult": 3.0, "trail_atr_mult": 1.5,
-                       "risk_pct": 0.02},
+    # 按季度分组分析交易
+    quarterly_stats = {}
+    if trade_log:
+        tl = pd.DataFrame(trade_log, columns=["entry_date", "pnlcomm"])
+        won = tl["pnlcomm"] > 0
+        quarter = pd.to_datetime(tl["entry_date"]).dt.to_period("Q").dt.strftime("%Y-Q%q")
+        quarterly_stats = (
+            tl.assign(q=quarter, won=won, lost=~won)
+            .groupby("q")
+            .agg(trades=("pnlcomm", "size"), pnl=("pnlcomm", "sum"),
+                 won=("won", "sum"), lost=("lost", "sum"))
+            .to_dict("index")
+        )
+
+    # 中期周期分析：每 3 笔交易（最后不足 3 笔的余下交易）划为一个周期，
+    # 各周期盈亏由 np.add.reduceat 一次分段求和
+    cycles = []
+    profitable_cycles = 0
+    if trade_log:
+        starts = np.arange(0, len(trade_log), _CYCLE_TRADES)
+        totals = np.add.reduceat(np.array([t["pnlcomm"] for t in trade_log]), starts)
+        profitable_cycles = int(np.count_nonzero(totals > 0))
+        for s, total in zip(starts.tolist(), totals.tolist()):
+            cycle_trades = trade_log[s:s + _CYCLE_TRADES]
+            cycles.append({
+                "start": cycle_trades[0]["entry_date"],
+                "end": cycle_trades[-1]["exit_date"],
+                "num_trades": len(cycle_trades),
+                "total_pnl": round(total, 2),
+                "profitable": total > 0,
+                "trades": [
+                    {"entry": ct["entry_date"], "exit": ct["exit_date"],
+                     "pnl": ct["pnlcomm"], "size": ct["size"],
+                     "entry_price": ct["entry_price"], "exit_price": ct["exit_price"],
+                     "duration": ct["duration_bars"]}
+                    for ct in cycle_trades
+                ],
+            })
+    n_trades = perf.get("total_trades", 0)
+
+    res = {
+        "name": cfg["name"],
+        "description": cfg["desc"],
+        "params": cfg["params"],
+        "performance": {
+            "total_return": round(perf.get("total_return", 0), 2),
+            "sharpe_ratio": round(perf["sharpe_ratio"], 4) if perf.get("sharpe_ratio") else None,
+            "max_drawdown": round(perf.get("max_drawdown", 0), 2),
+            "final_value": round(perf.get("final_value", 0), 2),
+            "total_trades": perf.get("total_trades", 0),
+            "won_trades": perf.get("won_trades", 0),
+            "lost_trades": perf.get("lost_trades", 0),
+            "win_rate": round(perf.get("won_trades", 0) / n_trades * 100, 1) if n_trades else 0.0,
         },
-        {
-            "name": "4H-趋势跟踪",
-            "desc": "MA(12/36) RSI>48 SL:2xATR 移动止盈:3.5xATR 风险2%",
-            "params": {"short_period": 12, "long_period": 36, "rsi_upper": 48,
-                       "atr_sl_mult": 2.0, "atr_tp_mult": 3.5, "trail_atr_mult": 1.5,
-                       "risk_pct": 0.02},
+        "trade_log": trade_log,
+        "quarterly_analysis": quarterly_stats,
+        "cycle_analysis": {
+            "total_cycles": len(cycles),
+            "profitable_cycles": profitable_cycles,
+            "cycle_win_rate": round(profitable_cycles / len(cycles) * 100, 1) if cycles else 0.0,
+            "cycles": cycles,
         },
-    ]
-
-    strategy_results = []
-    all_trade_logs = {}
-
-    for cfg in configs:
-        trade_log = []  # 重置
-
-        eng = BacktestEngine(initial_cash=100000.0, commission=0.001)
-        eng.load_data(df=df_4h)
-        eng.add_strategy(strategy_class=ReportingStrategy, printlog=False, **cfg["params"])
-        eng.run()
-        perf = eng.print_performance()
-
-        # 按季度分组分析交易
-        quarterly_stats = defaultdict(lambda: {"trades": 0, "pnl": 0, "won": 0, "lost": 0})
-        for t in trade_log:
-            q = pd.Timestamp(t["entry_date"]).to_period("Q").strftime("%Y-Q%q")
-            quarterly_stats[q]["trades"] += 1
-            quarterly_stats[q]["pnl"] += t["pnlcomm"]
-            if t["pnlcomm"] > 0:
-                quarterly_stats[q]["won"] += 1
+    }
+    return res
+
+
+def main():
+    report = {}
+
+    try:
+        # ============================================================
+        # 1. 获取 1H 数据并重采样为 4H
+        # ============================================================
+        from data.data_fetcher import YFinanceDataFetcher
+
+        fetcher = YFinanceDataFetcher(symbol="GC=F")
+
+        # YFinance 1h 数据最多730天，分两段拉取拼接确保覆盖2年
+        print("[1/5] 拉取近2年 1H 数据...")
+        end_date = "2026-02-24"
+        mid_date = "2025-02-24"
+        start_date = "2024-02-24"
+
+        df_1h = None
+        cache_path = os.path.join(fetcher.data_dir, _CACHE_1H)
+        if os.path.exists(cache_path) and time.time() - os.path.getmtime(cache_path) <= _CACHE_MAX_AGE:
+            try:
+                df_1h = fetcher.load_from_parquet(_CACHE_1H)
+            except ImportError:
+                pass
+
+        if df_1h is None:
+            df_p1 = fetcher.fetch_ohlcv(start_date=start_date, end_date=mid_date, interval="1h", use_cache=True)
+            df_p2 = fetcher.fetch_ohlcv(start_date=mid_date, end_date=end_date, interval="1h", use_cache=True)
+
+            if df_p1 is not None and df_p2 is not None:
+                # 两段均按时间升序，只保留第一段中早于第二段起点的部分，重叠处以第二段为准
+                cut = np.searchsorted(df_p1["time"].to_numpy(), df_p2["time"].to_numpy()[0])
+                df_1h = pd.concat([df_p1.iloc[:cut], df_p2], ignore_index=True)
+            elif df_p1 is not None:
+                df_1h = df_p1
+            elif df_p2 is not None:
+                df_1h = df_p2
             else:
-                quarterly_stats[q]["lost"] += 1
-
-        # 中期周期分析（以连续盈亏划分 cycle）
-        cycles = []
-        if trade_log:
-            cycle_trades = []
-            cycle_pnl = 0
-            for t in trade_log:
-                cycle_trades.append(t)
-                cycle_pnl += t["pnlcomm"]
-                # 当累计盈利超过一定阈值或交易结束时形成一个周期
-                if len(cycle_trades) >= 3 or t == trade_log[-1]:
-                    cycles.append({
-                        "start": cycle_trades[0]["entry_date"],
-                        "end": cycle_trades[-1]["exit_date"],
-                        "num_trades": len(cycle_trades),
-                        "total_pnl": round(cycle_pnl, 2),
-                        "profitable": cycle_pnl > 0,
-                        "trades": [
-                            {"entry": ct["entry_date"], "exit": ct["exit_date"],
-                             "pnl": ct["pnlcomm"], "size": ct["size"],
-                             "entry_price": ct["entry_price"], "exit_price": ct["exit_price"],
-                             "duration": ct["duration_bars"]}
-                            for ct in cycle_trades
-                        ],
-                    })
-                    cycle_trades = []
-                    cycle_pnl = 0
-
-        profitable_cycles = sum(1 for c in cycles if c["profitable"])
-
-        res = {
-            "name": cfg["name"],
-            "description": cfg["desc"],
-            "params": cfg["params"],
-            "performance": {
-                "total_return": round(perf.get("total_return", 0), 2),
-                "sharpe_ratio": round(perf["sharpe_ratio"], 4) if perf.get("sharpe_ratio") else None,
-                "max_drawdown": round(perf.get("max_drawdown", 0), 2),
-                "final_value": round(perf.get("final_value", 0), 2),
-                "total_trades": perf.get("total_trades", 0),
-                "won_trades": perf.get("won_trades", 0),
-                "lost_trades": perf.get("lost_trades", 0),
-                "win_rate": round(perf.get("won_trades", 0) / max(perf.get("total_trades", 1), 1) * 100, 1),
+                raise RuntimeError("数据获取失败")
+
+            try:
+                fetcher.save_to_parquet(df_1h, _CACHE_1H)
+            except ImportError as e:
+                print(f"  ⚠️ 未安装 Parquet 引擎，跳过 1H 数据缓存: {e}")
+
+        print(f"  1H 数据: {len(df_1h)} 条 | {df_1h['time'].iloc[0]} ~ {df_1h['time'].iloc[-1]}")
+
+        # 重采样为 4H
+        print("[2/5] 重采样为 4H K线...")
+        df_4h = _resample_4h(df_1h)
+
+        fetcher.save_to_csv(df_4h, "gc_futures_4h_2y.csv")
+
+        report["data"] = {
+            "source": "GC=F (COMEX Gold Futures)",
+            "original_bars_1h": len(df_1h),
+            "resampled_bars_4h": len(df_4h),
+            "date_range": f"{df_4h['time'].iloc[0]} ~ {df_4h['time'].iloc[-1]}",
+            "price_range": f"${df_4h['close'].min():.2f} ~ ${df_4h['close'].max():.2f}",
+        }
+        print(f"  4H 数据: {len(df_4h)} 条 | {df_4h['time'].iloc[0]} ~ {df_4h['time'].iloc[-1]}")
+
+        # ============================================================
+        # 2. 计算技术指标
+        # ============================================================
+        print("[3/5] 计算技术指标...")
+        from factors.technical_indicators import add_all_indicators
+        df_4h_ind = add_all_indicators(df_4h)
+
+        # ============================================================
+        # 3. 回测 - 增强均衡型策略（参考之前最优参数，微调适配4H周期）
+        # ============================================================
+        print("[4/5] 运行回测...")
+
+        # 测试多组参数
+        configs = [
+            {
+                "name": "4H-保守型",
+                "desc": "MA(20/60) RSI>50 SL:2.5xATR 移动止盈:4xATR 风险1%",
+                "params": {"short_period": 20, "long_period": 60, "rsi_upper": 50,
+                           "atr_sl_mult": 2.5, "atr_tp_mult": 4.0, "trail_atr_mult": 2.0,
+                           "risk_pct": 0.01},
             },
-            "trade_log": trade_log,
-            "quarterly_analysis": {k: dict(v) for k, v in sorted(quarterly_stats.items())},
-            "cycle_analysis": {
-                "total_cycles": len(cycles),
-                "profitable_cycles": profitable_cycles,
-                "cycle_win_rate": round(profitable_cycles / max(len(cycles), 1) * 100, 1),
-                "cycles": cycles,
+            {
+                "name": "4H-均衡型",
+                "desc": "MA(15/45) RSI>50 SL:2xATR 移动止盈:3xATR 风险2%",
+                "params": {"short_period": 15, "long_period": 45, "rsi_upper": 50,
+                           "atr_sl_mult": 2.0, "atr_tp_mult": 3.0, "trail_atr_mult": 1.5,
+                           "risk_pct": 0.02},
             },
-        }
-        strategy_results.append(res)
+            {
+                "name": "4H-趋势跟踪",
+                "desc": "MA(12/36) RSI>48 SL:2xATR 移动止盈:3.5xATR 风险2%",
+                "params": {"short_period": 12, "long_period": 36, "rsi_upper": 48,
+                           "atr_sl_mult": 2.0, "atr_tp_mult": 3.5, "trail_atr_mult": 1.5,
+                           "risk_pct": 0.02},
+            },
+        ]
 
-    report["strategies"] = strategy_results
-    report["status"] = "success"
+        # 各组参数互不依赖，分发到多个进程并行回测，结果按 configs 顺序汇总；
+        # 4H 数据整理一次后放入共享内存，各进程按句柄映射，不再逐任务 pickle 整表
+        from backtest.engine import BacktestEngine
+        from backtest.shared_frame import shared_frame
 
-    print("[5/5] 报告生成完成")
+        df_bt = BacktestEngine.prepare_data(df_4h)
+        strategy_results = [None] * len(configs)
+        with shared_frame(df_bt) as frame, ProcessPoolExecutor(max_workers=len(configs)) as pool:
+            futures = {pool.submit(_run_cfg, cfg, frame): i for i, cfg in enumerate(configs)}
+            for future in as_completed(futures):
+                res = future.result()
+                strategy_results[futures[future]] = res
+                perf = res["performance"]
+                print(f"  ✅ {res['name']}: 收益 {perf['total_return']}%, "
+                      f"{perf['total_trades']} 笔, 胜率 {perf['win_rate']}%")
 
-except Exception as e:
-    import traceback
-    report["error"] = str(e)
-    report["traceback"] = traceback.format_exc()
+        report["strategies"] = strategy_results
+        report["status"] = "success"
 
-import os
-_output_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), "output")
-os.makedirs(_output_dir, exist_ok=True)
-_output_path = os.path.join(_output_dir, "gold_4h_backtest.json")
-with open(_output_path, "w") as f:
-    json.dump(report, f, indent=2, default=str, ensure_ascii=False)
-print(f"结果已保存至 {_output_path}")
+        print("[5/5] 报告生成完成")
+
+    except Exception as e:
+        import traceback
+        report["error"] = str(e)
+        report["traceback"] = traceback.format_exc()
+
+    _output_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), "output")
+    os.makedirs(_output_dir, exist_ok=True)
+    _output_path = os.path.join(_output_dir, "gold_4h_backtest.json")
+    write_json(report, _output_path)
+    print(f"结果已保存至 {_output_path}")
+
+
+if __name__ == "__main__":
+    main()
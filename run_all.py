@@ -0,0 +1,59 @@
+"""
+run_all.py - 日线回测统一入口
+
+只拉取一次最长日线数据，依次交给以下脚本的 run(df, report) 完成回测并各自写出报告：
+  - run_daily_backtest.py     → output/gold_daily_backtest.json
+  - run_long_backtest.py      → output/gold_long_backtest.json
+  - run_optimized_backtest.py → output/gold_optimized_backtest.json
+
+各脚本仍可单独运行；需要同时跑多份日线回测时用本脚本，免去重复下载与解析。
+"""
+import sys
+import traceback
+
+sys.path.insert(0, ".")
+
+import run_daily_backtest
+import run_long_backtest
+import run_optimized_backtest
+
+RUNNERS = [run_daily_backtest, run_long_backtest, run_optimized_backtest]
+
+
+def main():
+    from data.data_fetcher import YFinanceDataFetcher
+
+    print("[run_all] 获取数据...")
+    fetcher = YFinanceDataFetcher(symbol="GC=F")
+    df = fetcher.fetch_ohlcv(period="max", interval="1d")
+    if df is None or df.empty:
+        print("错误: 数据获取失败")
+        return 1
+    # 与 run_daily_backtest.py 一样落盘，供 run_optimized_v2_backtest.py 等单独运行的脚本读取
+    fetcher.save_to_csv(df, "gc_futures_daily_max.csv")
+    try:
+        fetcher.save_to_parquet(df, "gc_futures_daily_max.parquet")
+    except ImportError as e:
+        print(f"  ⚠️ 未安装 Parquet 引擎，跳过 Parquet 保存: {e}")
+
+    failed = 0
+    for runner in RUNNERS:
+        name = runner.__name__
+        print(f"\n[run_all] ▶ {name}")
+        report = {}
+        try:
+            runner.run(df, report)
+        except Exception as e:
+            failed += 1
+            report["error"] = str(e)
+            report["traceback"] = traceback.format_exc()
+            print(f"错误: {e}")
+            traceback.print_exc()
+        runner.save_report(report)
+
+    print(f"\n[run_all] 完成: {len(RUNNERS) - failed}/{len(RUNNERS)} 个脚本成功")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -5,10 +5,11 @@ run_backtest.py - 真实黄金数据回测脚本
 计算技术指标，并使用双均线策略进行回测。
 """
 import sys
-import json
 
 sys.path.insert(0, ".")
 
+from backtest.report_io import write_json
+
 results = {}
 
 try:
@@ -19,8 +20,8 @@ try:
 
     fetcher = YFinanceDataFetcher(symbol="GC=F")
 
-    # 拉取近2年日K数据
-    df = fetcher.fetch_ohlcv(period="2y", interval="1d")
+    # 拉取近2年日K数据（当日内重复运行直接读取本地 Parquet 缓存）
+    df = fetcher.fetch_ohlcv(period="2y", interval="1d", use_cache=True)
 
     if df is None or df.empty:
         results["error"] = "数据获取失败"
@@ -48,13 +49,19 @@ try:
         # ============================================================
         from backtest.engine import BacktestEngine
 
+        # 时间列只解析一次，后续各次回测共用同一份以时间为索引的数据
+        df_bt = BacktestEngine.prepare_data(df)
+
         engine = BacktestEngine(initial_cash=100000.0, commission=0.001)
-        engine.load_data(df=df)
+        engine.load_data(df=df_bt)
         engine.add_strategy(short_period=10, long_period=30)
         engine.run()
         perf = engine.print_performance()
         results["backtest"] = perf
 
+        # 按 (短周期, 长周期) 记录已完成的回测，相同参数不再重复运行
+        perf_cache = {(10, 30): perf}
+
         # ============================================================
         # 第四阶段：参数敏感性 - 多组均线参数对比
         # ============================================================
@@ -67,18 +74,20 @@ try:
             (15, 45),
         ]
         for short_p, long_p in param_sets:
-            eng = BacktestEngine(initial_cash=100000.0, commission=0.001)
-            eng.load_data(df=df)
-            eng.add_strategy(short_period=short_p, long_period=long_p)
-            eng.run()
-            p = eng.print_performance()
+            p = perf_cache.get((short_p, long_p))
+            if p is None:
+                eng = BacktestEngine(initial_cash=100000.0, commission=0.001)
+                eng.load_data(df=df_bt)
+                eng.add_strategy(short_period=short_p, long_period=long_p)
+                eng.run()
+                p = perf_cache[(short_p, long_p)] = eng.print_performance()
             param_results.append({
                 "params": f"MA({short_p}/{long_p})",
                 "return": round(p.get("total_return", 0), 2),
                 "sharpe": round(p["sharpe_ratio"], 4) if p.get("sharpe_ratio") else None,
                 "max_dd": round(p.get("max_drawdown", 0), 2),
                 "trades": p.get("total_trades", 0),
-                "win_rate": round(p.get("won_trades", 0) / max(p.get("total_trades", 1), 1) * 100, 1),
+                "win_rate": round(p.get("won_trades", 0) / p["total_trades"] * 100, 1) if p.get("total_trades") else 0.0,
                 "final": round(p.get("final_value", 0), 2),
             })
         results["param_comparison"] = param_results
@@ -94,5 +103,5 @@ except Exception as e:
 import os
 _output_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), "output")
 os.makedirs(_output_dir, exist_ok=True)
-with open(os.path.join(_output_dir, "gold_backtest_result.json"), "w") as f:
-    json.dump(results, f, indent=2, default=str, ensure_ascii=False)
+_output_path = os.path.join(_output_dir, "gold_backtest_result.json")
+write_json(results, _output_path)
@@ -4,32 +4,221 @@ run_daily_backtest.py - 日线级别完整回测
 使用最长可用日线数据，全面测试波段策略。
 输出详细逐笔交易报告 + 年度分析 + 中期周期分析。
 """
+import argparse
+import os
 import sys
-import json
-from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
 
+import numpy as np
 import pandas as pd
-import backtrader as bt
 
 sys.path.insert(0, ".")
 
-report = {}
+from backtest.report_io import round_report, write_json, write_trades_jsonl
+
 INITIAL_CASH = 100000.0
+_OUTPUT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "output")
+_TRADES_PREFIX = "daily"
+_TRADE_COLUMNS = ["entry_date", "exit_date", "size", "entry_price", "exit_price",
+                  "pnl", "pnlcomm", "duration_bars", "duration_days"]
+# 汇总各数值字段保留的小数位数：结果先按原始数值组装，最后由 round_report 统一取整
+_REPORT_DIGITS = {
+    "performance": {"total_return": 2, "sharpe_ratio": 4, "max_drawdown": 2, "final_value": 2, "win_rate": 1},
+    "holding": {"avg_all": 1, "avg_winners": 1, "avg_losers": 1},
+    "risk": {"avg_win": 2, "avg_loss": 2, "profit_factor": 2, "max_win": 2, "max_loss": 2},
+    "cycle_summary": {"rate": 1},
+}
 
-try:
-    # ============================================================
-    # 1. 获取最长日线数据
-    # ============================================================
-    from data.data_fetcher import YFinanceDataFetcher
+
+def _run_cfg(cfg: dict, frame) -> dict:
+    """在独立进程中回测单组参数，返回该组的绩效与交易分析；逐笔记录写入单独的 jsonl 文件
+
+    frame 为主进程 shared_frame() 产出的句柄，回测数据直接映射自共享内存
+    """
+    from backtest.engine import BacktestEngine
+    from backtest.shared_frame import attach_frame
+    from backtest.trade_stats import max_consecutive_losses, trade_averages, yearly_totals
+    from strategies.swing_strategy import SwingStrategy
+
+    # SwingStrategy 由编译内核回测（fast 模式），撮合与绩效口径与 Cerebro 一致
+    df = attach_frame(frame)
+    params = cfg["params"]
+    eng = BacktestEngine(initial_cash=INITIAL_CASH, commission=0.001, verbose=False)
+    eng.load_data(df=df, sma_periods=(params["short_period"], params["long_period"]))
+    eng.add_strategy(strategy_class=SwingStrategy, **params)
+    eng.run(fast=True)
+    perf = eng.print_performance()
+
+    # 成交数组中的 K 线下标换算为日期，逐笔记录按列直接组成 DataFrame；
+    # 以下统计均为列运算，逐笔 dict 只在写出报告时生成
+    ft = eng.fast_result["trades"]
+    dates = BacktestEngine.prepare_data(df).index
+    entry_idx = ft["entry_idx"].to_numpy(dtype=np.int64)
+    exit_idx = ft["exit_idx"].to_numpy(dtype=np.int64)
+    entry_dt = dates[entry_idx]
+    exit_dt = dates[exit_idx]
+    tdf = pd.DataFrame({
+        "entry_date": entry_dt.strftime("%Y-%m-%d"),
+        "exit_date": exit_dt.strftime("%Y-%m-%d"),
+        "size": ft["size"].to_numpy(dtype=np.int64),
+        "entry_price": [round(v, 2) for v in ft["entry_price"].tolist()],
+        "exit_price": [round(v, 2) for v in ft["exit_price"].tolist()],
+        "pnl": [round(v, 2) for v in ft["pnl"].tolist()],
+        "pnlcomm": [round(v, 2) for v in ft["pnlcomm"].tolist()],
+        "duration_bars": exit_idx - entry_idx,
+        "duration_days": (exit_dt - entry_dt).days,
+    }, columns=_TRADE_COLUMNS)
+    pnl = tdf["pnlcomm"]
+    days = tdf["duration_days"]
+    win = pnl > 0
+    n_all = len(tdf)
+
+    # 各项均值（没有交易的分组记为 0）
+    avg_hold, avg_hold_win, avg_hold_loss, avg_pnl_win, avg_pnl_loss = trade_averages(pnl, days, win)
+    max_single_win = float(pnl.max()) if n_all else 0
+    max_single_loss = float(pnl.min()) if n_all else 0
+
+    # 连续亏损统计
+    max_consec_loss = max_consecutive_losses(win.to_numpy())
+
+    # 盈亏状态每变化一次开启一段新的连续区间（用于中期周期划分）
+    run_id = (win != win.shift()).cumsum()
+
+    # 年度分析：年份直接取自开仓时间（整数，不切分日期字符串），由 yearly_totals 一次汇总
+    yearly = {
+        str(y): {"trades": int(c), "pnl": round(float(v), 2), "won": int(w), "lost": int(c - w)}
+        for y, c, v, w in zip(*yearly_totals(entry_dt.year.to_numpy(), pnl.to_numpy(), win.to_numpy()))
+    }
+
+    # 中期周期：按连续盈/亏 划分
+    cycles = []
+    for r in tdf.groupby(run_id).agg(
+        start=("entry_date", "first"), end=("exit_date", "last"),
+        num_trades=("pnlcomm", "size"), total_pnl=("pnlcomm", "sum"),
+    ).itertuples():
+        profitable = bool(r.total_pnl > 0)
+        cycles.append({
+            "start": r.start,
+            "end": r.end,
+            "num_trades": int(r.num_trades),
+            "total_pnl": round(float(r.total_pnl), 2),
+            "profitable": profitable,
+            "type": "盈利周期" if profitable else "亏损周期",
+        })
+
+    profitable_cycles = sum(1 for c in cycles if c["profitable"])
+    n_trades = perf.get("total_trades", 0)
+
+    res = {
+        "name": cfg["name"],
+        "performance": {
+            "total_return": perf.get("total_return", 0),
+            "sharpe_ratio": perf.get("sharpe_ratio") or None,
+            "max_drawdown": perf.get("max_drawdown", 0),
+            "final_value": perf.get("final_value", 0),
+            "total_trades": perf.get("total_trades", 0),
+            "won_trades": perf.get("won_trades", 0),
+            "lost_trades": perf.get("lost_trades", 0),
+            "win_rate": perf.get("won_trades", 0) / n_trades * 100 if n_trades else 0.0,
+        },
+        "holding": {
+            "avg_all": avg_hold,
+            "avg_winners": avg_hold_win,
+            "avg_losers": avg_hold_loss,
+        },
+        "risk": {
+            "avg_win": avg_pnl_win,
+            "avg_loss": avg_pnl_loss,
+            "profit_factor": abs(avg_pnl_win / avg_pnl_loss) if avg_pnl_loss != 0 else None,
+            "max_win": max_single_win,
+            "max_loss": max_single_loss,
+            "max_consec_loss": max_consec_loss,
+        },
+        "yearly": yearly,
+        "cycles": cycles,
+        "cycle_summary": {
+            "total": len(cycles),
+            "profitable": profitable_cycles,
+            "rate": profitable_cycles / len(cycles) * 100 if cycles else 0.0,
+        },
+        "trades": write_trades_jsonl(tdf, _TRADE_COLUMNS, _OUTPUT_DIR, _TRADES_PREFIX, cfg["name"]),
+    }
+    return round_report(res, _REPORT_DIGITS)
+
+
+def optuna_search(df_bt: pd.DataFrame, configs: list, n_trials: int) -> dict:
+    """用 Optuna（TPE 贝叶斯优化）在 SwingStrategy 参数空间内搜索夏普比率最高的组合
+
+    configs 中的手工参数组先作为种子试验入队，其余试验由 TPE 采样；
+    每次试验都用编译内核（fast 模式）回测，不经过 Cerebro。optuna 为可选依赖，未安装时抛出 ImportError。
+
+    Args:
+        df_bt: 已整理好的回测数据（BacktestEngine.prepare_data / add_sma_columns 的结果）
+        configs: 手工参数组，作为种子试验
+        n_trials: 试验总次数（含种子试验）
+
+    Returns:
+        dict: 最优参数及其绩效，以及按夏普排序的前 5 次试验
+    """
+    import optuna
     from backtest.engine import BacktestEngine
     from strategies.swing_strategy import SwingStrategy
 
-    print("[1/3] 获取数据...")
-    fetcher = YFinanceDataFetcher(symbol="GC=F")
-    df = fetcher.fetch_ohlcv(period="max", interval="1d")
-    if df is None or df.empty:
-        raise RuntimeError("数据获取失败")
-    fetcher.save_to_csv(df, "gc_futures_daily_max.csv")
+    optuna.logging.set_verbosity(optuna.logging.WARNING)
+
+    def objective(trial):
+        params = {
+            "short_period": trial.suggest_int("short_period", 20, 80),
+            "long_period": trial.suggest_int("long_period", 60, 250),
+            "adx_threshold": trial.suggest_int("adx_threshold", 15, 25),
+            "atr_sl_mult": trial.suggest_float("atr_sl_mult", 2.0, 6.0),
+            "atr_tp_mult": trial.suggest_float("atr_tp_mult", 4.0, 10.0),
+            "trail_atr_mult": trial.suggest_float("trail_atr_mult", 2.0, 6.0),
+            "rsi_upper": trial.suggest_int("rsi_upper", 35, 55),
+            "reentry_cooldown": trial.suggest_int("reentry_cooldown", 5, 30),
+            "risk_pct": 0.02,
+        }
+        # 短均线必须快于长均线，否则该组合无意义
+        if params["short_period"] >= params["long_period"]:
+            raise optuna.TrialPruned()
+
+        eng = BacktestEngine(initial_cash=INITIAL_CASH, commission=0.001, verbose=False)
+        eng.load_data(df=df_bt)
+        eng.add_strategy(strategy_class=SwingStrategy, **params)
+        eng.run(fast=True)
+        perf = eng.print_performance()
+        trial.set_user_attr("total_return", round(perf.get("total_return", 0), 2))
+        trial.set_user_attr("max_drawdown", round(perf.get("max_drawdown", 0), 2))
+        trial.set_user_attr("total_trades", perf.get("total_trades", 0))
+        # 无交易或净值不变时夏普比率为空，不参与比较
+        if not perf.get("sharpe_ratio"):
+            raise optuna.TrialPruned()
+        return perf["sharpe_ratio"]
+
+    study = optuna.create_study(direction="maximize", sampler=optuna.samplers.TPESampler(seed=42))
+    for cfg in configs:
+        study.enqueue_trial({k: v for k, v in cfg["params"].items() if k != "risk_pct"})
+    study.optimize(objective, n_trials=n_trials)
+
+    done = [t for t in study.trials if t.state == optuna.trial.TrialState.COMPLETE]
+    if not done:
+        return {"n_trials": len(study.trials), "best": None, "top": []}
+    top = sorted(done, key=lambda t: t.value, reverse=True)[:5]
+    return {
+        "n_trials": len(study.trials),
+        "best": {"params": study.best_params, "sharpe_ratio": round(study.best_value, 4),
+                 **study.best_trial.user_attrs},
+        "top": [{"number": t.number, "params": t.params, "sharpe_ratio": round(t.value, 4),
+                 **t.user_attrs} for t in top],
+    }
+
+
+def run(df: pd.DataFrame, report: dict, optuna_trials: int = 0) -> dict:
+    """在给定的日线数据上回测全部参数组，数据摘要与各组结果写入 report 并返回
+
+    由 main() 获取数据后调用；run_all.py 也会把同一份数据直接传进来，免去重复下载。
+    optuna_trials > 0 时，在手工参数组之后再做一次 Optuna 参数搜索（见 optuna_search），结果写入 report["optuna"]。
+    """
     print(f"  日线: {len(df)} 条 | {df['time'].iloc[0]} ~ {df['time'].iloc[-1]}")
     print(f"  价格: ${df['close'].min():.2f} ~ ${df['close'].max():.2f}")
 
@@ -85,159 +274,94 @@ try:
     # ============================================================
     print("[2/3] 运行回测...")
 
-    trade_log_global = []
-
-    class ReportingSwing(SwingStrategy):
-        def notify_trade(self, trade):
-            super().notify_trade(trade)
-            if trade.isclosed:
-                entry_dt = bt.num2date(trade.dtopen)
-                exit_dt = bt.num2date(trade.dtclose)
-                duration_days = (exit_dt - entry_dt).days
-                trade_log_global.append({
-                    "entry_date": entry_dt.strftime("%Y-%m-%d"),
-                    "exit_date": exit_dt.strftime("%Y-%m-%d"),
-                    "size": abs(trade.size),
-                    "entry_price": round(trade.price, 2),
-                    "exit_price": round(trade.price + trade.pnl / abs(trade.size), 2) if trade.size != 0 else 0,
-                    "pnl": round(trade.pnl, 2),
-                    "pnlcomm": round(trade.pnlcomm, 2),
-                    "duration_bars": trade.barlen,
-                    "duration_days": duration_days,
-                })
+    # 各组参数互不依赖，分发到多个进程并行回测，结果按 configs 顺序汇总；
+    # 数据只在主进程整理一次（时间索引、小写列名），各组用到的均线也在这里每个周期只算一次，
+    # 整理好的数据放入共享内存，各进程按句柄映射后 load_data 直接使用，不再逐任务 pickle 整表
+    from backtest.engine import BacktestEngine
+    from backtest.shared_frame import shared_frame
 
+    df_bt = BacktestEngine.add_sma_columns(
+        BacktestEngine.prepare_data(df),
+        [c["params"][k] for c in configs for k in ("short_period", "long_period")],
+    )
+    # 逐笔记录由各进程直接写入 output/ 下的 jsonl 文件，主报告只保留条数与文件名
+    os.makedirs(_OUTPUT_DIR, exist_ok=True)
     all_results = []
+    with shared_frame(df_bt) as frame, ProcessPoolExecutor(max_workers=len(configs)) as pool:
+        for res in pool.map(_run_cfg, configs, [frame] * len(configs)):
+            all_results.append(res)
+            print(f"  ✅ {res['name']}: 收益{res['performance']['total_return']}%, "
+                  f"{res['trades']['count']}笔, 均持{res['holding']['avg_all']:.0f}天, "
+                  f"胜率{res['performance']['win_rate']}%")
 
-    for cfg in configs:
-        trade_log_global = []
-
-        eng = BacktestEngine(initial_cash=INITIAL_CASH, commission=0.001)
-        eng.load_data(df=df)
-        eng.add_strategy(strategy_class=ReportingSwing, printlog=False, **cfg["params"])
-        eng.run()
-        perf = eng.print_performance()
+    report["strategies"] = all_results
 
-        trades = trade_log_global.copy()
-        won = [t for t in trades if t["pnlcomm"] > 0]
-        lost = [t for t in trades if t["pnlcomm"] <= 0]
-
-        avg_hold = sum(t["duration_days"] for t in trades) / max(len(trades), 1)
-        avg_hold_win = sum(t["duration_days"] for t in won) / max(len(won), 1)
-        avg_hold_loss = sum(t["duration_days"] for t in lost) / max(len(lost), 1)
-        avg_pnl_win = sum(t["pnlcomm"] for t in won) / max(len(won), 1)
-        avg_pnl_loss = sum(t["pnlcomm"] for t in lost) / max(len(lost), 1)
-        total_pnl = sum(t["pnlcomm"] for t in trades)
-        max_single_win = max((t["pnlcomm"] for t in trades), default=0)
-        max_single_loss = min((t["pnlcomm"] for t in trades), default=0)
-
-        # 连续亏损统计
-        max_consec_loss = 0
-        cur_consec = 0
-        for t in trades:
-            if t["pnlcomm"] <= 0:
-                cur_consec += 1
-                max_consec_loss = max(max_consec_loss, cur_consec)
-            else:
-                cur_consec = 0
-
-        # 年度分析
-        yearly = defaultdict(lambda: {"trades": 0, "pnl": 0.0, "won": 0, "lost": 0})
-        for t in trades:
-            y = t["entry_date"][:4]
-            yearly[y]["trades"] += 1
-            yearly[y]["pnl"] += t["pnlcomm"]
-            if t["pnlcomm"] > 0:
-                yearly[y]["won"] += 1
-            else:
-                yearly[y]["lost"] += 1
-
-        # 中期周期：按连续盈/亏 划分
-        cycles = []
-        if trades:
-            cycle_trades = [trades[0]]
-            for t in trades[1:]:
-                prev_positive = cycle_trades[-1]["pnlcomm"] > 0
-                cur_positive = t["pnlcomm"] > 0
-                if cur_positive == prev_positive:
-                    cycle_trades.append(t)
-                else:
-                    cpnl = sum(ct["pnlcomm"] for ct in cycle_trades)
-                    cycles.append({
-                        "start": cycle_trades[0]["entry_date"],
-                        "end": cycle_trades[-1]["exit_date"],
-                        "num_trades": len(cycle_trades),
-                        "total_pnl": round(cpnl, 2),
-                        "profitable": cpnl > 0,
-                        "type": "盈利周期" if cpnl > 0 else "亏损周期",
-                    })
-                    cycle_trades = [t]
-            # 最后一组
-            cpnl = sum(ct["pnlcomm"] for ct in cycle_trades)
-            cycles.append({
-                "start": cycle_trades[0]["entry_date"],
-                "end": cycle_trades[-1]["exit_date"],
-                "num_trades": len(cycle_trades),
-                "total_pnl": round(cpnl, 2),
-                "profitable": cpnl > 0,
-                "type": "盈利周期" if cpnl > 0 else "亏损周期",
-            })
-
-        profitable_cycles = sum(1 for c in cycles if c["profitable"])
-
-        res = {
-            "name": cfg["name"],
-            "performance": {
-                "total_return": round(perf.get("total_return", 0), 2),
-                "sharpe_ratio": round(perf["sharpe_ratio"], 4) if perf.get("sharpe_ratio") else None,
-                "max_drawdown": round(perf.get("max_drawdown", 0), 2),
-                "final_value": round(perf.get("final_value", 0), 2),
-                "total_trades": perf.get("total_trades", 0),
-                "won_trades": perf.get("won_trades", 0),
-                "lost_trades": perf.get("lost_trades", 0),
-                "win_rate": round(perf.get("won_trades", 0) / max(perf.get("total_trades", 1), 1) * 100, 1),
-            },
-            "holding": {
-                "avg_all": round(avg_hold, 1),
-                "avg_winners": round(avg_hold_win, 1),
-                "avg_losers": round(avg_hold_loss, 1),
-            },
-            "risk": {
-                "avg_win": round(avg_pnl_win, 2),
-                "avg_loss": round(avg_pnl_loss, 2),
-                "profit_factor": round(abs(avg_pnl_win / avg_pnl_loss), 2) if avg_pnl_loss != 0 else None,
-                "max_win": round(max_single_win, 2),
-                "max_loss": round(max_single_loss, 2),
-                "max_consec_loss": max_consec_loss,
-            },
-            "yearly": {k: {kk: round(vv, 2) if isinstance(vv, float) else vv
-                           for kk, vv in v.items()} for k, v in sorted(yearly.items())},
-            "cycles": cycles,
-            "cycle_summary": {
-                "total": len(cycles),
-                "profitable": profitable_cycles,
-                "rate": round(profitable_cycles / max(len(cycles), 1) * 100, 1),
-            },
-            "trades": trades,
-        }
-        all_results.append(res)
-        print(f"  ✅ {cfg['name']}: 收益{res['performance']['total_return']}%, "
-              f"{len(trades)}笔, 均持{avg_hold:.0f}天, 胜率{res['performance']['win_rate']}%")
+    if optuna_trials > 0:
+        print(f"  Optuna 参数搜索: {optuna_trials} 次试验...")
+        try:
+            report["optuna"] = optuna_search(df_bt, configs, optuna_trials)
+        except ImportError as e:
+            print(f"  ⚠️ 未安装 optuna，跳过参数搜索: {e}")
+        else:
+            best = report["optuna"]["best"]
+            if best:
+                print(f"  ✅ 最优夏普 {best['sharpe_ratio']}: {best['params']}")
 
-    report["strategies"] = all_results
     report["status"] = "success"
     print("[3/3] 完成")
+    return report
 
-except Exception as e:
-    import traceback
-    report["error"] = str(e)
-    report["traceback"] = traceback.format_exc()
-    print(f"错误: {e}")
-    traceback.print_exc()
 
-import os
-_output_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), "output")
-os.makedirs(_output_dir, exist_ok=True)
-_output_path = os.path.join(_output_dir, "gold_daily_backtest.json")
-with open(_output_path, "w") as f:
-    json.dump(report, f, indent=2, default=str, ensure_ascii=False)
-print(f"结果已保存至 {_output_path}")
+def save_report(report: dict) -> str:
+    """把报告写入 output/gold_daily_backtest.json，返回文件路径"""
+    os.makedirs(_OUTPUT_DIR, exist_ok=True)
+    _output_path = os.path.join(_OUTPUT_DIR, "gold_daily_backtest.json")
+    write_json(report, _output_path)
+    print(f"结果已保存至 {_output_path}")
+    return _output_path
+
+
+def main():
+    parser = argparse.ArgumentParser(description="日线级别完整回测")
+    parser.add_argument(
+        "--optuna",
+        type=int,
+        default=0,
+        metavar="N",
+        help="手工参数组之外，再用 Optuna 搜索 N 次参数（需安装 optuna，默认: 0 不搜索）",
+    )
+    args = parser.parse_args()
+
+    report = {}
+
+    try:
+        # ============================================================
+        # 1. 获取最长日线数据
+        # ============================================================
+        from data.data_fetcher import YFinanceDataFetcher
+
+        print("[1/3] 获取数据...")
+        fetcher = YFinanceDataFetcher(symbol="GC=F")
+        df = fetcher.fetch_ohlcv(period="max", interval="1d")
+        if df is None or df.empty:
+            raise RuntimeError("数据获取失败")
+        fetcher.save_to_csv(df, "gc_futures_daily_max.csv")
+        # 同时保存 Parquet，供 run_optimized_backtest.py 等脚本直接加载（免去 CSV 解析）
+        try:
+            fetcher.save_to_parquet(df, "gc_futures_daily_max.parquet")
+        except ImportError as e:
+            print(f"  ⚠️ 未安装 Parquet 引擎，跳过 Parquet 保存: {e}")
+        run(df, report, optuna_trials=args.optuna)
+
+    except Exception as e:
+        import traceback
+        report["error"] = str(e)
+        report["traceback"] = traceback.format_exc()
+        print(f"错误: {e}")
+        traceback.print_exc()
+
+    save_report(report)
+
+
+if __name__ == "__main__":
+    main()
@@ -4,30 +4,38 @@ run_long_backtest.py - 长周期回测对比脚本
 获取最长可用历史数据，对比基础双均线策略 vs 增强版策略的表现。
 输出结果到 JSON 文件。
 """
+import os
 import sys
 import json
 
-sys.path.insert(0, ".")
-
-results = {}
+import pandas as pd
 
-try:
-    # ============================================================
-    # 1. 获取长周期数据
-    # ============================================================
-    from data.data_fetcher import YFinanceDataFetcher
+sys.path.insert(0, ".")
 
-    fetcher = YFinanceDataFetcher(symbol="GC=F")
 
-    # 拉取最长可用数据（日K）
-    df = fetcher.fetch_ohlcv(period="max", interval="1d")
+def _summary(cfg: dict, p: dict) -> dict:
+    """把一组增强策略参数的绩效整理为报告中的摘要"""
+    params = {k: v for k, v in cfg.items() if k != "name"}
+    return {
+        "name": cfg["name"],
+        "params": f"MA({params['short_period']}/{params['long_period']}) RSI>{params['rsi_upper']} "
+                  f"SL:{params['atr_sl_mult']}ATR TP:{params['atr_tp_mult']}ATR Risk:{params['risk_pct']*100}%",
+        "return": round(p.get("total_return", 0), 2),
+        "sharpe": round(p["sharpe_ratio"], 4) if p.get("sharpe_ratio") else None,
+        "max_dd": round(p.get("max_drawdown", 0), 2),
+        "trades": p.get("total_trades", 0),
+        "won": p.get("won_trades", 0),
+        "lost": p.get("lost_trades", 0),
+        "win_rate": round(p.get("won_trades", 0) / max(p.get("total_trades", 1), 1) * 100, 1),
+        "final": round(p.get("final_value", 0), 2),
+    }
 
-    if df is None or df.empty:
-        results["error"] = "数据获取失败"
-        raise RuntimeError("No data")
 
-    fetcher.save_to_csv(df, "gc_futures_max.csv")
+def run(df: pd.DataFrame, results: dict) -> dict:
+    """在给定的日线数据上对比基础策略与各组增强策略，数据摘要与结果写入 results 并返回
 
+    由 main() 获取数据后调用；run_all.py 也会把同一份数据直接传进来，免去重复下载。
+    """
     results["data"] = {
         "rows": len(df),
         "date_range": f"{df['time'].iloc[0]} ~ {df['time'].iloc[-1]}",
@@ -36,22 +44,12 @@ try:
 
     # ============================================================
     # 2. 基础双均线策略回测（最优参数 MA 15/45）
+    # 3. 增强策略回测 — 多组参数
     # ============================================================
     from backtest.engine import BacktestEngine
     from strategies.dual_ma_strategy import DualMAStrategy
     from strategies.enhanced_ma_strategy import EnhancedMAStrategy
 
-    # --- 基础策略 ---
-    engine_basic = BacktestEngine(initial_cash=100000.0, commission=0.001)
-    engine_basic.load_data(df=df)
-    engine_basic.add_strategy(strategy_class=DualMAStrategy, short_period=15, long_period=45)
-    engine_basic.run()
-    perf_basic = engine_basic.print_performance()
-    results["basic_strategy"] = perf_basic
-
-    # ============================================================
-    # 3. 增强策略回测 — 多组参数
-    # ============================================================
     enhanced_configs = [
         {"name": "增强-保守型", "short_period": 15, "long_period": 45,
          "rsi_upper": 50, "atr_sl_mult": 2.5, "atr_tp_mult": 4.0,
@@ -67,38 +65,80 @@ try:
          "trail_atr_mult": 1.5, "risk_pct": 0.02},
     ]
 
+    # 数据只整理一次（时间索引、小写列名），各策略用到的均线也在这里每个周期只算一次
+    df_bt = BacktestEngine.add_sma_columns(
+        BacktestEngine.prepare_data(df),
+        [15, 45] + [cfg[k] for cfg in enhanced_configs for k in ("short_period", "long_period")],
+    )
+
+    # --- 基础策略 ---
+    engine_basic = BacktestEngine(initial_cash=100000.0, commission=0.001)
+    engine_basic.load_data(df=df_bt, sma_periods=(15, 45))
+    engine_basic.add_strategy(strategy_class=DualMAStrategy, short_period=15, long_period=45)
+    engine_basic.run()
+    perf_basic = engine_basic.print_performance()
+    results["basic_strategy"] = perf_basic
+
+    # --- 增强策略 ---
+    # EnhancedMAStrategy 由编译内核回测（fast 模式），撮合与绩效口径与 Cerebro 一致，
+    # 报告只用到绩效摘要，各组依次运行即可
     enhanced_results = []
     for cfg in enhanced_configs:
-        name = cfg.pop("name")
-        eng = BacktestEngine(initial_cash=100000.0, commission=0.001)
-        eng.load_data(df=df)
-        eng.add_strategy(strategy_class=EnhancedMAStrategy, printlog=False, **cfg)
-        eng.run()
-        p = eng.print_performance()
-        enhanced_results.append({
-            "name": name,
-            "params": f"MA({cfg['short_period']}/{cfg['long_period']}) RSI>{cfg['rsi_upper']} "
-                      f"SL:{cfg['atr_sl_mult']}ATR TP:{cfg['atr_tp_mult']}ATR Risk:{cfg['risk_pct']*100}%",
-            "return": round(p.get("total_return", 0), 2),
-            "sharpe": round(p["sharpe_ratio"], 4) if p.get("sharpe_ratio") else None,
-            "max_dd": round(p.get("max_drawdown", 0), 2),
-            "trades": p.get("total_trades", 0),
-            "won": p.get("won_trades", 0),
-            "lost": p.get("lost_trades", 0),
-            "win_rate": round(p.get("won_trades", 0) / max(p.get("total_trades", 1), 1) * 100, 1),
-            "final": round(p.get("final_value", 0), 2),
-        })
+        engine_enhanced = BacktestEngine(initial_cash=100000.0, commission=0.001, verbose=False)
+        engine_enhanced.load_data(df=df_bt)
+        engine_enhanced.add_strategy(
+            strategy_class=EnhancedMAStrategy, **{k: v for k, v in cfg.items() if k != "name"})
+        engine_enhanced.run(fast=True)
+        enhanced_results.append(_summary(cfg, engine_enhanced.print_performance()))
 
     results["enhanced_strategies"] = enhanced_results
     results["status"] = "success"
+    return results
 
-except Exception as e:
-    import traceback
-    results["error"] = str(e)
-    results["traceback"] = traceback.format_exc()
 
-import os
-_output_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), "output")
-os.makedirs(_output_dir, exist_ok=True)
-with open(os.path.join(_output_dir, "gold_long_backtest.json"), "w") as f:
-    json.dump(results, f, indent=2, default=str, ensure_ascii=False)
+def save_report(results: dict) -> str:
+    """把结果写入 output/gold_long_backtest.json，返回文件路径"""
+    _output_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), "output")
+    os.makedirs(_output_dir, exist_ok=True)
+    _output_path = os.path.join(_output_dir, "gold_long_backtest.json")
+    with open(_output_path, "w") as f:
+        json.dump(results, f, indent=2, default=str, ensure_ascii=False)
+    return _output_path
+
+
+def main():
+    results = {}
+
+    try:
+        # ============================================================
+        # 1. 获取长周期数据
+        # ============================================================
+        from data.data_fetcher import YFinanceDataFetcher
+
+        fetcher = YFinanceDataFetcher(symbol="GC=F")
+
+        # 拉取最长可用数据（日K）
+        df = fetcher.fetch_ohlcv(period="max", interval="1d")
+
+        if df is None or df.empty:
+            results["error"] = "数据获取失败"
+            raise RuntimeError("No data")
+
+        fetcher.save_to_csv(df, "gc_futures_max.csv")
+        try:
+            fetcher.save_to_parquet(df, "gc_futures_max.parquet")
+        except ImportError as e:
+            print(f"  ⚠️ 未安装 Parquet 引擎，跳过 Parquet 保存: {e}")
+
+        run(df, results)
+
+    except Exception as e:
+        import traceback
+        results["error"] = str(e)
+        results["traceback"] = traceback.format_exc()
+
+    save_report(results)
+
+
+if __name__ == "__main__":
+    main()
@@ -3,28 +3,129 @@ run_optimized_backtest.py - 优化版波段策略回测
 
 对比优化前后在25年日线数据上的表现。
 """
+import os
 import sys
-import json
-from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
 
+import numpy as np
 import pandas as pd
-import backtrader as bt
 
 sys.path.insert(0, ".")
 
-report = {}
+from backtest.report_io import round_report, write_json, write_trades_jsonl
+
 INITIAL_CASH = 100000.0
+_OUTPUT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "output")
+_TRADES_PREFIX = "optimized"
+_TRADE_COLUMNS = ["entry", "exit", "dir", "size", "price", "pnl", "pnlcomm", "bars", "days"]
+# 汇总各数值字段保留的小数位数：结果先按原始数值组装，最后由 round_report 统一取整
+_REPORT_DIGITS = {
+    "perf": {"ret": 2, "sharpe": 4, "mdd": 2, "final": 2, "wr": 1},
+    "hold": {"avg": 1, "avg_win": 1, "avg_loss": 1},
+    "risk": {"avg_win": 2, "avg_loss": 2, "pf": 2, "max_win": 2, "max_loss": 2},
+    "direction": {"long_pnl": 2, "short_pnl": 2},
+}
+
+
+def _run_cfg(cfg: dict, frame) -> dict:
+    """在独立进程中回测单组参数，返回该组的绩效与交易分析；逐笔记录写入单独的 jsonl 文件
 
-try:
-    from data.data_fetcher import YFinanceDataFetcher
+    frame 为主进程 shared_frame() 产出的句柄，回测数据直接映射自共享内存
+    """
     from backtest.engine import BacktestEngine
+    from backtest.reporting_mixin import trades_frame, with_trade_logging
+    from backtest.trade_stats import max_consecutive_losses, trade_averages, yearly_totals
+    from backtest.shared_frame import attach_frame
+
+    # 混入逐笔交易记录；回测结束后从 run() 返回的策略实例中取出
+    cls = with_trade_logging(cfg["strategy_class"])
+
+    df = attach_frame(frame)
+    eng = BacktestEngine(initial_cash=INITIAL_CASH, commission=0.001, verbose=False)
+    params = cfg["params"]
+    eng.load_data(df=df, sma_periods=(params["short_period"], params["long_period"]))
+    eng.add_strategy(strategy_class=cls, printlog=False, **params)
+    strat = eng.run()[0]
+    perf = eng.print_performance()
+
+    # 开/平仓时间一次性换算并格式化，逐笔记录按列直接组成 DataFrame；
+    # 以下统计均为列运算，逐笔 dict 只在写出报告时生成
+    rows = trades_frame(strat.trade_rows)
+    tdf = pd.DataFrame({
+        "entry": rows["entry_dt"].dt.strftime("%Y-%m-%d"),
+        "exit": rows["exit_dt"].dt.strftime("%Y-%m-%d"),
+        "dir": np.where(rows["long"], "多", "空"),
+        "size": rows["size"].abs(),
+        "price": [round(v, 2) for v in rows["price"].tolist()],
+        "pnl": [round(v, 2) for v in rows["pnl"].tolist()],
+        "pnlcomm": [round(v, 2) for v in rows["pnlcomm"].tolist()],
+        "bars": rows["barlen"],
+        "days": rows["days"],
+    }, columns=_TRADE_COLUMNS)
+    pnl = tdf["pnlcomm"]
+    days = tdf["days"]
+    win = pnl > 0
+    is_long = tdf["dir"] == "多"
+    is_short = tdf["dir"] == "空"
+    n_all = len(tdf)
+
+    # 各项均值（没有交易的分组记为 0）
+    avg_hold, avg_hold_win, avg_hold_loss, avg_pnl_win, avg_pnl_loss = trade_averages(pnl, days, win)
+    n_trades = perf.get("total_trades", 0)
+
+    max_consec = max_consecutive_losses(win.to_numpy())
+
+    # 年度分析：年份直接取自开仓时间（整数，不切分日期字符串），由 yearly_totals 一次汇总
+    yearly = {
+        str(y): {"trades": int(c), "pnl": round(float(v), 2), "won": int(w), "lost": int(c - w)}
+        for y, c, v, w in zip(*yearly_totals(rows["entry_dt"].dt.year.to_numpy(), pnl.to_numpy(), win.to_numpy()))
+    }
+
+    res = {
+        "name": cfg["name"],
+        "perf": {
+            "ret": perf.get("total_return", 0),
+            "sharpe": perf.get("sharpe_ratio") or None,
+            "mdd": perf.get("max_drawdown", 0),
+            "final": perf.get("final_value", 0),
+            "trades": perf.get("total_trades", 0),
+            "won": perf.get("won_trades", 0),
+            "lost": perf.get("lost_trades", 0),
+            "wr": perf.get("won_trades", 0) / n_trades * 100 if n_trades else 0.0,
+        },
+        "hold": {
+            "avg": avg_hold,
+            "avg_win": avg_hold_win,
+            "avg_loss": avg_hold_loss,
+        },
+        "risk": {
+            "avg_win": avg_pnl_win,
+            "avg_loss": avg_pnl_loss,
+            "pf": abs(avg_pnl_win / avg_pnl_loss) if avg_pnl_loss != 0 else None,
+            "max_win": float(pnl.max()) if n_all else 0,
+            "max_loss": float(pnl.min()) if n_all else 0,
+            "max_consec_loss": max_consec,
+        },
+        "direction": {
+            "long": int(is_long.sum()),
+            "short": int(is_short.sum()),
+            "long_pnl": float(pnl[is_long].sum()),
+            "short_pnl": float(pnl[is_short].sum()),
+        },
+        "yearly": yearly,
+        "trades": write_trades_jsonl(tdf, _TRADE_COLUMNS, _OUTPUT_DIR, _TRADES_PREFIX, cfg["name"]),
+    }
+    return round_report(res, _REPORT_DIGITS)
+
+
+def run(df: pd.DataFrame, report: dict) -> dict:
+    """在给定的日线数据上回测新旧策略各组参数，数据摘要与各组结果写入 report 并返回
+
+    由 main() 加载本地数据后调用；run_all.py 也会把同一份数据直接传进来，免去重复读取。
+    """
     from strategies.optimized_swing import OptimizedSwingStrategy
     from strategies.swing_strategy import SwingStrategy
 
-    # ── 加载数据 ──
-    print("[1/4] 加载数据...")
-    csv_path = "/media/jskj/Data/quant/Gold/Gold_Quant_Project/data/gc_futures_daily_max.csv"
-    df = pd.read_csv(csv_path, parse_dates=["time"])
     print(f"  日线: {len(df)} 条 | {df['time'].iloc[0]} ~ {df['time'].iloc[-1]}")
 
     report["data"] = {
@@ -101,144 +202,76 @@ try:
     ]
 
     # ── 回测 ──
+    # 各组参数互不依赖，分发到多个进程并行回测，结果按 configs 顺序汇总；
+    # 数据只在主进程整理一次（时间索引、小写列名），各组用到的均线也在这里每个周期只算一次，
+    # 整理好的数据放入共享内存，各进程按句柄映射后 load_data 直接使用，不再逐任务 pickle 整表
     print("[2/4] 运行回测...")
-    trade_log_global = []
-
-    class ReportingOpt(OptimizedSwingStrategy):
-        def notify_trade(self, trade):
-            super().notify_trade(trade)
-            if trade.isclosed:
-                entry_dt = bt.num2date(trade.dtopen)
-                exit_dt = bt.num2date(trade.dtclose)
-                trade_log_global.append({
-                    "entry": entry_dt.strftime("%Y-%m-%d"),
-                    "exit": exit_dt.strftime("%Y-%m-%d"),
-                    "dir": "多" if self.direction == 1 or trade.pnl == (trade.price * abs(trade.size) - trade.price * abs(trade.size)) else ("多" if trade.long else "空"),
-                    "size": abs(trade.size),
-                    "price": round(trade.price, 2),
-                    "pnl": round(trade.pnl, 2),
-                    "pnlcomm": round(trade.pnlcomm, 2),
-                    "bars": trade.barlen,
-                    "days": (exit_dt - entry_dt).days,
-                })
-
-    class ReportingOld(SwingStrategy):
-        def notify_trade(self, trade):
-            super().notify_trade(trade)
-            if trade.isclosed:
-                entry_dt = bt.num2date(trade.dtopen)
-                exit_dt = bt.num2date(trade.dtclose)
-                trade_log_global.append({
-                    "entry": entry_dt.strftime("%Y-%m-%d"),
-                    "exit": exit_dt.strftime("%Y-%m-%d"),
-                    "dir": "多",
-                    "size": abs(trade.size),
-                    "price": round(trade.price, 2),
-                    "pnl": round(trade.pnl, 2),
-                    "pnlcomm": round(trade.pnlcomm, 2),
-                    "bars": trade.barlen,
-                    "days": (exit_dt - entry_dt).days,
-                })
+    from backtest.engine import BacktestEngine
+    from backtest.shared_frame import shared_frame
 
+    df_bt = BacktestEngine.add_sma_columns(
+        BacktestEngine.prepare_data(df),
+        [c["params"][k] for c in configs for k in ("short_period", "long_period")],
+    )
+    # 逐笔记录由各进程直接写入 output/ 下的 jsonl 文件，主报告只保留条数与文件名
+    os.makedirs(_OUTPUT_DIR, exist_ok=True)
     all_results = []
-
-    for cfg in configs:
-        trade_log_global = []
-        is_old = cfg["strategy_class"] == SwingStrategy
-        cls = ReportingOld if is_old else ReportingOpt
-
-        eng = BacktestEngine(initial_cash=INITIAL_CASH, commission=0.001)
-        eng.load_data(df=df)
-        eng.add_strategy(strategy_class=cls, printlog=False, **cfg["params"])
-        eng.run()
-        perf = eng.print_performance()
-
-        trades = trade_log_global.copy()
-        won = [t for t in trades if t["pnlcomm"] > 0]
-        lost = [t for t in trades if t["pnlcomm"] <= 0]
-        long_trades = [t for t in trades if t["dir"] == "多"]
-        short_trades = [t for t in trades if t["dir"] == "空"]
-
-        avg_hold = sum(t["days"] for t in trades) / max(len(trades), 1)
-        avg_pnl_win = sum(t["pnlcomm"] for t in won) / max(len(won), 1)
-        avg_pnl_loss = sum(t["pnlcomm"] for t in lost) / max(len(lost), 1)
-        total_pnl = sum(t["pnlcomm"] for t in trades)
-
-        # 连续亏损
-        max_consec = 0
-        cur = 0
-        for t in trades:
-            if t["pnlcomm"] <= 0:
-                cur += 1
-                max_consec = max(max_consec, cur)
-            else:
-                cur = 0
-
-        # 年度分析
-        yearly = defaultdict(lambda: {"trades": 0, "pnl": 0.0, "won": 0, "lost": 0})
-        for t in trades:
-            y = t["entry"][:4]
-            yearly[y]["trades"] += 1
-            yearly[y]["pnl"] += t["pnlcomm"]
-            yearly[y]["won"] += 1 if t["pnlcomm"] > 0 else 0
-            yearly[y]["lost"] += 1 if t["pnlcomm"] <= 0 else 0
-
-        res = {
-            "name": cfg["name"],
-            "perf": {
-                "ret": round(perf.get("total_return", 0), 2),
-                "sharpe": round(perf["sharpe_ratio"], 4) if perf.get("sharpe_ratio") else None,
-                "mdd": round(perf.get("max_drawdown", 0), 2),
-                "final": round(perf.get("final_value", 0), 2),
-                "trades": perf.get("total_trades", 0),
-                "won": perf.get("won_trades", 0),
-                "lost": perf.get("lost_trades", 0),
-                "wr": round(perf.get("won_trades", 0) / max(perf.get("total_trades", 1), 1) * 100, 1),
-            },
-            "hold": {
-                "avg": round(avg_hold, 1),
-                "avg_win": round(sum(t["days"] for t in won) / max(len(won), 1), 1),
-                "avg_loss": round(sum(t["days"] for t in lost) / max(len(lost), 1), 1),
-            },
-            "risk": {
-                "avg_win": round(avg_pnl_win, 2),
-                "avg_loss": round(avg_pnl_loss, 2),
-                "pf": round(abs(avg_pnl_win / avg_pnl_loss), 2) if avg_pnl_loss != 0 else None,
-                "max_win": round(max((t["pnlcomm"] for t in trades), default=0), 2),
-                "max_loss": round(min((t["pnlcomm"] for t in trades), default=0), 2),
-                "max_consec_loss": max_consec,
-            },
-            "direction": {
-                "long": len(long_trades),
-                "short": len(short_trades),
-                "long_pnl": round(sum(t["pnlcomm"] for t in long_trades), 2),
-                "short_pnl": round(sum(t["pnlcomm"] for t in short_trades), 2),
-            },
-            "yearly": {k: {kk: round(vv, 2) if isinstance(vv, float) else vv
-                           for kk, vv in v.items()}
-                       for k, v in sorted(yearly.items())},
-            "trades": trades,
-        }
-        all_results.append(res)
-        print(f"  ✅ {cfg['name']}: 收益{res['perf']['ret']}%, "
-              f"{len(trades)}笔(多{len(long_trades)}/空{len(short_trades)}), "
-              f"均持{avg_hold:.0f}天, 胜率{res['perf']['wr']}%")
+    with shared_frame(df_bt) as frame, ProcessPoolExecutor(max_workers=len(configs)) as pool:
+        for res in pool.map(_run_cfg, configs, [frame] * len(configs)):
+            all_results.append(res)
+            d = res["direction"]
+            print(f"  ✅ {res['name']}: 收益{res['perf']['ret']}%, "
+                  f"{res['trades']['count']}笔(多{d['long']}/空{d['short']}), "
+                  f"均持{res['hold']['avg']:.0f}天, 胜率{res['perf']['wr']}%")
 
     report["strategies"] = all_results
     report["status"] = "success"
     print("[3/4] 完成")
+    return report
 
-except Exception as e:
-    import traceback
-    report["error"] = str(e)
-    report["traceback"] = traceback.format_exc()
-    print(f"错误: {e}")
-    traceback.print_exc()
 
-import os
-_output_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), "output")
-os.makedirs(_output_dir, exist_ok=True)
-_output_path = os.path.join(_output_dir, "gold_optimized_backtest.json")
-with open(_output_path, "w") as f:
-    json.dump(report, f, indent=2, default=str, ensure_ascii=False)
-print(f"[4/4] 结果已保存至 {_output_path}")
+def save_report(report: dict) -> str:
+    """把报告写入 output/gold_optimized_backtest.json，返回文件路径"""
+    os.makedirs(_OUTPUT_DIR, exist_ok=True)
+    _output_path = os.path.join(_OUTPUT_DIR, "gold_optimized_backtest.json")
+    write_json(report, _output_path)
+    print(f"[4/4] 结果已保存至 {_output_path}")
+    return _output_path
+
+
+def main():
+    report = {}
+
+    try:
+        # ── 加载数据 ──
+        print("[1/4] 加载数据...")
+        csv_path = "/media/jskj/Data/quant/Gold/Gold_Quant_Project/data/gc_futures_daily_max.csv"
+        # 优先读取同名 Parquet（run_daily_backtest.py 同时写出），不存在或缺少引擎时回退到 CSV
+        parquet_path = csv_path.replace(".csv", ".parquet")
+        df = None
+        if os.path.exists(parquet_path):
+            try:
+                df = pd.read_parquet(parquet_path)
+            except ImportError:
+                pass
+        if df is None:
+            # pyarrow 引擎多线程解析 CSV，浮点按正确舍入读取（与 Parquet 中的数值逐位一致）；
+            # 未安装 pyarrow 时回退到默认的 C 解析器
+            try:
+                df = pd.read_csv(csv_path, engine="pyarrow", parse_dates=["time"])
+            except ImportError:
+                df = pd.read_csv(csv_path, parse_dates=["time"])
+        run(df, report)
+
+    except Exception as e:
+        import traceback
+        report["error"] = str(e)
+        report["traceback"] = traceback.format_exc()
+        print(f"错误: {e}")
+        traceback.print_exc()
+
+    save_report(report)
+
+
+if __name__ == "__main__":
+    main()
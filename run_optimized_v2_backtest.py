@@ -1,165 +1,229 @@
 """
 run_optimized_v2_backtest.py - 优化V2 vs 原始策略对比回测
 """
+import importlib
+import os
 import sys
-import json
-from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
 
+import numpy as np
 import pandas as pd
-import backtrader as bt
 
 sys.path.insert(0, ".")
 
-report = {}
-INITIAL_CASH = 100000.0
+from backtest.report_io import write_json, write_trades_ndjson
 
-try:
+INITIAL_CASH = 100000.0
+_CSV_PATH = "/media/jskj/Data/quant/Gold/Gold_Quant_Project/data/gc_futures_daily_max.csv"
+_OUTPUT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "output")
+_TRADES_FILE = "gold_v2_trades.ndjson"
+# 工作进程回测用到的模块（backtrader、numba 内核、各策略均由 backtest.engine 间接导入）
+_WORKER_MODULES = ("backtest.engine", "backtest.reporting_mixin", "backtest.shared_frame",
+                   "backtest.trade_stats", "strategies.optimized_swing_v2")
+
+
+def harvest_trades(rows: list) -> tuple:
+    """把策略记录的成交元组按列转换为逐笔交易 DataFrame（列即报告 trades 各字段）与各笔开仓年份 ndarray
+
+    开/平仓时间由 trades_frame 一次性换算。
+    """
+    from backtest.reporting_mixin import trades_frame
+
+    tf = trades_frame(rows)
+    tdf = pd.DataFrame({
+        "entry": tf["entry_dt"].dt.strftime("%Y-%m-%d"),
+        "exit": tf["exit_dt"].dt.strftime("%Y-%m-%d"),
+        "dir": np.where(tf["long"], "多", "空"),
+        "size": tf["size"].abs(),
+        "price": [round(v, 2) for v in tf["price"].tolist()],
+        "pnl": [round(v, 2) for v in tf["pnl"].tolist()],
+        "pnlcomm": [round(v, 2) for v in tf["pnlcomm"].tolist()],
+        "bars": tf["barlen"],
+        "days": tf["days"],
+    })
+    return tdf, tf["entry_dt"].dt.year.to_numpy()
+
+
+def _init_worker():
+    """进程池初始化：工作进程启动时一次性导入 _WORKER_MODULES
+
+    fork 启动时模块大多已随主进程继承；spawn / forkserver 启动时每个进程只在这里导入一次，
+    之后 _run_cfg 中的局部导入只是查 sys.modules。主进程本身只在 main() 中按需导入。
+    """
+    for name in _WORKER_MODULES:
+        importlib.import_module(name)
+
+
+def _run_cfg(cfg: dict, frame) -> dict:
+    """在独立进程中回测单组参数，返回该组的绩效、交易分析与逐笔记录
+
+    frame 为主进程 shared_frame() 产出的句柄，回测数据直接映射自共享内存
+    """
     from backtest.engine import BacktestEngine
-    from strategies.optimized_swing_v2 import OptimizedSwingV2
-    from strategies.swing_strategy import SwingStrategy
-
-    print("[1/3] 加载数据...")
-    csv_path = "/media/jskj/Data/quant/Gold/Gold_Quant_Project/data/gc_futures_daily_max.csv"
-    df = pd.read_csv(csv_path, parse_dates=["time"])
-    print(f"  {len(df)} 条 | {df['time'].iloc[0]} ~ {df['time'].iloc[-1]}")
-
-    report["data"] = {"bars": len(df),
-                      "range": f"{df['time'].iloc[0]} ~ {df['time'].iloc[-1]}"}
-
-    configs = [
-        # 基准
-        {"name": "旧-宽松波段(基准)", "cls": SwingStrategy,
-         "p": {"short_period": 40, "long_period": 120, "adx_threshold": 18,
-               "atr_sl_mult": 5.0, "atr_tp_mult": 8.0, "trail_atr_mult": 4.0,
-               "rsi_upper": 40, "risk_pct": 0.02, "reentry_cooldown": 15}},
-        # V2 变体
-        {"name": "V2-双向标准", "cls": OptimizedSwingV2,
-         "p": {"short_period": 40, "long_period": 120, "adx_threshold": 18,
-               "atr_sl_mult": 5.0, "atr_trail_trigger": 6.0, "trail_atr_mult": 3.5,
-               "breakeven_trigger": 3.0, "rsi_long_min": 40, "rsi_short_max": 60,
-               "risk_pct": 0.02, "max_ma_spread": 10.0, "reentry_cooldown": 10,
-               "enable_short": True}},
-        {"name": "V2-纯多头", "cls": OptimizedSwingV2,
-         "p": {"short_period": 40, "long_period": 120, "adx_threshold": 18,
-               "atr_sl_mult": 5.0, "atr_trail_trigger": 6.0, "trail_atr_mult": 3.5,
-               "breakeven_trigger": 3.0, "rsi_long_min": 40,
-               "risk_pct": 0.02, "max_ma_spread": 10.0, "reentry_cooldown": 10,
-               "enable_short": False}},
-        {"name": "V2-经典双向", "cls": OptimizedSwingV2,
-         "p": {"short_period": 50, "long_period": 150, "adx_threshold": 20,
-               "atr_sl_mult": 5.0, "atr_trail_trigger": 6.0, "trail_atr_mult": 3.5,
-               "breakeven_trigger": 3.0, "rsi_long_min": 45, "rsi_short_max": 55,
-               "risk_pct": 0.02, "max_ma_spread": 10.0, "reentry_cooldown": 10,
-               "enable_short": True}},
-        {"name": "V2-激进双向", "cls": OptimizedSwingV2,
-         "p": {"short_period": 40, "long_period": 120, "adx_threshold": 15,
-               "atr_sl_mult": 4.0, "atr_trail_trigger": 5.0, "trail_atr_mult": 3.0,
-               "breakeven_trigger": 2.5, "rsi_long_min": 38, "rsi_short_max": 62,
-               "risk_pct": 0.025, "max_ma_spread": 12.0, "reentry_cooldown": 5,
-               "enable_short": True}},
-    ]
-
-    print("[2/3] 回测中...")
-    trade_log_g = []
-
-    class RptOld(SwingStrategy):
-        def notify_trade(self, trade):
-            super().notify_trade(trade)
-            if trade.isclosed:
-                e = bt.num2date(trade.dtopen); x = bt.num2date(trade.dtclose)
-                trade_log_g.append({"entry": e.strftime("%Y-%m-%d"), "exit": x.strftime("%Y-%m-%d"),
-                    "dir": "多", "size": abs(trade.size), "price": round(trade.price,2),
-                    "pnl": round(trade.pnl,2), "pnlcomm": round(trade.pnlcomm,2),
-                    "bars": trade.barlen, "days": (x-e).days})
-
-    class RptV2(OptimizedSwingV2):
-        def notify_trade(self, trade):
-            super().notify_trade(trade)
-            if trade.isclosed:
-                e = bt.num2date(trade.dtopen); x = bt.num2date(trade.dtclose)
-                trade_log_g.append({"entry": e.strftime("%Y-%m-%d"), "exit": x.strftime("%Y-%m-%d"),
-                    "dir": "多" if trade.long else "空", "size": abs(trade.size),
-                    "price": round(trade.price,2), "pnl": round(trade.pnl,2),
-                    "pnlcomm": round(trade.pnlcomm,2), "bars": trade.barlen,
-                    "days": (x-e).days})
-
-    results = []
-    for cfg in configs:
-        trade_log_g = []
-        cls = RptOld if cfg["cls"] == SwingStrategy else RptV2
-        eng = BacktestEngine(initial_cash=INITIAL_CASH, commission=0.001)
-        eng.load_data(df=df)
-        eng.add_strategy(strategy_class=cls, printlog=False, **cfg["p"])
-        eng.run()
-        perf = eng.print_performance()
-        trades = trade_log_g.copy()
-
-        won = [t for t in trades if t["pnlcomm"] > 0]
-        lost = [t for t in trades if t["pnlcomm"] <= 0]
-        longs = [t for t in trades if t["dir"] == "多"]
-        shorts = [t for t in trades if t["dir"] == "空"]
-
-        avg_hold = sum(t["days"] for t in trades) / max(len(trades),1)
-        avg_win = sum(t["pnlcomm"] for t in won) / max(len(won),1)
-        avg_loss = sum(t["pnlcomm"] for t in lost) / max(len(lost),1)
-
-        mc = 0; c = 0
-        for t in trades:
-            if t["pnlcomm"] <= 0: c += 1; mc = max(mc, c)
-            else: c = 0
-
-        yearly = defaultdict(lambda: {"n":0,"pnl":0.0,"w":0,"l":0})
-        for t in trades:
-            y = t["entry"][:4]
-            yearly[y]["n"] += 1; yearly[y]["pnl"] += t["pnlcomm"]
-            yearly[y]["w" if t["pnlcomm"]>0 else "l"] += 1
-
-        r = {
-            "name": cfg["name"],
-            "perf": {
-                "ret": round(perf.get("total_return",0),2),
-                "sharpe": round(perf["sharpe_ratio"],4) if perf.get("sharpe_ratio") else None,
-                "mdd": round(perf.get("max_drawdown",0),2),
-                "final": round(perf.get("final_value",0),2),
-                "trades": perf.get("total_trades",0),
-                "won": perf.get("won_trades",0),
-                "lost": perf.get("lost_trades",0),
-                "wr": round(perf.get("won_trades",0)/max(perf.get("total_trades",1),1)*100,1),
-            },
-            "hold": {"avg": round(avg_hold,1),
-                     "avg_win": round(sum(t["days"] for t in won)/max(len(won),1),1),
-                     "avg_loss": round(sum(t["days"] for t in lost)/max(len(lost),1),1)},
-            "risk": {"avg_win": round(avg_win,2), "avg_loss": round(avg_loss,2),
-                     "pf": round(abs(avg_win/avg_loss),2) if avg_loss != 0 else None,
-                     "max_win": round(max((t["pnlcomm"] for t in trades), default=0),2),
-                     "max_loss": round(min((t["pnlcomm"] for t in trades), default=0),2),
-                     "max_consec_loss": mc},
-            "dir": {"long": len(longs), "short": len(shorts),
-                    "long_pnl": round(sum(t["pnlcomm"] for t in longs),2),
-                    "short_pnl": round(sum(t["pnlcomm"] for t in shorts),2)},
-            "yearly": {k: dict(v) for k,v in sorted(yearly.items())},
-            "trades": trades,
-        }
-        results.append(r)
-        print(f"  ✅ {cfg['name']}: {r['perf']['ret']}%, "
-              f"{len(trades)}笔(多{len(longs)}/空{len(shorts)}), "
-              f"均持{avg_hold:.0f}天, 胜率{r['perf']['wr']}%")
-
-    report["strategies"] = results
-    report["status"] = "success"
-    print("[3/3] 完成")
-
-except Exception as e:
-    import traceback
-    report["error"] = str(e)
-    report["traceback"] = traceback.format_exc()
-    print(f"错误: {e}")
-    traceback.print_exc()
-
-import os
-_output_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), "output")
-os.makedirs(_output_dir, exist_ok=True)
-_output_path = os.path.join(_output_dir, "gold_v2_backtest.json")
-with open(_output_path, "w") as f:
-    json.dump(report, f, indent=2, default=str, ensure_ascii=False)
-print(f"结果已保存至 {_output_path}")
+    from backtest.reporting_mixin import with_trade_logging
+    from backtest.shared_frame import attach_frame
+    from backtest.trade_stats import max_consecutive_losses, trade_averages, yearly_totals
+
+    cls = with_trade_logging(cfg["cls"])
+    params = cfg["p"]
+    eng = BacktestEngine(initial_cash=INITIAL_CASH, commission=0.001, verbose=False)
+    eng.load_data(df=attach_frame(frame), sma_periods=(params["short_period"], params["long_period"]))
+    eng.add_strategy(strategy_class=cls, printlog=False, **params)
+    strat = eng.run()[0]
+    perf = eng.print_performance()
+
+    # 逐笔记录按列组成 DataFrame，以下统计均为列运算
+    tdf, years = harvest_trades(strat.trade_rows)
+    pnl = tdf["pnlcomm"].to_numpy(dtype=np.float64)
+    days = tdf["days"].to_numpy(dtype=np.float64)
+    win = pnl > 0
+    is_long = tdf["dir"].to_numpy() == "多"
+    n_all = len(pnl)
+    n_long = int(is_long.sum())
+    n_trades = perf.get("total_trades", 0)
+
+    avg_hold, avg_hold_win, avg_hold_loss, avg_win, avg_loss = trade_averages(pnl, days, win)
+    mc = max_consecutive_losses(win)
+
+    # 年度分析：按开仓年份由 yearly_totals 一次汇总
+    yearly = {
+        str(y): {"n": int(c), "pnl": float(v), "w": int(w), "l": int(c - w)}
+        for y, c, v, w in zip(*yearly_totals(years, pnl, win))
+    }
+
+    r = {
+        "name": cfg["name"],
+        "perf": {
+            "ret": round(perf.get("total_return",0),2),
+            "sharpe": round(perf["sharpe_ratio"],4) if perf.get("sharpe_ratio") else None,
+            "mdd": round(perf.get("max_drawdown",0),2),
+            "final": round(perf.get("final_value",0),2),
+            "trades": perf.get("total_trades",0),
+            "won": perf.get("won_trades",0),
+            "lost": perf.get("lost_trades",0),
+            "wr": round(perf.get("won_trades",0)/n_trades*100,1) if n_trades else 0.0,
+        },
+        "hold": {"avg": round(avg_hold,1),
+                 "avg_win": round(avg_hold_win,1),
+                 "avg_loss": round(avg_hold_loss,1)},
+        "risk": {"avg_win": round(avg_win,2), "avg_loss": round(avg_loss,2),
+                 "pf": round(abs(avg_win/avg_loss),2) if avg_loss != 0 else None,
+                 "max_win": round(float(pnl.max()),2) if n_all else 0,
+                 "max_loss": round(float(pnl.min()),2) if n_all else 0,
+                 "max_consec_loss": mc},
+        "dir": {"long": n_long, "short": n_all - n_long,
+                "long_pnl": round(float(pnl[is_long].sum()),2) if n_long else 0,
+                "short_pnl": round(float(pnl[~is_long].sum()),2) if n_long < n_all else 0},
+        "yearly": yearly,
+        # 逐笔记录按列存放（{字段: 列表}），不再逐笔生成 dict
+        "trades": tdf.to_dict("list"),
+    }
+    return r
+
+
+def main():
+    report = {}
+
+    try:
+        from backtest.engine import BacktestEngine
+        from backtest.result_cache import data_digest, load_result, result_key, save_result
+        from backtest.shared_frame import shared_frame
+        from strategies.optimized_swing_v2 import OptimizedSwingV2
+        from strategies.swing_strategy import SwingStrategy
+
+        print("[1/3] 加载数据...")
+        # pyarrow 引擎多线程解析 CSV，浮点按正确舍入读取；未安装 pyarrow 时回退到默认的 C 解析器
+        try:
+            df = pd.read_csv(_CSV_PATH, engine="pyarrow", parse_dates=["time"])
+        except ImportError:
+            df = pd.read_csv(_CSV_PATH, parse_dates=["time"])
+        print(f"  {len(df)} 条 | {df['time'].iloc[0]} ~ {df['time'].iloc[-1]}")
+
+        report["data"] = {"bars": len(df),
+                          "range": f"{df['time'].iloc[0]} ~ {df['time'].iloc[-1]}"}
+
+        configs = [
+            # 基准
+            {"name": "旧-宽松波段(基准)", "cls": SwingStrategy,
+             "p": {"short_period": 40, "long_period": 120, "adx_threshold": 18,
+                   "atr_sl_mult": 5.0, "atr_tp_mult": 8.0, "trail_atr_mult": 4.0,
+                   "rsi_upper": 40, "risk_pct": 0.02, "reentry_cooldown": 15}},
+            # V2 变体
+            {"name": "V2-双向标准", "cls": OptimizedSwingV2,
+             "p": {"short_period": 40, "long_period": 120, "adx_threshold": 18,
+                   "atr_sl_mult": 5.0, "atr_trail_trigger": 6.0, "trail_atr_mult": 3.5,
+                   "breakeven_trigger": 3.0, "rsi_long_min": 40, "rsi_short_max": 60,
+                   "risk_pct": 0.02, "max_ma_spread": 10.0, "reentry_cooldown": 10,
+                   "enable_short": True}},
+            {"name": "V2-纯多头", "cls": OptimizedSwingV2,
+             "p": {"short_period": 40, "long_period": 120, "adx_threshold": 18,
+                   "atr_sl_mult": 5.0, "atr_trail_trigger": 6.0, "trail_atr_mult": 3.5,
+                   "breakeven_trigger": 3.0, "rsi_long_min": 40,
+                   "risk_pct": 0.02, "max_ma_spread": 10.0, "reentry_cooldown": 10,
+                   "enable_short": False}},
+            {"name": "V2-经典双向", "cls": OptimizedSwingV2,
+             "p": {"short_period": 50, "long_period": 150, "adx_threshold": 20,
+                   "atr_sl_mult": 5.0, "atr_trail_trigger": 6.0, "trail_atr_mult": 3.5,
+                   "breakeven_trigger": 3.0, "rsi_long_min": 45, "rsi_short_max": 55,
+                   "risk_pct": 0.02, "max_ma_spread": 10.0, "reentry_cooldown": 10,
+                   "enable_short": True}},
+            {"name": "V2-激进双向", "cls": OptimizedSwingV2,
+             "p": {"short_period": 40, "long_period": 120, "adx_threshold": 15,
+                   "atr_sl_mult": 4.0, "atr_trail_trigger": 5.0, "trail_atr_mult": 3.0,
+                   "breakeven_trigger": 2.5, "rsi_long_min": 38, "rsi_short_max": 62,
+                   "risk_pct": 0.025, "max_ma_spread": 12.0, "reentry_cooldown": 5,
+                   "enable_short": True}},
+        ]
+
+        print("[2/3] 回测中...")
+
+        # 各组参数互不依赖，分发到多个进程并行回测，结果按 configs 顺序汇总；
+        # 数据只在主进程解析、整理一次（各组用到的均线每个周期也只算一次），
+        # 放入共享内存后各进程按句柄映射，不再逐进程重复读取 CSV
+        df_bt = BacktestEngine.add_sma_columns(
+            BacktestEngine.prepare_data(df),
+            [c["p"][k] for c in configs for k in ("short_period", "long_period")],
+        )
+
+        # 结果按 (参数, 数据, backtest/ 与 strategies/ 及本脚本源码, 依赖库版本) 缓存在 cache/ 目录，
+        # 命中的参数组不再回测
+        digest = data_digest(df_bt)
+        keys = [result_key({"name": c["name"], "p": c["p"]}, digest, _run_cfg) for c in configs]
+        results = [load_result(k) for k in keys]
+        todo = [i for i, r in enumerate(results) if r is None]
+        if todo:
+            with shared_frame(df_bt) as frame, ProcessPoolExecutor(
+                    max_workers=len(todo), initializer=_init_worker) as pool:
+                for i, r in zip(todo, pool.map(_run_cfg, [configs[i] for i in todo], [frame] * len(todo))):
+                    save_result(keys[i], r)
+                    results[i] = r
+
+        for i, r in enumerate(results):
+            d = r["dir"]
+            print(f"  ✅ {r['name']}: {r['perf']['ret']}%, "
+                  f"{d['long'] + d['short']}笔(多{d['long']}/空{d['short']}), "
+                  f"均持{r['hold']['avg']:.0f}天, 胜率{r['perf']['wr']}%"
+                  f"{'' if i in todo else '（缓存）'}")
+
+        # 逐笔记录单独写入 ndjson，主报告只保留条数与文件名
+        os.makedirs(_OUTPUT_DIR, exist_ok=True)
+        write_trades_ndjson(results, "trades", os.path.join(_OUTPUT_DIR, _TRADES_FILE))
+        report["strategies"] = results
+        report["status"] = "success"
+        print("[3/3] 完成")
+
+    except Exception as e:
+        import traceback
+        report["error"] = str(e)
+        report["traceback"] = traceback.format_exc()
+        print(f"错误: {e}")
+        traceback.print_exc()
+
+    os.makedirs(_OUTPUT_DIR, exist_ok=True)
+    _output_path = os.path.join(_OUTPUT_DIR, "gold_v2_backtest.json")
+    write_json(report, _output_path)
+    print(f"结果已保存至 {_output_path}")
+
+
+if __name__ == "__main__":
+    main()
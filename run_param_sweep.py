@@ -0,0 +1,81 @@
+"""
+run_param_sweep.py - SwingStrategy 参数矩阵扫描
+
+在最长日线数据上扫描 短均线 × 长均线 × ATR 止损倍数 的全部组合，
+由 BacktestEngine.run_param_grid 交给编译内核一次并行回测（安装 numba 时按 CPU 核数并行），
+按夏普比率排序输出前几组，并把全部结果写入 output/gold_param_sweep.parquet
+（未安装 Parquet 引擎时写 CSV）供后续分析。
+"""
+import os
+import sys
+import time
+from itertools import product
+
+import pandas as pd
+
+sys.path.insert(0, ".")
+
+INITIAL_CASH = 100000.0
+_OUTPUT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "output")
+
+# 扫描的参数取值，其余参数取 SwingStrategy 默认值
+SHORT_PERIODS = (20, 30, 40, 50, 60)
+LONG_PERIODS = (90, 120, 150, 200)
+ATR_SL_MULTS = (2.0, 3.0, 4.0, 5.0)
+TOP_N = 10
+
+
+def param_grid() -> list:
+    """短均线 < 长均线的全部参数组合"""
+    return [
+        {"short_period": s, "long_period": lp, "atr_sl_mult": m}
+        for s, lp, m in product(SHORT_PERIODS, LONG_PERIODS, ATR_SL_MULTS)
+        if s < lp
+    ]
+
+
+def save_results(results: pd.DataFrame) -> str:
+    """写出扫描结果（优先 Parquet，未安装 Parquet 引擎时回退 CSV），返回文件路径"""
+    os.makedirs(_OUTPUT_DIR, exist_ok=True)
+    path = os.path.join(_OUTPUT_DIR, "gold_param_sweep.parquet")
+    try:
+        results.to_parquet(path, index=False)
+    except ImportError as e:
+        print(f"  ⚠️ 未安装 Parquet 引擎，改存 CSV: {e}")
+        path = os.path.join(_OUTPUT_DIR, "gold_param_sweep.csv")
+        results.to_csv(path, index=False)
+    print(f"结果已保存至 {path}")
+    return path
+
+
+def main():
+    from data.data_fetcher import YFinanceDataFetcher
+    from backtest.engine import BacktestEngine
+    from strategies.swing_strategy import SwingStrategy
+
+    print("[1/3] 获取数据...")
+    fetcher = YFinanceDataFetcher(symbol="GC=F")
+    df = fetcher.fetch_ohlcv(period="max", interval="1d")
+    if df is None or df.empty:
+        print("错误: 数据获取失败")
+        return 1
+    print(f"  日线: {len(df)} 条 | {df['time'].iloc[0]} ~ {df['time'].iloc[-1]}")
+
+    grid = param_grid()
+    print(f"[2/3] 扫描 {len(grid)} 组参数...")
+    engine = BacktestEngine(initial_cash=INITIAL_CASH, verbose=False)
+    engine.load_data(df=BacktestEngine.prepare_data(df))
+    t0 = time.perf_counter()
+    sharpe = engine.run_param_grid(SwingStrategy, grid)
+    print(f"  耗时 {time.perf_counter() - t0:.2f}s")
+
+    results = pd.DataFrame(grid).assign(sharpe_ratio=sharpe)
+    results = results.sort_values("sharpe_ratio", ascending=False, na_position="last")
+    print(f"[3/3] 夏普比率前 {TOP_N} 组:")
+    print(results.head(TOP_N).to_string(index=False))
+    save_results(results)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
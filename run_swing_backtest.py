@@ -4,17 +4,21 @@ run_swing_backtest.py - 中长期波段策略回测
 测试 SwingStrategy 在不同时间框架和参数组合下的表现。
 目标：每笔持仓 3-6 个月。
 """
+import os
 import sys
-import json
-from collections import defaultdict
 
+import numpy as np
 import pandas as pd
-import backtrader as bt
 
 sys.path.insert(0, ".")
 
+from backtest.report_io import write_json, write_trades_ndjson
+
 report = {}
 INITIAL_CASH = 100000.0
+_OUTPUT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "output")
+_TRADES_FILE = "gold_swing_trades.ndjson"
+
 
 try:
     # ============================================================
@@ -22,6 +26,8 @@ try:
     # ============================================================
     from data.data_fetcher import YFinanceDataFetcher
     from backtest.engine import BacktestEngine
+    from backtest.reporting_mixin import trades_frame, with_trade_logging
+    from backtest.trade_stats import trade_averages, yearly_totals
     from strategies.swing_strategy import SwingStrategy
 
     # === 日线数据（5年，充足的样本量）===
@@ -47,6 +53,11 @@ try:
                   "price": f"${df_4h['close'].min():.0f} ~ ${df_4h['close'].max():.0f}"},
     }
 
+    # 数据只整理一次（时间索引、小写列名），同一时间框架的各组参数 load_data 同一对象，
+    # 数据源数组也只换算一次
+    bt_daily = BacktestEngine.prepare_data(df_daily)
+    bt_4h = BacktestEngine.prepare_data(df_4h)
+
     # ============================================================
     # 2. 定义参数组合
     # ============================================================
@@ -54,7 +65,7 @@ try:
         # --- 日线参数 ---
         {
             "name": "日线-标准波段",
-            "df": df_daily,
+            "df": bt_daily,
             "desc": "MA(50/150) ADX>20 SL:4xATR Trail:6xATR RSI>45",
             "params": {"short_period": 50, "long_period": 150,
                        "adx_threshold": 20, "atr_sl_mult": 4.0,
@@ -63,7 +74,7 @@ try:
         },
         {
             "name": "日线-宽松波段",
-            "df": df_daily,
+            "df": bt_daily,
             "desc": "MA(40/120) ADX>18 SL:5xATR Trail:8xATR RSI>40",
             "params": {"short_period": 40, "long_period": 120,
                        "adx_threshold": 18, "atr_sl_mult": 5.0,
@@ -72,7 +83,7 @@ try:
         },
         {
             "name": "日线-经典金叉",
-            "df": df_daily,
+            "df": bt_daily,
             "desc": "MA(50/200) ADX>22 SL:4xATR Trail:7xATR RSI>50",
             "params": {"short_period": 50, "long_period": 200,
                        "adx_threshold": 22, "atr_sl_mult": 4.0,
@@ -82,7 +93,7 @@ try:
         # --- 4H 参数 ---
         {
             "name": "4H-中期波段",
-            "df": df_4h,
+            "df": bt_4h,
             "desc": "MA(120/360) ADX>20 SL:4xATR Trail:6xATR RSI>45",
             "params": {"short_period": 120, "long_period": 360,
                        "adx_threshold": 20, "atr_sl_mult": 4.0,
@@ -91,7 +102,7 @@ try:
         },
         {
             "name": "4H-超宽容波段",
-            "df": df_4h,
+            "df": bt_4h,
             "desc": "MA(100/300) ADX>18 SL:5xATR Trail:8xATR RSI>42",
             "params": {"short_period": 100, "long_period": 300,
                        "adx_threshold": 18, "atr_sl_mult": 5.0,
@@ -100,65 +111,71 @@ try:
         },
     ]
 
+    # 同一时间框架各组用到的均线周期汇总后整段预先算好（sma_<周期> 列，每个周期只算一次），
+    # 回测时随数据源传入，不再在 Backtrader 中逐组、逐根计算 SMA
+    for base in (bt_daily, bt_4h):
+        group = [c for c in configs if c["df"] is base]
+        with_sma = BacktestEngine.add_sma_columns(
+            base, [c["params"][k] for c in group for k in ("short_period", "long_period")])
+        for c in group:
+            c["df"] = with_sma
+
     # ============================================================
     # 3. 回测
     # ============================================================
     print("[2/3] 运行回测...")
 
-    trade_log_global = []
-
-    class ReportingSwing(SwingStrategy):
-        """带交易记录的波段策略"""
-        def notify_trade(self, trade):
-            super().notify_trade(trade)
-            if trade.isclosed:
-                entry_dt = bt.num2date(trade.dtopen)
-                exit_dt = bt.num2date(trade.dtclose)
-                duration_days = (exit_dt - entry_dt).days
-                trade_log_global.append({
-                    "entry_date": entry_dt.strftime("%Y-%m-%d %H:%M"),
-                    "exit_date": exit_dt.strftime("%Y-%m-%d %H:%M"),
-                    "size": abs(trade.size),
-                    "entry_price": round(trade.price, 2),
-                    "exit_price": round(trade.price + trade.pnl / abs(trade.size), 2) if trade.size != 0 else 0,
-                    "pnl": round(trade.pnl, 2),
-                    "pnlcomm": round(trade.pnlcomm, 2),
-                    "duration_bars": trade.barlen,
-                    "duration_days": duration_days,
-                })
+    # 混入逐笔交易记录；回测结束后从 run() 返回的策略实例中取出
+    ReportingSwing = with_trade_logging(SwingStrategy)
+
+    def harvest_trades(rows: list) -> tuple:
+        """把策略记录的成交元组按列转换为逐笔交易记录（开/平仓时间由 trades_frame 一次性换算）
+
+        Returns:
+            tuple: (逐笔交易 DataFrame（列即 trade_log 各字段）, 各笔开仓年份 ndarray)
+        """
+        tf = trades_frame(rows)
+        size = tf["size"].abs().tolist()
+        price = tf["price"].tolist()
+        pnl = tf["pnl"].tolist()
+        tdf = pd.DataFrame({
+            "entry_date": tf["entry_dt"].dt.strftime("%Y-%m-%d %H:%M"),
+            "exit_date": tf["exit_dt"].dt.strftime("%Y-%m-%d %H:%M"),
+            "size": size,
+            "entry_price": [round(v, 2) for v in price],
+            "exit_price": [round(p + q / s, 2) if s != 0 else 0 for p, q, s in zip(price, pnl, size)],
+            "pnl": [round(v, 2) for v in pnl],
+            "pnlcomm": [round(v, 2) for v in tf["pnlcomm"].tolist()],
+            "duration_bars": tf["barlen"],
+            "duration_days": tf["days"],
+        })
+        return tdf, tf["entry_dt"].dt.year.to_numpy()
 
     all_results = []
 
     for cfg in configs:
-        trade_log_global = []
-
         eng = BacktestEngine(initial_cash=INITIAL_CASH, commission=0.001)
-        eng.load_data(df=cfg["df"])
-        eng.add_strategy(strategy_class=ReportingSwing, printlog=False, **cfg["params"])
-        eng.run()
+        params = cfg["params"]
+        eng.load_data(df=cfg["df"], sma_periods=(params["short_period"], params["long_period"]))
+        eng.add_strategy(strategy_class=ReportingSwing, printlog=False, **params)
+        strat = eng.run()[0]
         perf = eng.print_performance()
 
-        # 统计
-        trades = trade_log_global.copy()
-        won_trades = [t for t in trades if t["pnlcomm"] > 0]
-        lost_trades = [t for t in trades if t["pnlcomm"] <= 0]
-
-        avg_hold = sum(t["duration_days"] for t in trades) / max(len(trades), 1)
-        avg_hold_win = sum(t["duration_days"] for t in won_trades) / max(len(won_trades), 1)
-        avg_hold_loss = sum(t["duration_days"] for t in lost_trades) / max(len(lost_trades), 1)
-        avg_pnl_win = sum(t["pnlcomm"] for t in won_trades) / max(len(won_trades), 1)
-        avg_pnl_loss = sum(t["pnlcomm"] for t in lost_trades) / max(len(lost_trades), 1)
-
-        # 按年度分析
-        yearly_stats = defaultdict(lambda: {"trades": 0, "pnl": 0, "won": 0, "lost": 0})
-        for t in trades:
-            y = t["entry_date"][:4]
-            yearly_stats[y]["trades"] += 1
-            yearly_stats[y]["pnl"] += t["pnlcomm"]
-            if t["pnlcomm"] > 0:
-                yearly_stats[y]["won"] += 1
-            else:
-                yearly_stats[y]["lost"] += 1
+        # 统计：逐笔记录按列组成 DataFrame，以下均为列运算
+        tdf, years = harvest_trades(strat.trade_rows)
+        pnl = tdf["pnlcomm"].to_numpy(dtype=np.float64)
+        days = tdf["duration_days"].to_numpy(dtype=np.float64)
+        win = pnl > 0
+        n_all = len(pnl)
+        n_trades = perf.get("total_trades", 0)
+
+        avg_hold, avg_hold_win, avg_hold_loss, avg_pnl_win, avg_pnl_loss = trade_averages(pnl, days, win)
+
+        # 按年度分析：按开仓年份由 yearly_totals 一次汇总
+        yearly_stats = {
+            str(y): {"trades": int(c), "pnl": float(v), "won": int(w), "lost": int(c - w)}
+            for y, c, v, w in zip(*yearly_totals(years, pnl, win))
+        }
 
         res = {
             "name": cfg["name"],
@@ -171,7 +188,7 @@ try:
                 "total_trades": perf.get("total_trades", 0),
                 "won_trades": perf.get("won_trades", 0),
                 "lost_trades": perf.get("lost_trades", 0),
-                "win_rate": round(perf.get("won_trades", 0) / max(perf.get("total_trades", 1), 1) * 100, 1),
+                "win_rate": round(perf.get("won_trades", 0) / n_trades * 100, 1) if n_trades else 0.0,
             },
             "holding_period": {
                 "avg_days": round(avg_hold, 1),
@@ -184,13 +201,17 @@ try:
                 "profit_factor": round(
                     abs(avg_pnl_win / avg_pnl_loss), 2) if avg_pnl_loss != 0 else None,
             },
-            "yearly_analysis": {k: dict(v) for k, v in sorted(yearly_stats.items())},
-            "trade_log": trades,
+            "yearly_analysis": yearly_stats,
+            # 逐笔记录按列存放（{字段: 列表}），不再逐笔生成 dict
+            "trade_log": tdf.to_dict("list"),
         }
         all_results.append(res)
         print(f"  ✅ {cfg['name']}: 收益 {res['performance']['total_return']}%, "
-              f"{len(trades)} 笔, 平均持仓 {avg_hold:.0f} 天")
+              f"{n_all} 笔, 平均持仓 {avg_hold:.0f} 天")
 
+    # 逐笔记录单独写入 ndjson，主报告只保留条数与文件名
+    os.makedirs(_OUTPUT_DIR, exist_ok=True)
+    write_trades_ndjson(all_results, "trade_log", os.path.join(_OUTPUT_DIR, _TRADES_FILE))
     report["strategies"] = all_results
     report["status"] = "success"
     print("[3/3] 完成")
@@ -202,10 +223,7 @@ except Exception as e:
     print(f"错误: {e}")
     traceback.print_exc()
 
-import os
-_output_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), "output")
-os.makedirs(_output_dir, exist_ok=True)
-_output_path = os.path.join(_output_dir, "gold_swing_backtest.json")
-with open(_output_path, "w") as f:
-    json.dump(report, f, indent=2, default=str, ensure_ascii=False)
+os.makedirs(_OUTPUT_DIR, exist_ok=True)
+_output_path = os.path.join(_OUTPUT_DIR, "gold_swing_backtest.json")
+write_json(report, _output_path)
 print(f"结果已保存至 {_output_path}")
@@ -0,0 +1,66 @@
+"""
+_indicator_cache.py - 编译指标数组缓存
+
+参数扫描与逐组对比回测中，大量参数组只在止损、仓位等非指标参数上不同，
+RSI / ATR / ADX / MACD 的周期相同、行情数组也是同一份。这里按
+（行情数组对象, 指标名, 指标周期）缓存编译内核算出的整段指标数组，
+同一份数据、同一组周期只算一次，无论来自 Cerebro 策略（strategies._precomputed）
+还是编译内核回测（BacktestEngine.run(fast=True) / run_param_grid）。
+
+缓存以收盘价数组对象为单位挂靠：数组被回收时对应条目随之清除；最高/最低价数组
+按对象身份校验，换了数组即视为未命中。返回的数组由所有调用方共用，只读不写。
+"""
+
+import weakref
+
+# id(close) → (close 的弱引用, {(指标名, id(high), id(low), 周期...): (high/low 弱引用, 结果)})
+_CACHE = {}
+
+
+def _entry(close) -> dict:
+    """返回 close 数组对应的缓存字典（首次调用时创建，close 被回收时清除）"""
+    key = id(close)
+    entry = _CACHE.get(key)
+    if entry is None or entry[0]() is not close:
+        entry = (weakref.ref(close), {})
+        _CACHE[key] = entry
+        weakref.finalize(close, _CACHE.pop, key, None)
+    return entry[1]
+
+
+def _cached(name: str, high, low, close, periods: tuple, compute):
+    """按 (name, high, low, periods) 查 close 的缓存，未命中时调用 compute() 计算并存入"""
+    cache = _entry(close)
+    key = (name, id(high), id(low), *periods)
+    hit = cache.get(key)
+    if hit is not None and all((ref() if ref is not None else None) is arr
+                               for ref, arr in zip(hit[0], (high, low))):
+        return hit[1]
+    refs = tuple(weakref.ref(arr) if arr is not None else None for arr in (high, low))
+    result = compute()
+    cache[key] = (refs, result)
+    return result
+
+
+def rsi_atr(high, low, close, rsi_period: int, atr_period: int) -> tuple:
+    """(RSI, ATR) 整段数组，见 backtest.engine_numba._rsi_atr"""
+    from backtest.engine_numba import _rsi_atr
+
+    return _cached("rsi_atr", high, low, close, (rsi_period, atr_period),
+                   lambda: _rsi_atr(high, low, close, rsi_period, atr_period))
+
+
+def adx_dmi(high, low, close, period: int) -> tuple:
+    """(ADX, +DI, -DI) 整段数组，见 backtest.engine_numba._adx_dmi"""
+    from backtest.engine_numba import _adx_dmi
+
+    return _cached("adx_dmi", high, low, close, (period,),
+                   lambda: _adx_dmi(high, low, close, period))
+
+
+def macd_hist(close, fast_period: int, slow_period: int, signal_period: int):
+    """MACD 柱整段数组，见 backtest.engine_numba._macd_hist"""
+    from backtest.engine_numba import _macd_hist
+
+    return _cached("macd_hist", None, None, close, (fast_period, slow_period, signal_period),
+                   lambda: _macd_hist(close, fast_period, slow_period, signal_period))
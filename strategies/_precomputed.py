@@ -0,0 +1,163 @@
+"""
+_precomputed.py - 预计算数据线复用
+
+回测引擎 load_data(sma_periods=...) 会把整段数据的两条均线一次性算好，
+随 PrecomputedSMAData 数据源传入。各均线策略通过 moving_averages() 取得均线：
+周期一致时直接包装数据源中的预计算数据线，否则照常创建 bt.indicators.SMA。
+
+RSI / ATR 同理：数据源为 NumpyData 时，rsi_atr() 在策略 __init__ 中由编译内核按整段
+收盘/最高/最低价数组一次算出，再包装为 ArrayLine 指标，不再逐 K 线驱动 Backtrader 的
+RSI / ATR 及其各级子指标；取值与 Backtrader 逐位一致，预热期相同。adx_dmi()（ADX / +DI / -DI）
+与 macd_histogram()（MACD 柱）、预计算均线的交叉信号 crossover() 做法相同。
+同一份数据、同一组周期的指标数组经 strategies._indicator_cache 缓存，多组参数逐个回测时只算一次。
+
+Cerebro 默认（preload + runonce）在调用 next() 之前已把各指标整段算完，
+策略可在 nextstart() 中用 line_arrays() 把用到的数据线一次性取为列表，
+next() 中按 len(self) - 1 下标读取，省去逐 K 线 LineBuffer 取值的开销。
+"""
+
+from array import array
+
+import backtrader as bt
+
+
+class PrecomputedLine(bt.Indicator):
+    """把数据源中预计算好的数据线包装为指标
+
+    取值与传入的数据线完全相同，预热期（minperiod）与同周期 SMA 一致，
+    保证基于它的 CrossOver 等指标及策略 next() 的起始 K 线不变。
+    """
+
+    lines = ("value",)
+    params = (("period", 1),)
+
+    def __init__(self):
+        self.lines.value = self.data
+        self.addminperiod(self.params.period)
+
+
+class ArrayLine(bt.Indicator):
+    """把整段预先算好的数组包装为指标
+
+    params.values 为下标对应 K 线序号的取值序列，预热期（minperiod）由 params.period 给出，
+    与被替代的 Backtrader 指标一致。
+    """
+
+    lines = ("value",)
+    params = (("values", None), ("period", 1))
+
+    def __init__(self):
+        self.addminperiod(self.params.period)
+
+    def next(self):
+        self.lines.value[0] = self.params.values[len(self) - 1]
+
+    def once(self, start, end):
+        self.lines.value.array[start:end] = array("d", self.params.values[start:end])
+
+
+def moving_averages(data, short_period: int, long_period: int):
+    """返回 (短期均线, 长期均线)
+
+    数据源为 PrecomputedSMAData 且周期与策略参数一致时复用预计算数据线，
+    否则创建 Backtrader 的 SMA 指标。须在策略 __init__ 中调用。
+    """
+    if (getattr(data.params, "fast_period", None) == short_period
+            and getattr(data.params, "slow_period", None) == long_period):
+        return (PrecomputedLine(data.fast_sma, period=short_period),
+                PrecomputedLine(data.slow_sma, period=long_period))
+    return (bt.indicators.SimpleMovingAverage(data, period=short_period),
+            bt.indicators.SimpleMovingAverage(data, period=long_period))
+
+
+def crossover(data, sma_short, sma_long, short_period: int, long_period: int):
+    """返回短、长均线的交叉信号（1 上穿、-1 下穿、0 无交叉）
+
+    数据源为 PrecomputedSMAData 且周期与策略参数一致时，由编译内核按两条预计算均线的整段数组
+    一次算出并包装为 ArrayLine，取值与预热期同 Backtrader CrossOver；否则创建 bt.indicators.CrossOver。
+    sma_short / sma_long 为 moving_averages() 的返回值。须在策略 __init__ 中调用。
+    """
+    if (getattr(data.params, "fast_period", None) != short_period
+            or getattr(data.params, "slow_period", None) != long_period):
+        return bt.indicators.CrossOver(sma_short, sma_long)
+
+    from backtest.engine_numba import _crossover
+
+    longest = max(short_period, long_period)
+    cross = _crossover(data.column_array(f"sma_{short_period}"), data.column_array(f"sma_{long_period}"),
+                       longest - 1)
+    # CrossOver 需要上一根的均线差，预热期比较长均线多 1 根
+    return ArrayLine(data, values=cross.tolist(), period=longest + 1)
+
+
+def rsi_atr(data, rsi_period: int, atr_period: int):
+    """返回 (RSI, ATR)
+
+    数据源提供整段列数组（NumpyData.column_array）时，两条指标由编译内核一次算出并包装为
+    ArrayLine；否则创建 Backtrader 的 RSI / ATR 指标。须在策略 __init__ 中调用。
+    """
+    column_array = getattr(data, "column_array", None)
+    if column_array is None:
+        return (bt.indicators.RSI(data, period=rsi_period),
+                bt.indicators.ATR(data, period=atr_period))
+
+    from strategies._indicator_cache import rsi_atr as _rsi_atr
+
+    rsi, atr = _rsi_atr(column_array("high"), column_array("low"), column_array("close"),
+                        rsi_period, atr_period)
+    # Backtrader 的 RSI / ATR 都需要前一根收盘价，预热期比周期多 1 根
+    return (ArrayLine(data, values=rsi.tolist(), period=rsi_period + 1),
+            ArrayLine(data, values=atr.tolist(), period=atr_period + 1))
+
+
+def adx_dmi(data, period: int):
+    """返回 (ADX, +DI, -DI)
+
+    数据源提供整段列数组时由编译内核一次算出并包装为 ArrayLine，否则创建 Backtrader 的
+    ADX / PlusDI / MinusDI 指标。须在策略 __init__ 中调用。
+    """
+    column_array = getattr(data, "column_array", None)
+    if column_array is None:
+        return (bt.indicators.ADX(data, period=period),
+                bt.indicators.PlusDI(data, period=period),
+                bt.indicators.MinusDI(data, period=period))
+
+    from strategies._indicator_cache import adx_dmi as _adx_dmi
+
+    adx, plus_di, minus_di = _adx_dmi(column_array("high"), column_array("low"),
+                                      column_array("close"), period)
+    # ±DI 需要前一根 K 线，预热期为 period + 1；ADX 再对 DX 平滑一次，预热期为 2 * period
+    return (ArrayLine(data, values=adx.tolist(), period=2 * period),
+            ArrayLine(data, values=plus_di.tolist(), period=period + 1),
+            ArrayLine(data, values=minus_di.tolist(), period=period + 1))
+
+
+def macd_histogram(data, fast_period: int, slow_period: int, signal_period: int):
+    """返回 MACD 柱（MACD 线 - 信号线）
+
+    数据源提供整段列数组时由编译内核一次算出并包装为 ArrayLine，否则由 Backtrader 的
+    MACD 指标相减得到。须在策略 __init__ 中调用。
+    """
+    column_array = getattr(data, "column_array", None)
+    if column_array is None:
+        macd = bt.indicators.MACD(data, period_me1=fast_period, period_me2=slow_period,
+                                  period_signal=signal_period)
+        return macd.macd - macd.signal
+
+    from strategies._indicator_cache import macd_hist as _macd_hist
+
+    hist = _macd_hist(column_array("close"), fast_period, slow_period, signal_period)
+    return ArrayLine(data, values=hist.tolist(), period=slow_period + signal_period - 1)
+
+
+def line_arrays(strategy, *lines):
+    """返回各数据线整段取值（float 列表，下标为 K 线序号，当前 K 线为 len(strategy) - 1）
+
+    仅当数据已预加载且指标已整段算完（各数据线底层数组长度等于数据总长，且大于已处理的
+    K 线数）时可用，否则（逐根计算、实时数据等）返回 None，调用方继续按 line[0] 取值。
+    须在 nextstart() 及之后调用。
+    """
+    total = strategy.data.buflen()
+    if total <= len(strategy) or any(len(line.array) != total for line in lines):
+        return None
+    return [line.array.tolist() for line in lines]
@@ -10,6 +10,8 @@ dual_ma_strategy.py - 双均线交叉策略模块
 
 import backtrader as bt
 
+from strategies._precomputed import crossover, line_arrays, moving_averages
+
 
 class DualMAStrategy(bt.Strategy):
     """双均线交叉策略
@@ -34,6 +36,7 @@ class DualMAStrategy(bt.Strategy):
         """初始化策略
 
         创建短期和长期 SMA 指标，以及交叉信号检测器。
+        若数据源为 PrecomputedSMAData 且均线周期一致，则直接使用预计算的均线数据线。
         """
         # 保存收盘价引用，方便后续使用
         self.dataclose = self.datas[0].close
@@ -43,16 +46,17 @@ class DualMAStrategy(bt.Strategy):
         self.buy_price = None
         self.buy_comm = None
 
-        # 创建短期和长期均线指标
-        self.sma_short = bt.indicators.SimpleMovingAverage(
-            self.datas[0], period=self.params.short_period
-        )
-        self.sma_long = bt.indicators.SimpleMovingAverage(
-            self.datas[0], period=self.params.long_period
+        # 创建短期和长期均线指标；数据源已预计算同周期均线时直接复用
+        self.sma_short, self.sma_long = moving_averages(
+            self.datas[0], self.params.short_period, self.params.long_period
         )
 
         # 交叉信号检测器：crossover > 0 表示金叉，< 0 表示死叉
-        self.crossover = bt.indicators.CrossOver(self.sma_short, self.sma_long)
+        self.crossover = crossover(
+            self.datas[0], self.sma_short, self.sma_long, self.params.short_period, self.params.long_period
+        )
+        # 交叉信号整段取值（nextstart 中取得；指标非整段预先算完时为 None）
+        self._cross = None
 
     def log(self, txt: str, dt=None) -> None:
         """策略日志输出
@@ -81,17 +85,19 @@ class DualMAStrategy(bt.Strategy):
 
         if order.status in [order.Completed]:
             if order.isbuy():
-                self.log(
-                    f"✅ 买入成交 | 价格: {order.executed.price:.2f} | "
-                    f"成本: {order.executed.value:.2f} | 手续费: {order.executed.comm:.2f}"
-                )
+                if self.params.printlog:
+                    self.log(
+                        f"✅ 买入成交 | 价格: {order.executed.price:.2f} | "
+                        f"成本: {order.executed.value:.2f} | 手续费: {order.executed.comm:.2f}"
+                    )
                 self.buy_price = order.executed.price
                 self.buy_comm = order.executed.comm
             else:
-                self.log(
-                    f"✅ 卖出成交 | 价格: {order.executed.price:.2f} | "
-                    f"成本: {order.executed.value:.2f} | 手续费: {order.executed.comm:.2f}"
-                )
+                if self.params.printlog:
+                    self.log(
+                        f"✅ 卖出成交 | 价格: {order.executed.price:.2f} | "
+                        f"成本: {order.executed.value:.2f} | 手续费: {order.executed.comm:.2f}"
+                    )
 
         elif order.status in [order.Canceled, order.Margin, order.Rejected]:
             self.log("⚠️ 订单被取消/保证金不足/被拒绝")
@@ -108,13 +114,20 @@ class DualMAStrategy(bt.Strategy):
         Args:
             trade: backtrader Trade 对象，包含交易盈亏信息
         """
-        if not trade.isclosed:
+        # 不打印日志时直接返回，免去逐笔格式化日志字符串
+        if not trade.isclosed or not self.params.printlog:
             return
 
         self.log(
             f"💰 交易完成 | 毛利润: {trade.pnl:.2f} | 净利润: {trade.pnlcomm:.2f}"
         )
 
+    def nextstart(self) -> None:
+        """首根通过预热期的 K 线：取出整段交叉信号，之后 next() 按下标读取"""
+        arrays = line_arrays(self, self.crossover)
+        self._cross = arrays[0] if arrays else None
+        self.next()
+
     def next(self) -> None:
         """策略主逻辑（逐 K 线执行）
 
@@ -127,23 +140,27 @@ class DualMAStrategy(bt.Strategy):
         if self.order:
             return
 
+        cross = self._cross[len(self) - 1] if self._cross is not None else self.crossover[0]
+
         # 当前无持仓
         if not self.position:
             # 金叉：短期均线上穿长期均线 → 买入
-            if self.crossover > 0:
-                self.log(
-                    f"📈 金叉信号 | 收盘价: {self.dataclose[0]:.2f} | "
-                    f"短MA: {self.sma_short[0]:.2f} | 长MA: {self.sma_long[0]:.2f}"
-                )
+            if cross > 0:
+                if self.params.printlog:
+                    self.log(
+                        f"📈 金叉信号 | 收盘价: {self.dataclose[0]:.2f} | "
+                        f"短MA: {self.sma_short[0]:.2f} | 长MA: {self.sma_long[0]:.2f}"
+                    )
                 self.order = self.buy()
 
         else:
             # 死叉：短期均线下穿长期均线 → 卖出
-            if self.crossover < 0:
-                self.log(
-                    f"📉 死叉信号 | 收盘价: {self.dataclose[0]:.2f} | "
-                    f"短MA: {self.sma_short[0]:.2f} | 长MA: {self.sma_long[0]:.2f}"
-                )
+            if cross < 0:
+                if self.params.printlog:
+                    self.log(
+                        f"📉 死叉信号 | 收盘价: {self.dataclose[0]:.2f} | "
+                        f"短MA: {self.sma_short[0]:.2f} | 长MA: {self.sma_long[0]:.2f}"
+                    )
                 self.order = self.sell()
 
     def stop(self) -> None:
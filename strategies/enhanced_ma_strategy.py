@@ -10,6 +10,8 @@ enhanced_ma_strategy.py - 增强版双均线策略
 
 import backtrader as bt
 
+from strategies._precomputed import crossover, line_arrays, moving_averages, rsi_atr
+
 
 class EnhancedMAStrategy(bt.Strategy):
     """增强版双均线交叉策略
@@ -54,20 +56,29 @@ class EnhancedMAStrategy(bt.Strategy):
         self.trail_activated = False
         self.highest_since_entry = None
 
-        # 均线
-        self.sma_short = bt.indicators.SimpleMovingAverage(
-            self.datas[0], period=self.params.short_period
+        # 均线（数据源已预计算同周期均线时直接复用）
+        self.sma_short, self.sma_long = moving_averages(
+            self.datas[0], self.params.short_period, self.params.long_period
         )
-        self.sma_long = bt.indicators.SimpleMovingAverage(
-            self.datas[0], period=self.params.long_period
+        self.crossover = crossover(
+            self.datas[0], self.sma_short, self.sma_long, self.params.short_period, self.params.long_period
         )
-        self.crossover = bt.indicators.CrossOver(self.sma_short, self.sma_long)
 
-        # RSI
-        self.rsi = bt.indicators.RSI(self.datas[0], period=self.params.rsi_period)
+        # RSI / ATR（数据源持有整段数组时一次算出，否则为 Backtrader 指标）
+        self.rsi, self.atr = rsi_atr(self.datas[0], self.params.rsi_period, self.params.atr_period)
+
+        # 逐 K 线用到的参数（取一次存为实例属性，next() 中不再经 params 取值）
+        p = self.params
+        self._atr_sl_mult = p.atr_sl_mult
+        self._atr_tp_mult = p.atr_tp_mult
+        self._trail_atr_mult = p.trail_atr_mult
+        self._rsi_upper = p.rsi_upper
 
-        # ATR
-        self.atr = bt.indicators.ATR(self.datas[0], period=self.params.atr_period)
+        # 仓位公式中的常量部分：风险比例 / 止损倍数（参数在回测期间不变，只算一次）
+        self._risk_per_atr = p.risk_pct / p.atr_sl_mult
+
+        # 收盘价、交叉信号、RSI、ATR 的整段取值（nextstart 中取得；指标非整段预先算完时为 None）
+        self._arrays = None
 
     def log(self, txt: str, dt=None) -> None:
         """日志输出"""
@@ -75,22 +86,22 @@ class EnhancedMAStrategy(bt.Strategy):
             dt = dt or self.datas[0].datetime.date(0)
             print(f"[{dt.isoformat()}] {txt}")
 
-    def _calc_position_size(self) -> int:
+    def _calc_position_size(self, atr: float) -> int:
         """基于 ATR 计算动态仓位大小
 
         根据公式：仓位 = (总资金 × 风险比例) / (ATR × 止损倍数)
         确保每笔交易的最大亏损不超过总资金的 risk_pct。
 
+        Args:
+            atr: 当前 K 线的 ATR
+
         Returns:
             int: 买入的股数/手数（至少为 1）
         """
-        if self.atr[0] <= 0:
+        if atr <= 0:
             return 1
 
-        risk_amount = self.broker.getvalue() * self.params.risk_pct
-        risk_per_unit = self.atr[0] * self.params.atr_sl_mult
-
-        size = int(risk_amount / risk_per_unit)
+        size = int(self.broker.getvalue() * self._risk_per_atr / atr)
         return max(size, 1)
 
     def notify_order(self, order) -> None:
@@ -101,21 +112,23 @@ class EnhancedMAStrategy(bt.Strategy):
         if order.status in [order.Completed]:
             if order.isbuy():
                 self.entry_price = order.executed.price
-                self.stop_price = self.entry_price - self.atr[0] * self.params.atr_sl_mult
+                self.stop_price = self.entry_price - self.atr[0] * self._atr_sl_mult
                 self.highest_since_entry = self.entry_price
                 self.trail_activated = False
-                self.log(
-                    f"✅ 买入 | 价格: {order.executed.price:.2f} | "
-                    f"数量: {order.executed.size:.0f} | "
-                    f"止损: {self.stop_price:.2f} | "
-                    f"ATR: {self.atr[0]:.2f}"
-                )
+                if self.params.printlog:
+                    self.log(
+                        f"✅ 买入 | 价格: {order.executed.price:.2f} | "
+                        f"数量: {order.executed.size:.0f} | "
+                        f"止损: {self.stop_price:.2f} | "
+                        f"ATR: {self.atr[0]:.2f}"
+                    )
             else:
-                pnl = (order.executed.price - self.entry_price) if self.entry_price else 0
-                self.log(
-                    f"✅ 卖出 | 价格: {order.executed.price:.2f} | "
-                    f"单位盈亏: {pnl:.2f}"
-                )
+                if self.params.printlog:
+                    pnl = (order.executed.price - self.entry_price) if self.entry_price else 0
+                    self.log(
+                        f"✅ 卖出 | 价格: {order.executed.price:.2f} | "
+                        f"单位盈亏: {pnl:.2f}"
+                    )
                 self.entry_price = None
                 self.stop_price = None
                 self.highest_since_entry = None
@@ -128,10 +141,16 @@ class EnhancedMAStrategy(bt.Strategy):
 
     def notify_trade(self, trade) -> None:
         """交易完成回调"""
-        if not trade.isclosed:
+        # 不打印日志时直接返回，免去逐笔格式化日志字符串
+        if not trade.isclosed or not self.params.printlog:
             return
         self.log(f"💰 交易闭合 | 毛利: {trade.pnl:.2f} | 净利: {trade.pnlcomm:.2f}")
 
+    def nextstart(self) -> None:
+        """首根通过预热期的 K 线：取出各数据线的整段取值，之后 next() 按下标读取"""
+        self._arrays = line_arrays(self, self.dataclose, self.crossover, self.rsi, self.atr)
+        self.next()
+
     def next(self) -> None:
         """策略主逻辑
 
@@ -141,7 +160,11 @@ class EnhancedMAStrategy(bt.Strategy):
         if self.order:
             return
 
-        current_price = self.dataclose[0]
+        if self._arrays is not None:
+            i = len(self) - 1
+            current_price, cross, rsi, atr = (a[i] for a in self._arrays)
+        else:
+            current_price, cross, rsi, atr = self.dataclose[0], self.crossover[0], self.rsi[0], self.atr[0]
 
         if self.position:
             # --- 持仓管理 ---
@@ -154,52 +177,57 @@ class EnhancedMAStrategy(bt.Strategy):
             if (self.entry_price is not None and self.highest_since_entry is not None
                     and not self.trail_activated):
                 profit_distance = self.highest_since_entry - self.entry_price
-                if profit_distance >= self.atr[0] * self.params.atr_tp_mult:
+                if profit_distance >= atr * self._atr_tp_mult:
                     self.trail_activated = True
-                    self.log(f"🔄 移动止盈已激活 | 最高价: {self.highest_since_entry:.2f}")
+                    if self.params.printlog:
+                        self.log(f"🔄 移动止盈已激活 | 最高价: {self.highest_since_entry:.2f}")
 
             # 移动止盈：更新止损线
             if self.trail_activated:
-                trail_stop = self.highest_since_entry - self.atr[0] * self.params.trail_atr_mult
+                trail_stop = self.highest_since_entry - atr * self._trail_atr_mult
                 if trail_stop > self.stop_price:
                     self.stop_price = trail_stop
 
             # 触及止损 → 平仓
             if self.stop_price is not None and current_price <= self.stop_price:
-                self.log(
-                    f"🛑 止损触发 | 价格: {current_price:.2f} | "
-                    f"止损线: {self.stop_price:.2f} | "
-                    f"{'移动止盈' if self.trail_activated else '固定止损'}"
-                )
+                if self.params.printlog:
+                    self.log(
+                        f"🛑 止损触发 | 价格: {current_price:.2f} | "
+                        f"止损线: {self.stop_price:.2f} | "
+                        f"{'移动止盈' if self.trail_activated else '固定止损'}"
+                    )
                 self.order = self.close()
                 return
 
             # 死叉 → 平仓
-            if self.crossover < 0:
-                self.log(
-                    f"📉 死叉平仓 | 价格: {current_price:.2f} | "
-                    f"短MA: {self.sma_short[0]:.2f} | 长MA: {self.sma_long[0]:.2f}"
-                )
+            if cross < 0:
+                if self.params.printlog:
+                    self.log(
+                        f"📉 死叉平仓 | 价格: {current_price:.2f} | "
+                        f"短MA: {self.sma_short[0]:.2f} | 长MA: {self.sma_long[0]:.2f}"
+                    )
                 self.order = self.close()
 
         else:
             # --- 开仓判断 ---
 
             # 金叉 + RSI 过滤
-            if self.crossover > 0 and self.rsi[0] > self.params.rsi_upper:
-                size = self._calc_position_size()
-                self.log(
-                    f"📈 开仓信号 | 价格: {current_price:.2f} | "
-                    f"RSI: {self.rsi[0]:.1f} | ATR: {self.atr[0]:.2f} | "
-                    f"仓位: {size}"
-                )
+            if cross > 0 and rsi > self._rsi_upper:
+                size = self._calc_position_size(atr)
+                if self.params.printlog:
+                    self.log(
+                        f"📈 开仓信号 | 价格: {current_price:.2f} | "
+                        f"RSI: {rsi:.1f} | ATR: {atr:.2f} | "
+                        f"仓位: {size}"
+                    )
                 self.order = self.buy(size=size)
 
-            elif self.crossover > 0:
-                self.log(
-                    f"🚫 金叉但 RSI 不满足 ({self.rsi[0]:.1f} < {self.params.rsi_upper}) | "
-                    f"跳过开仓"
-                )
+            elif cross > 0:
+                if self.params.printlog:
+                    self.log(
+                        f"🚫 金叉但 RSI 不满足 ({rsi:.1f} < {self.params.rsi_upper}) | "
+                        f"跳过开仓"
+                    )
 
     def stop(self) -> None:
         """回测结束汇总"""
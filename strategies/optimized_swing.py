@@ -12,6 +12,12 @@ optimized_swing.py - 优化版中长期波段策略
 """
 
 import backtrader as bt
+import numpy as np
+
+from strategies._precomputed import adx_dmi, crossover, line_arrays, macd_histogram, moving_averages, rsi_atr
+
+# 趋势衰竭检查使用的短均线斜率回看周期
+EXHAUSTION_SLOPE_PERIOD = 10
 
 
 class OptimizedSwingStrategy(bt.Strategy):
@@ -82,30 +88,45 @@ class OptimizedSwingStrategy(bt.Strategy):
         self.last_exit_bar = -999
         self.initial_size = 0
 
-        # 均线
-        self.sma_short = bt.indicators.SMA(self.datas[0], period=self.params.short_period)
-        self.sma_long = bt.indicators.SMA(self.datas[0], period=self.params.long_period)
-        self.crossover = bt.indicators.CrossOver(self.sma_short, self.sma_long)
-
-        # RSI
-        self.rsi = bt.indicators.RSI(self.datas[0], period=self.params.rsi_period)
-
-        # ADX + DMI
-        self.adx = bt.indicators.ADX(self.datas[0], period=self.params.adx_period)
-        self.plus_di = bt.indicators.PlusDI(self.datas[0], period=self.params.adx_period)
-        self.minus_di = bt.indicators.MinusDI(self.datas[0], period=self.params.adx_period)
-
-        # MACD
-        self.macd = bt.indicators.MACD(
-            self.datas[0],
-            period_me1=self.params.macd_fast,
-            period_me2=self.params.macd_slow,
-            period_signal=self.params.macd_signal,
+        # 逐 K 线用到的参数（取一次存为实例属性，next() 中不再经 params 取值）
+        p = self.params
+        self._atr_sl_mult = p.atr_sl_mult
+        self._atr_tp1_mult = p.atr_tp1_mult
+        self._tp1_close_pct = p.tp1_close_pct
+        self._trail_atr_mult = p.trail_atr_mult
+        self._risk_pct = p.risk_pct
+        self._max_ma_spread = p.max_ma_spread
+        self._reentry_cooldown = p.reentry_cooldown
+        self._adx_threshold = p.adx_threshold
+        self._rsi_long_min = p.rsi_long_min
+        self._rsi_short_max = p.rsi_short_max
+        self._enable_short = p.enable_short
+        self._slope_period = p.slope_period
+
+        # 均线（数据源已预计算同周期均线时直接复用）
+        self.sma_short, self.sma_long = moving_averages(
+            self.datas[0], self.params.short_period, self.params.long_period
+        )
+        self.crossover = crossover(
+            self.datas[0], self.sma_short, self.sma_long, self.params.short_period, self.params.long_period
+        )
+
+        # RSI / ADX + DMI / MACD 柱 / ATR（数据源持有整段数组时一次算出，否则为 Backtrader 指标）
+        self.rsi, self.atr = rsi_atr(self.datas[0], self.params.rsi_period, self.params.atr_period)
+        self.adx, self.plus_di, self.minus_di = adx_dmi(self.datas[0], self.params.adx_period)
+        self.macd_hist = macd_histogram(
+            self.datas[0], self.params.macd_fast, self.params.macd_slow, self.params.macd_signal
         )
-        self.macd_hist = self.macd.macd - self.macd.signal
 
-        # ATR
-        self.atr = bt.indicators.ATR(self.datas[0], period=self.params.atr_period)
+        # next() 逐 K 线读取的数据线，及其整段取值（nextstart 中取得；指标非整段预先算完时为 None）
+        self._lines = (self.dataclose, self.datahigh, self.datalow, self.sma_short, self.sma_long,
+                       self.crossover, self.rsi, self.adx, self.plus_di, self.minus_di,
+                       self.macd_hist, self.atr)
+        self._arrays = None
+        # 短均线斜率整段取值 {回看周期: 列表}（nextstart 中由均线整段取值一次算出）
+        self._slopes = None
+        # 第一止盈、移动止损距离（ATR × 倍数）的整段取值（nextstart 中由 ATR 整段取值一次算出）
+        self._atr_dists = None
 
     def log(self, txt, dt=None):
         if self.params.printlog:
@@ -113,26 +134,39 @@ class OptimizedSwingStrategy(bt.Strategy):
             print(f"[{dt.isoformat()}] {txt}")
 
     # ── 斜率计算 ──
-    def _ma_slope(self, ma, period=None):
-        """均线斜率（百分比/bar）"""
-        p = period or self.params.slope_period
+    @staticmethod
+    def _slope_values(ma, period):
+        """均线整段斜率（百分比/bar），下标为 K 线序号；前 period 根及回看值为 0 时为 0"""
+        ma = np.asarray(ma)
+        out = np.zeros(len(ma))
+        prev, cur = ma[:-period], ma[period:]
+        with np.errstate(divide="ignore", invalid="ignore"):
+            out[period:] = np.where(prev == 0, 0.0, (cur - prev) / prev * 100 / period)
+        return out.tolist()
+
+    def _ma_slope(self, period=None, i=None):
+        """短均线斜率（百分比/bar），i 为当前 K 线下标（缺省时取 len(self) - 1）"""
+        p = period or self._slope_period
+        if self._slopes is not None:
+            return self._slopes[p][len(self) - 1 if i is None else i]
+        ma = self.sma_short
         if len(ma) <= p or ma[-p] == 0:
             return 0
         return (ma[0] - ma[-p]) / ma[-p] * 100 / p
 
     # ── 均线偏离度 ──
-    def _ma_spread_pct(self):
+    def _ma_spread_pct(self, sma_short, sma_long):
         """短均线与长均线偏离百分比"""
-        if self.sma_long[0] == 0:
+        if sma_long == 0:
             return 0
-        return (self.sma_short[0] - self.sma_long[0]) / self.sma_long[0] * 100
+        return (sma_short - sma_long) / sma_long * 100
 
     # ── 动态仓位 ──
-    def _calc_size(self):
-        if self.atr[0] <= 0:
+    def _calc_size(self, atr):
+        if atr <= 0:
             return 1
-        risk_amount = self.broker.getvalue() * self.params.risk_pct
-        risk_per_unit = self.atr[0] * self.params.atr_sl_mult
+        risk_amount = self.broker.getvalue() * self._risk_pct
+        risk_per_unit = atr * self._atr_sl_mult
         return max(int(risk_amount / risk_per_unit), 1)
 
     # ── 订单回调 ──
@@ -142,10 +176,11 @@ class OptimizedSwingStrategy(bt.Strategy):
 
         if order.status == order.Completed:
             action = "买入" if order.isbuy() else "卖出"
-            self.log(
-                f"✅ {action} | 价: {order.executed.price:.2f} | "
-                f"量: {order.executed.size:.0f}"
-            )
+            if self.params.printlog:
+                self.log(
+                    f"✅ {action} | 价: {order.executed.price:.2f} | "
+                    f"量: {order.executed.size:.0f}"
+                )
 
             # 入场
             if (self.direction == 0 or
@@ -160,14 +195,15 @@ class OptimizedSwingStrategy(bt.Strategy):
                     self.extreme_since_entry = order.executed.price
 
                     if self.direction == 1:
-                        self.stop_price = self.entry_price - self.atr[0] * self.params.atr_sl_mult
+                        self.stop_price = self.entry_price - self.atr[0] * self._atr_sl_mult
                     elif self.direction == -1:
-                        self.stop_price = self.entry_price + self.atr[0] * self.params.atr_sl_mult
+                        self.stop_price = self.entry_price + self.atr[0] * self._atr_sl_mult
 
-                    self.log(
-                        f"  → 方向: {'多' if self.direction == 1 else '空'} | "
-                        f"止损: {self.stop_price:.2f} | ADX: {self.adx[0]:.1f}"
-                    )
+                    if self.params.printlog:
+                        self.log(
+                            f"  → 方向: {'多' if self.direction == 1 else '空'} | "
+                            f"止损: {self.stop_price:.2f} | ADX: {self.adx[0]:.1f}"
+                        )
 
         elif order.status in [order.Canceled, order.Margin, order.Rejected]:
             self.log("⚠️ 订单异常")
@@ -177,11 +213,13 @@ class OptimizedSwingStrategy(bt.Strategy):
     def notify_trade(self, trade):
         if not trade.isclosed:
             return
-        hold = len(self) - self.entry_bar if self.entry_bar else 0
-        self.log(
-            f"💰 平仓 | 方向: {'多' if self.direction == 1 else '空'} | "
-            f"持仓: {hold} bars | 净利: {trade.pnlcomm:.2f}"
-        )
+        # 日志字符串只在打印时格式化
+        if self.params.printlog:
+            hold = len(self) - self.entry_bar if self.entry_bar else 0
+            self.log(
+                f"💰 平仓 | 方向: {'多' if self.direction == 1 else '空'} | "
+                f"持仓: {hold} bars | 净利: {trade.pnlcomm:.2f}"
+            )
         self.last_exit_bar = len(self)
         self._reset_state()
 
@@ -196,44 +234,71 @@ class OptimizedSwingStrategy(bt.Strategy):
         self.initial_size = 0
 
     # ── 主逻辑 ──
+    def nextstart(self):
+        """首根通过预热期的 K 线：取出各数据线的整段取值，之后 next() 按下标读取"""
+        self._arrays = line_arrays(self, *self._lines)
+        if self._arrays is not None:
+            sma_short = self._arrays[3]
+            self._slopes = {p: self._slope_values(sma_short, p)
+                            for p in (self._slope_period, EXHAUSTION_SLOPE_PERIOD)}
+            atr = np.asarray(self._arrays[-1])
+            self._atr_dists = ((atr * self._atr_tp1_mult).tolist(),
+                               (atr * self._trail_atr_mult).tolist())
+        self.next()
+
     def next(self):
         if self.order:
             return
 
-        price = self.dataclose[0]
+        bar = len(self)
+        i = bar - 1
+        if self._arrays is not None:
+            (price, high, low, sma_short, sma_long, cross, rsi, adx, plus_di, minus_di,
+             macd_hist, atr) = (a[i] for a in self._arrays)
+        else:
+            (price, high, low, sma_short, sma_long, cross, rsi, adx, plus_di, minus_di,
+             macd_hist, atr) = (line[0] for line in self._lines)
 
         if self.position:
-            self._manage_position(price)
+            if self._atr_dists is not None:
+                tp1_dist, trail_dist = (d[i] for d in self._atr_dists)
+            else:
+                tp1_dist = atr * self._atr_tp1_mult
+                trail_dist = atr * self._trail_atr_mult
+            self._manage_position(price, high, low, sma_short, atr, tp1_dist, trail_dist, bar)
         else:
-            self._check_entry(price)
+            self._check_entry(price, sma_short, sma_long, cross, rsi, adx, plus_di, minus_di,
+                              macd_hist, atr, bar)
 
-    def _manage_position(self, price):
-        """持仓管理"""
-        # 更新极值
+    def _manage_position(self, price, high, low, sma_short, atr, tp1_dist, trail_dist, bar):
+        """持仓管理
+
+        tp1_dist / trail_dist 为当前 K 线的 ATR × 第一止盈 / 移动止损倍数，bar 为 len(self)。
+        """
+        # 更新极值（开仓成交时已初始化为成交价）
         if self.direction == 1:
-            self.extreme_since_entry = max(self.extreme_since_entry or price,
-                                            self.datahigh[0])
+            if high > self.extreme_since_entry:
+                self.extreme_since_entry = high
             float_pnl = price - self.entry_price
         else:
-            self.extreme_since_entry = min(self.extreme_since_entry or price,
-                                            self.datalow[0])
+            if low < self.extreme_since_entry:
+                self.extreme_since_entry = low
             float_pnl = self.entry_price - price
 
-        atr = self.atr[0]
-
         # ── 第一止盈：到达 tp1 目标，平仓50% ──
         if not self.tp1_done and atr > 0:
-            if float_pnl >= atr * self.params.atr_tp1_mult:
-                close_size = max(int(self.initial_size * self.params.tp1_close_pct), 1)
+            if float_pnl >= tp1_dist:
+                close_size = max(int(self.initial_size * self._tp1_close_pct), 1)
                 current_size = abs(self.position.size)
                 close_size = min(close_size, current_size - 1) if current_size > 1 else 0
 
                 if close_size > 0:
                     self.tp1_done = True
-                    self.log(
-                        f"🎯 第一止盈 | 平仓 {close_size} 手 | "
-                        f"浮盈: {float_pnl:.2f}"
-                    )
+                    if self.params.printlog:
+                        self.log(
+                            f"🎯 第一止盈 | 平仓 {close_size} 手 | "
+                            f"浮盈: {float_pnl:.2f}"
+                        )
                     if self.direction == 1:
                         self.order = self.sell(size=close_size)
                     else:
@@ -247,11 +312,11 @@ class OptimizedSwingStrategy(bt.Strategy):
         # ── 移动止盈 ──
         if self.trail_activated and atr > 0:
             if self.direction == 1:
-                new_stop = self.extreme_since_entry - atr * self.params.trail_atr_mult
+                new_stop = self.extreme_since_entry - trail_dist
                 if new_stop > self.stop_price:
                     self.stop_price = new_stop
             else:
-                new_stop = self.extreme_since_entry + atr * self.params.trail_atr_mult
+                new_stop = self.extreme_since_entry + trail_dist
                 if new_stop < self.stop_price:
                     self.stop_price = new_stop
 
@@ -264,95 +329,105 @@ class OptimizedSwingStrategy(bt.Strategy):
                 triggered = True
 
             if triggered:
-                hold = len(self) - self.entry_bar if self.entry_bar else 0
-                sl_type = "移动止盈" if self.trail_activated else "固定止损"
-                self.log(
-                    f"🛑 {sl_type} | 价: {price:.2f} | "
-                    f"止损线: {self.stop_price:.2f} | 持仓: {hold} bars"
-                )
+                if self.params.printlog:
+                    hold = bar - self.entry_bar if self.entry_bar else 0
+                    sl_type = "移动止盈" if self.trail_activated else "固定止损"
+                    self.log(
+                        f"🛑 {sl_type} | 价: {price:.2f} | "
+                        f"止损线: {self.stop_price:.2f} | 持仓: {hold} bars"
+                    )
                 self.order = self.close()
                 return
 
         # ── 趋势衰竭检查（仅在持仓一段时间后） ──
-        hold = len(self) - self.entry_bar if self.entry_bar else 0
+        hold = bar - self.entry_bar if self.entry_bar else 0
         if hold > 20:  # 至少持仓20天后才检查
-            short_slope = self._ma_slope(self.sma_short, period=10)
+            short_slope = self._ma_slope(EXHAUSTION_SLOPE_PERIOD, bar - 1)
             if self.direction == 1 and short_slope < -0.1:
                 # 多头：短均线明确下弯且价格跌破短均线
-                if price < self.sma_short[0]:
-                    self.log(
-                        f"📉 趋势衰竭平仓 | 均线斜率: {short_slope:.3f}%/bar | "
-                        f"持仓: {hold} bars"
-                    )
+                if price < sma_short:
+                    if self.params.printlog:
+                        self.log(
+                            f"📉 趋势衰竭平仓 | 均线斜率: {short_slope:.3f}%/bar | "
+                            f"持仓: {hold} bars"
+                        )
                     self.order = self.close()
             elif self.direction == -1 and short_slope > 0.1:
                 # 空头：短均线明确上弯且价格涨破短均线
-                if price > self.sma_short[0]:
-                    self.log(
-                        f"📈 趋势衰竭平空 | 均线斜率: {short_slope:.3f}%/bar | "
-                        f"持仓: {hold} bars"
-                    )
+                if price > sma_short:
+                    if self.params.printlog:
+                        self.log(
+                            f"📈 趋势衰竭平空 | 均线斜率: {short_slope:.3f}%/bar | "
+                            f"持仓: {hold} bars"
+                        )
                     self.order = self.close()
 
-    def _check_entry(self, price):
-        """入场检查"""
+    def _check_entry(self, price, sma_short, sma_long, cross, rsi, adx, plus_di, minus_di,
+                     macd_hist, atr, bar):
+        """入场检查（bar 为 len(self)）"""
         # 冷却期
-        if len(self) - self.last_exit_bar < self.params.reentry_cooldown:
+        if bar - self.last_exit_bar < self._reentry_cooldown:
             return
 
-        spread = self._ma_spread_pct()
-        short_slope = self._ma_slope(self.sma_short)
+        # 绝大多数 K 线没有交叉信号，直接返回；偏离度只在出现信号时计算
+        if cross == 0 or (cross < 0 and not self._enable_short):
+            return
+
+        spread = self._ma_spread_pct(sma_short, sma_long)
 
         # ── 做多 ──
-        if self.crossover > 0:
+        if cross > 0:
             # 检查偏离度（避免追高）
-            if abs(spread) > self.params.max_ma_spread:
-                self.log(f"🚫 金叉但偏离过大 ({spread:.1f}%)")
+            if abs(spread) > self._max_ma_spread:
+                if self.params.printlog:
+                    self.log(f"🚫 金叉但偏离过大 ({spread:.1f}%)")
                 return
             # RSI
-            if self.rsi[0] < self.params.rsi_long_min:
+            if rsi < self._rsi_long_min:
                 return
             # ADX
-            if self.adx[0] < self.params.adx_threshold:
+            if adx < self._adx_threshold:
                 return
             # DMI
-            if self.plus_di[0] <= self.minus_di[0]:
+            if plus_di <= minus_di:
                 return
 
             # 全部条件满足 → 做多
-            size = self._calc_size()
+            size = self._calc_size(atr)
             self.direction = 1
-            self.log(
-                f"📈 做多 | 价: {price:.2f} | RSI: {self.rsi[0]:.1f} | "
-                f"ADX: {self.adx[0]:.1f} | MACD柱: {self.macd_hist[0]:.2f} | "
-                f"斜率: {short_slope:.3f}%/bar | 仓位: {size}"
-            )
+            if self.params.printlog:
+                self.log(
+                    f"📈 做多 | 价: {price:.2f} | RSI: {rsi:.1f} | "
+                    f"ADX: {adx:.1f} | MACD柱: {macd_hist:.2f} | "
+                    f"斜率: {self._ma_slope():.3f}%/bar | 仓位: {size}"
+                )
             self.order = self.buy(size=size)
 
         # ── 做空 ──
-        elif self.crossover < 0 and self.params.enable_short:
-            if abs(spread) > self.params.max_ma_spread:
+        elif cross < 0 and self._enable_short:
+            if abs(spread) > self._max_ma_spread:
                 return
             # RSI
-            if self.rsi[0] > self.params.rsi_short_max:
+            if rsi > self._rsi_short_max:
                 return
             # ADX
-            if self.adx[0] < self.params.adx_threshold:
+            if adx < self._adx_threshold:
                 return
             # DMI
-            if self.minus_di[0] <= self.plus_di[0]:
+            if minus_di <= plus_di:
                 return
             # MACD 柱状图下降（做空额外确认）
-            if self.macd_hist[0] >= 0:
+            if macd_hist >= 0:
                 return
 
-            size = self._calc_size()
+            size = self._calc_size(atr)
             self.direction = -1
-            self.log(
-                f"📉 做空 | 价: {price:.2f} | RSI: {self.rsi[0]:.1f} | "
-                f"ADX: {self.adx[0]:.1f} | MACD柱: {self.macd_hist[0]:.2f} | "
-                f"斜率: {short_slope:.3f}%/bar | 仓位: {size}"
-            )
+            if self.params.printlog:
+                self.log(
+                    f"📉 做空 | 价: {price:.2f} | RSI: {rsi:.1f} | "
+                    f"ADX: {adx:.1f} | MACD柱: {macd_hist:.2f} | "
+                    f"斜率: {self._ma_slope():.3f}%/bar | 仓位: {size}"
+                )
             self.order = self.sell(size=size)
 
     def stop(self):
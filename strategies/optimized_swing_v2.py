@@ -12,6 +12,8 @@ optimized_swing_v2.py - 优化版波段策略 V2
 
 import backtrader as bt
 
+from strategies._precomputed import crossover, moving_averages
+
 
 class OptimizedSwingV2(bt.Strategy):
     """优化波段策略 V2
@@ -62,10 +64,27 @@ class OptimizedSwingV2(bt.Strategy):
         self.extreme_since_entry = None
         self.last_exit_bar = -999
 
-        # 均线
-        self.sma_short = bt.indicators.SMA(self.datas[0], period=self.params.short_period)
-        self.sma_long = bt.indicators.SMA(self.datas[0], period=self.params.long_period)
-        self.crossover = bt.indicators.CrossOver(self.sma_short, self.sma_long)
+        # 逐 K 线用到的参数（取一次存为实例属性，next() 中不再经 params 取值）
+        p = self.params
+        self._atr_sl_mult = p.atr_sl_mult
+        self._trail_atr_mult = p.trail_atr_mult
+        self._risk_pct = p.risk_pct
+        self._max_ma_spread = p.max_ma_spread
+        self._reentry_cooldown = p.reentry_cooldown
+        self._adx_threshold = p.adx_threshold
+        self._rsi_long_min = p.rsi_long_min
+        self._rsi_short_max = p.rsi_short_max
+        self._enable_short = p.enable_short
+        self._breakeven_trigger = p.breakeven_trigger
+        self._atr_trail_trigger = p.atr_trail_trigger
+
+        # 均线（数据源已预计算同周期均线时直接复用）
+        self.sma_short, self.sma_long = moving_averages(
+            self.datas[0], self.params.short_period, self.params.long_period
+        )
+        self.crossover = crossover(
+            self.datas[0], self.sma_short, self.sma_long, self.params.short_period, self.params.long_period
+        )
 
         # RSI
         self.rsi = bt.indicators.RSI(self.datas[0], period=self.params.rsi_period)
@@ -100,8 +119,8 @@ class OptimizedSwingV2(bt.Strategy):
     def _calc_size(self):
         if self.atr[0] <= 0:
             return 1
-        risk_amount = self.broker.getvalue() * self.params.risk_pct
-        risk_per_unit = self.atr[0] * self.params.atr_sl_mult
+        risk_amount = self.broker.getvalue() * self._risk_pct
+        risk_per_unit = self.atr[0] * self._atr_sl_mult
         return max(int(risk_amount / risk_per_unit), 1)
 
     def _reset_state(self):
@@ -127,17 +146,18 @@ class OptimizedSwingV2(bt.Strategy):
                 self.trail_activated = False
 
                 if self.direction == 1:
-                    self.stop_price = self.entry_price - self.atr[0] * self.params.atr_sl_mult
+                    self.stop_price = self.entry_price - self.atr[0] * self._atr_sl_mult
                 elif self.direction == -1:
-                    self.stop_price = self.entry_price + self.atr[0] * self.params.atr_sl_mult
+                    self.stop_price = self.entry_price + self.atr[0] * self._atr_sl_mult
 
-                self.log(
-                    f"✅ {'买入' if order.isbuy() else '卖空'} | "
-                    f"价: {order.executed.price:.2f} | "
-                    f"量: {abs(order.executed.size):.0f} | "
-                    f"止损: {self.stop_price:.2f} | "
-                    f"ADX: {self.adx[0]:.1f}"
-                )
+                if self.params.printlog:
+                    self.log(
+                        f"✅ {'买入' if order.isbuy() else '卖空'} | "
+                        f"价: {order.executed.price:.2f} | "
+                        f"量: {abs(order.executed.size):.0f} | "
+                        f"止损: {self.stop_price:.2f} | "
+                        f"ADX: {self.adx[0]:.1f}"
+                    )
 
         elif order.status in [order.Canceled, order.Margin, order.Rejected]:
             self.log("⚠️ 订单异常")
@@ -147,12 +167,14 @@ class OptimizedSwingV2(bt.Strategy):
     def notify_trade(self, trade):
         if not trade.isclosed:
             return
-        hold = len(self) - self.entry_bar if self.entry_bar else 0
-        d = "多" if self.direction == 1 else "空"
-        self.log(
-            f"💰 平仓 | {d} | 持仓: {hold} bars | "
-            f"净利: {trade.pnlcomm:.2f}"
-        )
+        # 日志字符串只在打印时格式化
+        if self.params.printlog:
+            hold = len(self) - self.entry_bar if self.entry_bar else 0
+            d = "多" if self.direction == 1 else "空"
+            self.log(
+                f"💰 平仓 | {d} | 持仓: {hold} bars | "
+                f"净利: {trade.pnlcomm:.2f}"
+            )
         self.last_exit_bar = len(self)
         self._reset_state()
 
@@ -171,38 +193,42 @@ class OptimizedSwingV2(bt.Strategy):
         """三阶段止损管理"""
         atr = self.atr[0]
 
-        # 更新极值
+        # 更新极值（开仓成交时已初始化为成交价）
         if self.direction == 1:
-            self.extreme_since_entry = max(
-                self.extreme_since_entry or price, self.datahigh[0])
+            high = self.datahigh[0]
+            if high > self.extreme_since_entry:
+                self.extreme_since_entry = high
             float_pnl = price - self.entry_price
         else:
-            self.extreme_since_entry = min(
-                self.extreme_since_entry or price, self.datalow[0])
+            low = self.datalow[0]
+            if low < self.extreme_since_entry:
+                self.extreme_since_entry = low
             float_pnl = self.entry_price - price
 
         # ── 阶段1 → 阶段2: 保本止损 ──
         if not self.breakeven_done and atr > 0:
-            if float_pnl >= atr * self.params.breakeven_trigger:
+            if float_pnl >= atr * self._breakeven_trigger:
                 self.breakeven_done = True
                 if self.direction == 1:
                     self.stop_price = max(self.stop_price, self.entry_price)
                 else:
                     self.stop_price = min(self.stop_price, self.entry_price)
-                self.log(f"🔒 止损移至保本 | 浮盈: {float_pnl:.2f}")
+                if self.params.printlog:
+                    self.log(f"🔒 止损移至保本 | 浮盈: {float_pnl:.2f}")
 
         # ── 阶段2 → 阶段3: 移动跟踪 ──
         if not self.trail_activated and atr > 0:
-            if float_pnl >= atr * self.params.atr_trail_trigger:
+            if float_pnl >= atr * self._atr_trail_trigger:
                 self.trail_activated = True
-                self.log(f"🔄 移动止盈激活 | 浮盈: {float_pnl:.2f}")
+                if self.params.printlog:
+                    self.log(f"🔄 移动止盈激活 | 浮盈: {float_pnl:.2f}")
 
         if self.trail_activated and atr > 0:
             if self.direction == 1:
-                new_stop = self.extreme_since_entry - atr * self.params.trail_atr_mult
+                new_stop = self.extreme_since_entry - atr * self._trail_atr_mult
                 self.stop_price = max(self.stop_price, new_stop)
             else:
-                new_stop = self.extreme_since_entry + atr * self.params.trail_atr_mult
+                new_stop = self.extreme_since_entry + atr * self._trail_atr_mult
                 self.stop_price = min(self.stop_price, new_stop)
 
         # ── 止损触发 ──
@@ -213,12 +239,13 @@ class OptimizedSwingV2(bt.Strategy):
             triggered = True
 
         if triggered:
-            hold = len(self) - self.entry_bar if self.entry_bar else 0
-            phase = "移动止盈" if self.trail_activated else ("保本止损" if self.breakeven_done else "固定止损")
-            self.log(
-                f"🛑 {phase} | 价: {price:.2f} | "
-                f"止损线: {self.stop_price:.2f} | 持仓: {hold} bars"
-            )
+            if self.params.printlog:
+                hold = len(self) - self.entry_bar if self.entry_bar else 0
+                phase = "移动止盈" if self.trail_activated else ("保本止损" if self.breakeven_done else "固定止损")
+                self.log(
+                    f"🛑 {phase} | 价: {price:.2f} | "
+                    f"止损线: {self.stop_price:.2f} | 持仓: {hold} bars"
+                )
             self.order = self.close()
             return
 
@@ -227,54 +254,62 @@ class OptimizedSwingV2(bt.Strategy):
             # 死叉：短MA必须明确低于长MA
             gap = self._ma_spread_pct()
             if gap < -0.5:
-                hold = len(self) - self.entry_bar if self.entry_bar else 0
-                self.log(
-                    f"📉 死叉平仓 | MA差: {gap:.2f}% | 持仓: {hold} bars"
-                )
+                if self.params.printlog:
+                    hold = len(self) - self.entry_bar if self.entry_bar else 0
+                    self.log(
+                        f"📉 死叉平仓 | MA差: {gap:.2f}% | 持仓: {hold} bars"
+                    )
                 self.order = self.close()
         elif self.direction == -1 and self.crossover > 0:
             gap = self._ma_spread_pct()
             if gap > 0.5:
-                hold = len(self) - self.entry_bar if self.entry_bar else 0
-                self.log(
-                    f"📈 金叉平空 | MA差: {gap:.2f}% | 持仓: {hold} bars"
-                )
+                if self.params.printlog:
+                    hold = len(self) - self.entry_bar if self.entry_bar else 0
+                    self.log(
+                        f"📈 金叉平空 | MA差: {gap:.2f}% | 持仓: {hold} bars"
+                    )
                 self.order = self.close()
 
     def _check_entry(self, price):
         """入场"""
-        if len(self) - self.last_exit_bar < self.params.reentry_cooldown:
+        if len(self) - self.last_exit_bar < self._reentry_cooldown:
+            return
+
+        # 绝大多数 K 线没有交叉信号，直接返回；偏离度只在出现信号时计算
+        cross = self.crossover[0]
+        if cross == 0 or (cross < 0 and not self._enable_short):
             return
 
         spread = self._ma_spread_pct()
 
         # ── 做多 ──
-        if self.crossover > 0:
-            if abs(spread) > self.params.max_ma_spread:
+        if cross > 0:
+            if abs(spread) > self._max_ma_spread:
                 return
-            if self.rsi[0] < self.params.rsi_long_min:
+            if self.rsi[0] < self._rsi_long_min:
                 return
-            if self.adx[0] < self.params.adx_threshold:
+            if self.adx[0] < self._adx_threshold:
                 return
             if self.plus_di[0] <= self.minus_di[0]:
                 return
 
             size = self._calc_size()
             self.direction = 1
-            self.log(
-                f"📈 做多 | 价: {price:.2f} | RSI: {self.rsi[0]:.1f} | "
-                f"ADX: {self.adx[0]:.1f} | +DI: {self.plus_di[0]:.1f} | "
-                f"仓位: {size}"
-            )
+            if self.params.printlog:
+                self.log(
+                    f"📈 做多 | 价: {price:.2f} | RSI: {self.rsi[0]:.1f} | "
+                    f"ADX: {self.adx[0]:.1f} | +DI: {self.plus_di[0]:.1f} | "
+                    f"仓位: {size}"
+                )
             self.order = self.buy(size=size)
 
         # ── 做空 ──
-        elif self.crossover < 0 and self.params.enable_short:
-            if abs(spread) > self.params.max_ma_spread:
+        elif cross < 0 and self._enable_short:
+            if abs(spread) > self._max_ma_spread:
                 return
-            if self.rsi[0] > self.params.rsi_short_max:
+            if self.rsi[0] > self._rsi_short_max:
                 return
-            if self.adx[0] < self.params.adx_threshold:
+            if self.adx[0] < self._adx_threshold:
                 return
             if self.minus_di[0] <= self.plus_di[0]:
                 return
@@ -284,11 +319,12 @@ class OptimizedSwingV2(bt.Strategy):
 
             size = self._calc_size()
             self.direction = -1
-            self.log(
-                f"📉 做空 | 价: {price:.2f} | RSI: {self.rsi[0]:.1f} | "
-                f"ADX: {self.adx[0]:.1f} | -DI: {self.minus_di[0]:.1f} | "
-                f"MACD: {self.macd_hist[0]:.2f} | 仓位: {size}"
-            )
+            if self.params.printlog:
+                self.log(
+                    f"📉 做空 | 价: {price:.2f} | RSI: {self.rsi[0]:.1f} | "
+                    f"ADX: {self.adx[0]:.1f} | -DI: {self.minus_di[0]:.1f} | "
+                    f"MACD: {self.macd_hist[0]:.2f} | 仓位: {size}"
+                )
             self.order = self.sell(size=size)
 
     def stop(self):
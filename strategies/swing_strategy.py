@@ -10,6 +10,9 @@ swing_strategy.py - 中长期波段策略（目标持仓 3-6 个月）
 """
 
 import backtrader as bt
+import numpy as np
+
+from strategies._precomputed import adx_dmi, crossover, line_arrays, moving_averages, rsi_atr
 
 
 class SwingStrategy(bt.Strategy):
@@ -62,45 +65,47 @@ class SwingStrategy(bt.Strategy):
         self.highest_since_entry = None
         self.last_exit_bar = -999
 
-        # 均线
-        self.sma_short = bt.indicators.SimpleMovingAverage(
-            self.datas[0], period=self.params.short_period
-        )
-        self.sma_long = bt.indicators.SimpleMovingAverage(
-            self.datas[0], period=self.params.long_period
+        # 逐 K 线用到的参数（取一次存为实例属性，next() 中不再经 params 取值）
+        p = self.params
+        self._atr_sl_mult = p.atr_sl_mult
+        self._atr_tp_mult = p.atr_tp_mult
+        self._trail_atr_mult = p.trail_atr_mult
+        self._risk_pct = p.risk_pct
+        self._rsi_upper = p.rsi_upper
+        self._adx_threshold = p.adx_threshold
+        self._reentry_cooldown = p.reentry_cooldown
+
+        # 均线（数据源已预计算同周期均线时直接复用）
+        self.sma_short, self.sma_long = moving_averages(
+            self.datas[0], self.params.short_period, self.params.long_period
         )
-        self.crossover = bt.indicators.CrossOver(self.sma_short, self.sma_long)
-
-        # RSI —— 慢速
-        self.rsi = bt.indicators.RSI(self.datas[0], period=self.params.rsi_period)
-
-        # ADX —— 趋势强度
-        self.adx = bt.indicators.AverageDirectionalMovementIndex(
-            self.datas[0], period=self.params.adx_period
+        self.crossover = crossover(
+            self.datas[0], self.sma_short, self.sma_long, self.params.short_period, self.params.long_period
         )
 
-        # DMI 方向指标（+DI / -DI）
-        self.plus_di = bt.indicators.PlusDirectionalIndicator(
-            self.datas[0], period=self.params.adx_period
-        )
-        self.minus_di = bt.indicators.MinusDirectionalIndicator(
-            self.datas[0], period=self.params.adx_period
-        )
+        # RSI（慢速）/ ATR、ADX 趋势强度 + DMI 方向指标（+DI / -DI）
+        # （数据源持有整段数组时由编译内核一次算出，否则为 Backtrader 指标）
+        self.rsi, self.atr = rsi_atr(self.datas[0], self.params.rsi_period, self.params.atr_period)
+        self.adx, self.plus_di, self.minus_di = adx_dmi(self.datas[0], self.params.adx_period)
 
-        # ATR
-        self.atr = bt.indicators.ATR(self.datas[0], period=self.params.atr_period)
+        # next() 逐 K 线读取的数据线，及其整段取值（nextstart 中取得；指标非整段预先算完时为 None）
+        self._lines = (self.dataclose, self.sma_short, self.sma_long, self.crossover,
+                       self.rsi, self.adx, self.plus_di, self.minus_di, self.atr)
+        self._arrays = None
+        # 移动止盈触发、跟踪止损距离（ATR × 倍数）的整段取值（nextstart 中由 ATR 整段取值一次算出）
+        self._atr_dists = None
 
     def log(self, txt, dt=None):
         if self.params.printlog:
             dt = dt or self.datas[0].datetime.date(0)
             print(f"[{dt.isoformat()}] {txt}")
 
-    def _calc_position_size(self):
+    def _calc_position_size(self, atr):
         """基于 ATR 的动态仓位"""
-        if self.atr[0] <= 0:
+        if atr <= 0:
             return 1
-        risk_amount = self.broker.getvalue() * self.params.risk_pct
-        risk_per_unit = self.atr[0] * self.params.atr_sl_mult
+        risk_amount = self.broker.getvalue() * self._risk_pct
+        risk_per_unit = atr * self._atr_sl_mult
         return max(int(risk_amount / risk_per_unit), 1)
 
     def notify_order(self, order):
@@ -111,24 +116,26 @@ class SwingStrategy(bt.Strategy):
             if order.isbuy():
                 self.entry_price = order.executed.price
                 self.entry_bar = len(self)
-                self.stop_price = self.entry_price - self.atr[0] * self.params.atr_sl_mult
+                self.stop_price = self.entry_price - self.atr[0] * self._atr_sl_mult
                 self.highest_since_entry = self.entry_price
                 self.trail_activated = False
-                self.log(
-                    f"✅ 买入 | 价: {order.executed.price:.2f} | "
-                    f"量: {order.executed.size:.0f} | "
-                    f"止损: {self.stop_price:.2f} | "
-                    f"ADX: {self.adx[0]:.1f}"
-                )
+                if self.params.printlog:
+                    self.log(
+                        f"✅ 买入 | 价: {order.executed.price:.2f} | "
+                        f"量: {order.executed.size:.0f} | "
+                        f"止损: {self.stop_price:.2f} | "
+                        f"ADX: {self.adx[0]:.1f}"
+                    )
             else:
-                hold_bars = len(self) - self.entry_bar if self.entry_bar else 0
-                pnl = (order.executed.price - self.entry_price) if self.entry_price else 0
-                self.log(
-                    f"✅ 卖出 | 价: {order.executed.price:.2f} | "
-                    f"持仓: {hold_bars} bars | "
-                    f"单位PnL: {pnl:.2f} | "
-                    f"{'移动止盈' if self.trail_activated else '信号/止损'}"
-                )
+                if self.params.printlog:
+                    hold_bars = len(self) - self.entry_bar if self.entry_bar else 0
+                    pnl = (order.executed.price - self.entry_price) if self.entry_price else 0
+                    self.log(
+                        f"✅ 卖出 | 价: {order.executed.price:.2f} | "
+                        f"持仓: {hold_bars} bars | "
+                        f"单位PnL: {pnl:.2f} | "
+                        f"{'移动止盈' if self.trail_activated else '信号/止损'}"
+                    )
                 self.last_exit_bar = len(self)
                 self.entry_price = None
                 self.entry_bar = None
@@ -142,103 +149,138 @@ class SwingStrategy(bt.Strategy):
         self.order = None
 
     def notify_trade(self, trade):
-        if not trade.isclosed:
+        # 不打印日志时直接返回，免去逐笔格式化日志字符串
+        if not trade.isclosed or not self.params.printlog:
             return
         self.log(f"💰 平仓 | 毛利: {trade.pnl:.2f} | 净利: {trade.pnlcomm:.2f}")
 
+    def nextstart(self):
+        """首根通过预热期的 K 线：取出各数据线的整段取值，之后 next() 按下标读取"""
+        self._arrays = line_arrays(self, *self._lines)
+        if self._arrays is not None:
+            atr = np.asarray(self._arrays[-1])
+            self._atr_dists = ((atr * self._atr_tp_mult).tolist(),
+                               (atr * self._trail_atr_mult).tolist())
+        self.next()
+
     def next(self):
         if self.order:
             return
 
-        current_price = self.dataclose[0]
+        bar = len(self)
+        i = bar - 1
+        if self._arrays is not None:
+            (current_price, sma_short, sma_long, cross, rsi, adx, plus_di, minus_di,
+             atr) = (a[i] for a in self._arrays)
+        else:
+            (current_price, sma_short, sma_long, cross, rsi, adx, plus_di, minus_di,
+             atr) = (line[0] for line in self._lines)
 
         if self.position:
-            # ── 持仓管理 ──
-
-            # 更新最高价
-            if self.highest_since_entry is not None:
-                self.highest_since_entry = max(self.highest_since_entry, current_price)
-
-            # 检查移动止盈触发
-            if (self.entry_price and self.highest_since_entry
-                    and not self.trail_activated):
-                profit = self.highest_since_entry - self.entry_price
-                if profit >= self.atr[0] * self.params.atr_tp_mult:
-                    self.trail_activated = True
+            if self._atr_dists is not None:
+                tp_dist, trail_dist = (d[i] for d in self._atr_dists)
+            else:
+                tp_dist = atr * self._atr_tp_mult
+                trail_dist = atr * self._trail_atr_mult
+            self._manage_position(current_price, sma_short, sma_long, cross, tp_dist, trail_dist, bar)
+        else:
+            self._check_entry(current_price, cross, rsi, adx, plus_di, minus_di, atr, bar)
+
+    def _manage_position(self, current_price, sma_short, sma_long, cross, tp_dist, trail_dist, bar):
+        """持仓管理
+
+        tp_dist / trail_dist 为当前 K 线的 ATR × 移动止盈触发 / 跟踪倍数，bar 为 len(self)。
+        """
+        # 更新最高价
+        if self.highest_since_entry is not None:
+            self.highest_since_entry = max(self.highest_since_entry, current_price)
+
+        # 检查移动止盈触发
+        if (self.entry_price and self.highest_since_entry
+                and not self.trail_activated):
+            profit = self.highest_since_entry - self.entry_price
+            if profit >= tp_dist:
+                self.trail_activated = True
+                if self.params.printlog:
                     self.log(
                         f"🔄 移动止盈激活 | 浮盈: {profit:.2f} | "
                         f"最高: {self.highest_since_entry:.2f}"
                     )
 
-            # 更新跟踪止损
-            if self.trail_activated:
-                trail_stop = self.highest_since_entry - self.atr[0] * self.params.trail_atr_mult
-                if trail_stop > self.stop_price:
-                    self.stop_price = trail_stop
+        # 更新跟踪止损
+        if self.trail_activated:
+            trail_stop = self.highest_since_entry - trail_dist
+            if trail_stop > self.stop_price:
+                self.stop_price = trail_stop
 
-            # 止损检查
-            if self.stop_price and current_price <= self.stop_price:
-                hold_bars = len(self) - self.entry_bar if self.entry_bar else 0
+        # 止损检查
+        if self.stop_price and current_price <= self.stop_price:
+            if self.params.printlog:
+                hold_bars = bar - self.entry_bar if self.entry_bar else 0
                 self.log(
                     f"🛑 止损 | 价: {current_price:.2f} | "
                     f"止损线: {self.stop_price:.2f} | "
                     f"持仓: {hold_bars} bars | "
                     f"{'移动止盈回撤' if self.trail_activated else '固定止损'}"
                 )
-                self.order = self.close()
-                return
+            self.order = self.close()
+            return
 
-            # 死叉平仓 —— 仅在短MA明确低于长MA一段距离时才平仓
-            # （避免短暂回穿导致过早离场）
-            if self.crossover < 0:
-                ma_gap = (self.sma_short[0] - self.sma_long[0]) / self.sma_long[0] * 100
-                if ma_gap < -0.3:  # 短MA低于长MA 0.3% 才确认死叉
-                    hold_bars = len(self) - self.entry_bar if self.entry_bar else 0
+        # 死叉平仓 —— 仅在短MA明确低于长MA一段距离时才平仓
+        # （避免短暂回穿导致过早离场）
+        if cross < 0:
+            ma_gap = (sma_short - sma_long) / sma_long * 100
+            if ma_gap < -0.3:  # 短MA低于长MA 0.3% 才确认死叉
+                if self.params.printlog:
+                    hold_bars = bar - self.entry_bar if self.entry_bar else 0
                     self.log(
                         f"📉 死叉平仓 | 价: {current_price:.2f} | "
                         f"MA差: {ma_gap:.2f}% | 持仓: {hold_bars} bars"
                     )
-                    self.order = self.close()
-
-        else:
-            # ── 开仓逻辑 ──
+                self.order = self.close()
 
-            # 冷却期检查
-            if len(self) - self.last_exit_bar < self.params.reentry_cooldown:
-                return
+    def _check_entry(self, current_price, cross, rsi, adx, plus_di, minus_di, atr, bar):
+        """开仓检查：金叉 + RSI / ADX / DMI 确认（bar 为 len(self)）"""
+        # 冷却期检查
+        if bar - self.last_exit_bar < self._reentry_cooldown:
+            return
 
-            # 条件1: 金叉
-            if self.crossover <= 0:
-                return
+        # 条件1: 金叉
+        if cross <= 0:
+            return
 
-            # 条件2: RSI 确认
-            if self.rsi[0] < self.params.rsi_upper:
+        # 条件2: RSI 确认
+        if rsi < self._rsi_upper:
+            if self.params.printlog:
                 self.log(
-                    f"🚫 金叉但 RSI 不足 ({self.rsi[0]:.1f} < {self.params.rsi_upper})"
+                    f"🚫 金叉但 RSI 不足 ({rsi:.1f} < {self.params.rsi_upper})"
                 )
-                return
+            return
 
-            # 条件3: ADX 趋势强度
-            if self.adx[0] < self.params.adx_threshold:
+        # 条件3: ADX 趋势强度
+        if adx < self._adx_threshold:
+            if self.params.printlog:
                 self.log(
-                    f"🚫 金叉但 ADX 不足 ({self.adx[0]:.1f} < {self.params.adx_threshold})"
+                    f"🚫 金叉但 ADX 不足 ({adx:.1f} < {self.params.adx_threshold})"
                 )
-                return
+            return
 
-            # 条件4: +DI > -DI（上升趋势确认）
-            if self.plus_di[0] <= self.minus_di[0]:
-                self.log(f"🚫 金叉但 +DI({self.plus_di[0]:.1f}) <= -DI({self.minus_di[0]:.1f})")
-                return
+        # 条件4: +DI > -DI（上升趋势确认）
+        if plus_di <= minus_di:
+            if self.params.printlog:
+                self.log(f"🚫 金叉但 +DI({plus_di:.1f}) <= -DI({minus_di:.1f})")
+            return
 
-            # 全部条件满足 → 入场
-            size = self._calc_position_size()
+        # 全部条件满足 → 入场
+        size = self._calc_position_size(atr)
+        if self.params.printlog:
             self.log(
                 f"📈 开仓 | 价: {current_price:.2f} | "
-                f"RSI: {self.rsi[0]:.1f} | ADX: {self.adx[0]:.1f} | "
-                f"+DI: {self.plus_di[0]:.1f} -DI: {self.minus_di[0]:.1f} | "
-                f"ATR: {self.atr[0]:.2f} | 仓位: {size}"
+                f"RSI: {rsi:.1f} | ADX: {adx:.1f} | "
+                f"+DI: {plus_di:.1f} -DI: {minus_di:.1f} | "
+                f"ATR: {atr:.2f} | 仓位: {size}"
             )
-            self.order = self.buy(size=size)
+        self.order = self.buy(size=size)
 
     def stop(self):
         self.log(
@@ -11,28 +11,29 @@ def log(msg):
 
 try:
     # === 1. 生成模拟黄金 OHLCV 数据 ===
-    np.random.seed(123)
+    rng = np.random.default_rng(123)
     n = 200
     base = 1950.0
     trend = np.linspace(0, 100, n)
-    noise = np.cumsum(np.random.randn(n) * 5)
+    z = rng.standard_normal((n, 4))  # 一次取出收盘噪声、上影、下影、开盘偏移四列
+    noise = np.cumsum(z[:, 0] * 5)
     close = base + trend + noise
-    high = close + np.abs(np.random.randn(n) * 8)
-    low = close - np.abs(np.random.randn(n) * 8)
-    opn = close + np.random.randn(n) * 3
-    vol = np.random.randint(1000, 10000, n)
+    high = close + np.abs(z[:, 1] * 8)
+    low = close - np.abs(z[:, 2] * 8)
+    opn = close + z[:, 3] * 3
+    vol = rng.integers(1000, 10000, n)
 
     df = pd.DataFrame({
         "time": pd.date_range("2024-01-01", periods=n, freq="D"),
         "open": opn, "high": high, "low": low, "close": close, "volume": vol,
     })
-    log(f"[1/3] 数据生成: {len(df)} 条, 价格: {close.min():.0f}~{close.max():.0f}")
+    log(f"[1/5] 数据生成: {len(df)} 条, 价格: {close.min():.0f}~{close.max():.0f}")
 
     # === 2. 计算技术指标 ===
     from factors.technical_indicators import add_all_indicators
     df_ind = add_all_indicators(df)
     non_null = df_ind.dropna().shape[0]
-    log(f"[2/3] 指标计算完成: {list(df_ind.columns)}, 有效行: {non_null}/{len(df_ind)}")
+    log(f"[2/5] 指标计算完成: {list(df_ind.columns)}, 有效行: {non_null}/{len(df_ind)}")
 
     # === 3. 回测引擎测试 ===
     from backtest.engine import BacktestEngine
@@ -42,10 +43,58 @@ try:
     results = engine.run()
     perf = engine.print_performance()
 
-    log(f"[3/3] 回测完成: sharpe={perf.get('sharpe_ratio')}, "
+    log(f"[3/5] 回测完成: sharpe={perf.get('sharpe_ratio')}, "
         f"return={perf.get('total_return', 0):.2f}%, "
         f"trades={perf.get('total_trades', 0)}, "
         f"final={perf.get('final_value', 0):,.2f}")
+
+    # === 4. 通道极值点：NaN 口径（numba 内核与 NumPy 实现一致，NaN 中心及其邻点都不算极值点）===
+    from analysis.strategies import _pivots_kernel, _pivots_numpy
+    vals = np.array([1.0, 3.0, np.nan, 2.0, 5.0, 4.0, 1.0, np.nan, 0.5, 2.0, 6.0, 2.0, 1.0, 1.0, 3.0])
+    for is_high, expected in ((True, [4, 10]), (False, [12, 13])):
+        paths = {"numpy": _pivots_numpy(vals, 1, is_high)}
+        if _pivots_kernel is not None:
+            paths["numba"] = _pivots_kernel(vals, 1, is_high)
+        for name, idx in paths.items():
+            assert idx.tolist() == expected, f"{name} {'高' if is_high else '低'}点: {idx.tolist()} != {expected}"
+    log(f"[4/5] 极值点 NaN 口径一致: {', '.join(paths)}")
+
+    # === 5. fast 模式（编译内核）与 Cerebro 回测逐位一致 ===
+    from strategies.dual_ma_strategy import DualMAStrategy
+    from strategies.enhanced_ma_strategy import EnhancedMAStrategy
+    from strategies.swing_strategy import SwingStrategy
+    from strategies.optimized_swing import OptimizedSwingStrategy
+    from strategies.optimized_swing_v2 import OptimizedSwingV2
+    m = 1500  # 摆动类策略均线周期较长，用更长的随机游走序列保证各策略都有成交
+    z = rng.standard_normal((m, 4))
+    close_l = 1800.0 + np.cumsum(z[:, 0] * 10)
+    opn_l = close_l + z[:, 3] * 3
+    df_long = pd.DataFrame({
+        "time": pd.date_range("2019-01-01", periods=m, freq="D"),
+        "open": opn_l,
+        "high": np.maximum(opn_l, close_l) + np.abs(z[:, 1] * 8),
+        "low": np.minimum(opn_l, close_l) - np.abs(z[:, 2] * 8),
+        "close": close_l, "volume": rng.integers(1000, 10000, m),
+    })
+    swing_periods = {"short_period": 20, "long_period": 60}
+    cases = (
+        (DualMAStrategy, {}), (EnhancedMAStrategy, {}), (SwingStrategy, swing_periods),
+        (OptimizedSwingStrategy, swing_periods), (OptimizedSwingV2, swing_periods),
+    )
+    checked = []
+    for strategy_class, params in cases:
+        perfs = []
+        for fast in (False, True):
+            eng = BacktestEngine(initial_cash=100000.0, commission=0.001, verbose=False)
+            eng.load_data(df=df_long)
+            eng.add_strategy(strategy_class, printlog=False, **params)
+            eng.run(fast=fast)
+            perfs.append(eng.print_performance())
+        name = strategy_class.__name__
+        assert perfs[0]["total_trades"] > 0, f"{name} 无成交，比对无意义"
+        assert perfs[0] == perfs[1], f"{name} fast 模式与 Cerebro 不一致: {perfs[1]} != {perfs[0]}"
+        checked.append(f"{name}({perfs[0]['total_trades']} 笔)")
+    log(f"[5/5] fast 模式与 Cerebro 一致: {', '.join(checked)}")
     log("✅ 全流程集成测试通过")
 
 except Exception as e: